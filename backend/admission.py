@@ -0,0 +1,201 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional
+
+# Defaults for database_connections rows that leave the limit columns empty
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "8"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+# Seconds a queued query may wait for a slot before it is turned away
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+ADMISSION_RETRY_AFTER = float(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+# Slots per database for background work (query jobs), kept apart from the
+# ones above so long jobs cannot starve interactive queries
+ADMISSION_MAX_BACKGROUND = int(os.getenv("ADMISSION_MAX_BACKGROUND", "2"))
+# Requests per second; 0 disables the limit
+RATE_LIMIT_ENDPOINT_RPS = float(os.getenv("RATE_LIMIT_ENDPOINT_RPS", "0"))
+RATE_LIMIT_USER_RPS = float(os.getenv("RATE_LIMIT_USER_RPS", "0"))
+# Bucket size as seconds' worth of the rate, i.e. how large a burst is let through
+RATE_LIMIT_BURST_SECONDS = float(os.getenv("RATE_LIMIT_BURST_SECONDS", "2"))
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "10000"))
+
+# database_connections columns that override the defaults above, per database
+LIMIT_COLUMNS = ('max_concurrent_queries', 'max_queued_queries', 'rate_limit_per_second', 'user_rate_limit_per_second')
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class DatabaseLimits:
+    def __init__(self, db_config: Dict[str, Any]):
+        def setting(column, default):
+            value = db_config.get(column)
+            return default if value is None else value
+
+        self.max_concurrent = max(1, int(setting('max_concurrent_queries', ADMISSION_MAX_CONCURRENT)))
+        self.max_queue = max(0, int(setting('max_queued_queries', ADMISSION_MAX_QUEUE)))
+        self.endpoint_rps = float(setting('rate_limit_per_second', RATE_LIMIT_ENDPOINT_RPS))
+        self.user_rps = float(setting('user_rate_limit_per_second', RATE_LIMIT_USER_RPS))
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(1.0, rate * RATE_LIMIT_BURST_SECONDS)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Takes a token; returns 0, or the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class _Gate:
+    """Concurrency slots for one database with a bounded FIFO of waiters."""
+
+    def __init__(self):
+        self.limit = ADMISSION_MAX_CONCURRENT
+        self.active = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _wake(self):
+        while self.waiters and self.active < self.limit:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+
+    async def acquire(self, limit: int, max_queue: Optional[int], timeout: Optional[float]):
+        """max_queue None queues without bound; timeout None waits as long as it takes."""
+        self.limit = limit
+        self._wake()
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        if max_queue is not None and len(self.waiters) >= max_queue:
+            self.rejected += 1
+            raise AdmissionRejected(503, "Too many queries queued for this database", ADMISSION_RETRY_AFTER)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # Handed a slot just as we gave up; pass it on
+                self.release()
+            else:
+                waiter.cancel()
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                raise AdmissionRejected(503, "Timed out waiting for a free query slot", ADMISSION_RETRY_AFTER) from None
+            raise
+        self.admitted += 1
+
+    def release(self):
+        self.active -= 1
+        self._wake()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queue_depth": len(self.waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+class AdmissionController:
+    """Bounds what reaches each user database.
+
+    Queries take one of the database's concurrency slots, waiting in a
+    bounded queue when all are busy; requests are also metered by token
+    buckets per endpoint and per user. Both limits reject fast with the
+    time after which a retry is worth making.
+    """
+
+    def __init__(self, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        self.queue_timeout = queue_timeout
+        self.max_buckets = max_buckets
+        self._gates: Dict[str, _Gate] = {}
+        self._background_gates: Dict[str, _Gate] = {}
+        self._buckets: "OrderedDict[tuple, TokenBucket]" = OrderedDict()
+        self.rate_limited = 0
+
+    def _take(self, key: tuple, rate: float) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None or bucket.rate != rate:
+            bucket = self._buckets[key] = TokenBucket(rate)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        return bucket.take()
+
+    def check_rate(self, db_id: str, db_config: Dict[str, Any], endpoint: str, user: Optional[str]):
+        """Raises AdmissionRejected(429) when the endpoint or user is over its rate."""
+        limits = DatabaseLimits(db_config)
+        checks = []
+        if limits.endpoint_rps > 0:
+            checks.append((('endpoint', db_id, endpoint), limits.endpoint_rps, "this endpoint"))
+        if limits.user_rps > 0 and user:
+            checks.append((('user', db_id, user), limits.user_rps, "this user"))
+        for key, rate, who in checks:
+            wait = self._take(key, rate)
+            if wait:
+                self.rate_limited += 1
+                raise AdmissionRejected(429, f"Rate limit exceeded for {who}", wait)
+
+    async def acquire(self, db_id: str, db_config: Dict[str, Any], background: bool = False):
+        """Takes a concurrency slot; raises AdmissionRejected(503) when none frees up.
+
+        Background work takes one of the database's ADMISSION_MAX_BACKGROUND
+        slots instead, waiting in that gate's queue for as long as it takes.
+        """
+        if background:
+            gate = self._background_gates.setdefault(db_id, _Gate())
+            await gate.acquire(ADMISSION_MAX_BACKGROUND, None, None)
+            return
+        limits = DatabaseLimits(db_config)
+        gate = self._gates.setdefault(db_id, _Gate())
+        await gate.acquire(limits.max_concurrent, limits.max_queue, self.queue_timeout)
+
+    def release(self, db_id: str, background: bool = False):
+        (self._background_gates if background else self._gates)[db_id].release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "databases": {db_id: gate.stats() for db_id, gate in self._gates.items()},
+            "background": {db_id: gate.stats() for db_id, gate in self._background_gates.items()},
+            "queue_depth": sum(len(gate.waiters) for gate in self._gates.values()),
+            "rejected": sum(gate.rejected + gate.timed_out for gate in self._gates.values()),
+            "rate_limited": self.rate_limited,
+            "rate_buckets": len(self._buckets),
+        }
+
+
+admission = AdmissionController()
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from cache import TTLCache
+from singleflight import SingleFlight
+
+AI_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "2048"))
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", "86400"))
+# Optional SQLite file that keeps generated answers across restarts
+AI_CACHE_PATH = os.getenv("AI_CACHE_PATH")
+
+_WHITESPACE = re.compile(r'\s+')
+
+CacheKey = Tuple[str, str, str]
+
+
+def normalize_prompt(prompt: str) -> str:
+    return _WHITESPACE.sub(' ', prompt).strip().rstrip('?.!').strip().lower()
+
+
+class _PersistentStore:
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ai_responses ("
+                " db_id TEXT, fingerprint TEXT, prompt TEXT, response TEXT, created_at REAL,"
+                " PRIMARY KEY (db_id, fingerprint, prompt))"
+            )
+
+    def get(self, key: CacheKey, ttl: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM ai_responses WHERE db_id = ? AND fingerprint = ? AND prompt = ?", key
+            ).fetchone()
+        if row is None or row[1] + ttl < time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, key: CacheKey, value: Dict[str, Any]):
+        db_id, fingerprint, _ = key
+        with self._lock, self._conn:
+            # Answers generated against an older schema can never be hit again
+            self._conn.execute("DELETE FROM ai_responses WHERE db_id = ? AND fingerprint != ?", (db_id, fingerprint))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ai_responses VALUES (?, ?, ?, ?, ?)",
+                (*key, json.dumps(value), time.time()),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class AIResponseCache:
+    def __init__(self, max_size: int = AI_CACHE_SIZE, ttl: float = AI_CACHE_TTL, path: Optional[str] = AI_CACHE_PATH):
+        self._memory = TTLCache(max_size=max_size, ttl=ttl)
+        self._store = _PersistentStore(path) if path else None
+        # An identical prompt already with the model shares its answer; the
+        # call is only cancelled once every request waiting on it has gone
+        self._flights = SingleFlight()
+        self.model_calls = 0
+        self.persistent_hits = 0
+
+    @staticmethod
+    def key(db_id: str, fingerprint: str, prompt: str) -> CacheKey:
+        # The schema fingerprint is part of the key, so a schema change
+        # invalidates every cached answer for that database
+        return (db_id, fingerprint, normalize_prompt(prompt))
+
+    async def get_or_compute(self, key: CacheKey, compute: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        value = self._memory.get(key)
+        if value is not None:
+            return value
+
+        async def load() -> Dict[str, Any]:
+            value = None
+            if self._store is not None:
+                value = await asyncio.to_thread(self._store.get, key, self._memory.ttl)
+                if value is not None:
+                    self.persistent_hits += 1
+            if value is None:
+                self.model_calls += 1
+                value = await compute()
+                if self._store is not None:
+                    await asyncio.to_thread(self._store.set, key, value)
+            self._memory.set(key, value)
+            return value
+
+        return await self._flights.do(key, load)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._memory.stats(),
+            "model_calls": self.model_calls,
+            "deduplicated": self._flights.coalesced,
+            "persistent_hits": self.persistent_hits,
+            "persistent": self._store is not None,
+        }
+
+    def close(self):
+        if self._store is not None:
+            self._store.close()
@@ -0,0 +1,130 @@
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from cache import TTLCache
+from sql_analysis import limit_sql
+from statements import compile_query
+
+# Published specs are served from memory; each worker re-reads a database's
+# specs after this many seconds so publishes made on other workers show up.
+PUBLISHED_ROUTES_TTL = float(os.getenv("PUBLISHED_ROUTES_TTL", "60"))
+# Databases whose load state is remembered; least recently used ones are re-read
+PUBLISHED_ROUTES_MAX_DATABASES = int(os.getenv("PUBLISHED_ROUTES_MAX_DATABASES", "1024"))
+
+
+def _split_path(path: str) -> Tuple[str, ...]:
+    return tuple(segment for segment in path.strip("/").split("/") if segment)
+
+
+def _template_param(segment: str) -> Optional[str]:
+    if segment.startswith("{") and segment.endswith("}") and len(segment) > 2:
+        return segment[1:-1]
+    if segment.startswith(":") and len(segment) > 1:
+        return segment[1:]
+    return None
+
+
+class PublishedRoute:
+    def __init__(self, spec_id: str, spec: Dict[str, Any]):
+        self.spec_id = spec_id
+        self.spec = spec
+        self.method = (spec.get("method") or "GET").upper()
+        self.segments = _split_path(spec.get("path") or "")
+        self.path_params = {i: _template_param(s) for i, s in enumerate(self.segments) if _template_param(s)}
+        self.is_template = bool(self.path_params)
+        # The stored query is compiled once here rather than on every call
+        query = spec.get("query")
+        if query and self.method == "GET":
+            query, _ = limit_sql(query)
+        self.statement = compile_query(query, spec.get("parameters") or []) if query else None
+
+    def match(self, segments: Tuple[str, ...]) -> Optional[Dict[str, str]]:
+        if len(segments) != len(self.segments):
+            return None
+        params = {}
+        for i, segment in enumerate(self.segments):
+            name = self.path_params.get(i)
+            if name is not None:
+                params[name] = segments[i]
+            elif segment != segments[i]:
+                return None
+        return params
+
+
+class PublishedAPIRouter:
+    def __init__(self, store, ttl: float = PUBLISHED_ROUTES_TTL, max_databases: int = PUBLISHED_ROUTES_MAX_DATABASES):
+        self._store = store
+        self.ttl = ttl
+        # (db_id, method, segments) -> route for literal paths
+        self._static: Dict[Tuple[str, str, Tuple[str, ...]], PublishedRoute] = {}
+        # (db_id, method, segment count) -> routes with path parameters
+        self._templates: Dict[Tuple[str, str, int], List[PublishedRoute]] = {}
+        self._routes: Dict[str, Dict[str, PublishedRoute]] = {}
+        # db_id -> True while its specs are fresh; both bounded, since db_id is
+        # taken straight from the request path
+        self._loaded = TTLCache(max_size=max_databases, ttl=ttl)
+        self._locks = TTLCache(max_size=max_databases, ttl=ttl)
+
+    async def ensure_loaded(self, db_id: str):
+        if self._loaded.get(db_id):
+            return
+        # Unknown ids match nothing; don't query their specs or keep state for them
+        if await self._store.get_database_connection(db_id) is None:
+            return
+        lock = self._locks.get(db_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks.set(db_id, lock)
+        async with lock:
+            if self._loaded.get(db_id):
+                return
+            rows = await self._store.list_api_specs(db_id)
+            self.clear(db_id)
+            for row in rows:
+                self.register(db_id, row["id"], row["spec"])
+            self._loaded.set(db_id, True)
+
+    def register(self, db_id: str, spec_id: str, spec: Dict[str, Any]):
+        self.unregister(db_id, spec_id)
+        route = PublishedRoute(spec_id, spec)
+        self._routes.setdefault(db_id, {})[spec_id] = route
+        if route.is_template:
+            self._templates.setdefault((db_id, route.method, len(route.segments)), []).append(route)
+        else:
+            self._static[(db_id, route.method, route.segments)] = route
+
+    def unregister(self, db_id: str, spec_id: str):
+        route = self._routes.get(db_id, {}).pop(spec_id, None)
+        if route is None:
+            return
+        if route.is_template:
+            bucket = self._templates.get((db_id, route.method, len(route.segments)), [])
+            if route in bucket:
+                bucket.remove(route)
+        elif self._static.get((db_id, route.method, route.segments)) is route:
+            del self._static[(db_id, route.method, route.segments)]
+
+    def clear(self, db_id: str):
+        for spec_id in list(self._routes.get(db_id, {})):
+            self.unregister(db_id, spec_id)
+        self._loaded.invalidate(db_id)
+
+    def match(self, db_id: str, method: str, path: str) -> Optional[Tuple[PublishedRoute, Dict[str, str]]]:
+        segments = _split_path(path)
+        method = method.upper()
+        route = self._static.get((db_id, method, segments))
+        if route is not None:
+            return route, {}
+        for route in self._templates.get((db_id, method, len(segments)), []):
+            params = route.match(segments)
+            if params is not None:
+                return route, params
+        return None
+
+    def allowed_methods(self, db_id: str, path: str) -> Set[str]:
+        segments = _split_path(path)
+        return {
+            route.method for route in self._routes.get(db_id, {}).values()
+            if route.match(segments) is not None
+        }
@@ -0,0 +1,91 @@
+"""Burst traffic against one published query, with and without single-flight.
+
+Simulates a dashboard: --bursts rounds of --burst-size identical calls fired
+at the same instant (plus a few distinct parameter values), each call running
+an aggregate over a generated SQLite table through sqlite_executor. Reports
+how many queries reached the database and the call latency for both modes.
+
+    python benchmarks/bench_coalescing.py --bursts 20 --burst-size 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from singleflight import SingleFlight  # noqa: E402
+from sqlite_executor import SQLiteExecutor  # noqa: E402
+
+QUERY = "SELECT kind, COUNT(*), SUM(amount) FROM events WHERE kind >= ? GROUP BY kind"
+
+
+def build_database(path: str, rows: int):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE events (id INTEGER PRIMARY KEY, kind TEXT, amount REAL)")
+    conn.executemany("INSERT INTO events VALUES (?, ?, ?)", ((i, f"k{i % 31}", i * 0.5) for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+async def run(mode: str, path: str, bursts: int, burst_size: int, variants: int, executor: SQLiteExecutor):
+    flights = SingleFlight()
+    queries = 0
+    latencies = []
+
+    async def query(kind: str):
+        nonlocal queries
+        queries += 1
+        return await executor.fetch(path, QUERY, (kind,))
+
+    async def call(i: int):
+        kind = f"k{i % variants}"
+        start = time.perf_counter()
+        if mode == "coalesced":
+            await flights.do(("events", kind), lambda: query(kind))
+        else:
+            await query(kind)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    for _ in range(bursts):
+        await asyncio.gather(*(call(i) for i in range(burst_size)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "mode": mode,
+        "calls": bursts * burst_size,
+        "db_queries": queries,
+        "coalesced": flights.coalesced,
+        "seconds": round(elapsed, 3),
+        "latency_ms_p50": round(latencies[len(latencies) // 2], 2),
+        "latency_ms_p99": round(latencies[int(len(latencies) * 0.99)], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=300_000)
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--burst-size", type=int, default=50)
+    parser.add_argument("--variants", type=int, default=3, help="distinct parameter values per burst")
+    parser.add_argument("--db", default="/tmp/coalescing_bench.db")
+    args = parser.parse_args()
+
+    build_database(args.db, args.rows)
+    executor = SQLiteExecutor()
+    results = [
+        asyncio.run(run(mode, args.db, args.bursts, args.burst_size, args.variants, executor))
+        for mode in ("independent", "coalesced")
+    ]
+    executor.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
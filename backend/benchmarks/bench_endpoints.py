@@ -0,0 +1,260 @@
+"""Throughput and p50/p99 latency of the hot HTTP endpoints, in-process.
+
+Runs the FastAPI app through httpx's ASGI transport (no server, no lifespan
+background tasks) with an in-memory stand-in for the supabase metadata store
+and the offline FakeModel, against generated SQLite databases. For every
+schema size (--tables), result size (--result-rows) and concurrency level it
+times:
+
+  schema        GET  /database/{db_id}
+  table_data    GET  /database/{db_id}/table/items/data
+  query         POST /database/{db_id}/query  (SELECT ... LIMIT result_rows)
+  published     GET  /{db_id}/items           (published spec, handle_published_api)
+  published_id  GET  /{db_id}/items/{id}      (templated path, a different id per call)
+
+and prints one JSON document, so runs on two commits can be diffed.
+
+    python benchmarks/bench_endpoints.py --tables 10,200 --result-rows 10,1000 --concurrency 1,16
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Placeholders so connectDB can build its (unused) client; requests go to MemoryClient
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "eyJhbGciOiJIUzI1NiJ9.e30.benchmark")
+os.environ.setdefault("LLM_BACKEND", "fake")
+
+import httpx  # noqa: E402
+
+import connectDB  # noqa: E402
+from main import app  # noqa: E402
+
+USER_ID = "bench-user"
+
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class MemoryQuery:
+    """The subset of the supabase query builder that MetadataStore uses."""
+
+    def __init__(self, rows):
+        self._rows = rows
+        self._filters = []
+        self._op, self._arg = "select", None
+
+    def select(self, *args):
+        self._op = "select"
+        return self
+
+    def insert(self, row):
+        self._op, self._arg = "insert", row
+        return self
+
+    def update(self, fields):
+        self._op, self._arg = "update", fields
+        return self
+
+    def upsert(self, rows, **kwargs):
+        self._op, self._arg = "upsert", rows
+        return self
+
+    def delete(self):
+        self._op = "delete"
+        return self
+
+    def eq(self, column, value):
+        self._filters.append(lambda r: str(r.get(column)) == str(value))
+        return self
+
+    def in_(self, column, values):
+        self._filters.append(lambda r: r.get(column) in values)
+        return self
+
+    def execute(self):
+        if self._op == "insert":
+            self._rows.append(dict(self._arg))
+            return _Response([dict(self._arg)])
+        if self._op == "upsert":
+            for row in self._arg if isinstance(self._arg, list) else [self._arg]:
+                existing = next((r for r in self._rows if r["id"] == row["id"]), None)
+                if existing is None:
+                    self._rows.append(dict(row))
+                else:
+                    existing.update(row)
+            return _Response(list(self._arg))
+        matched = [r for r in self._rows if all(f(r) for f in self._filters)]
+        if self._op == "update":
+            for r in matched:
+                r.update(self._arg)
+        elif self._op == "delete":
+            for r in matched:
+                self._rows.remove(r)
+        return _Response([dict(r) for r in matched])
+
+
+class MemoryClient:
+    def __init__(self):
+        self.tables = {}
+
+    def table(self, name):
+        return MemoryQuery(self.tables.setdefault(name, []))
+
+
+def build_database(path: str, tables: int, rows: int):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT NOT NULL, price REAL, created_at TEXT)")
+    conn.executemany("INSERT INTO items VALUES (?, ?, ?, ?)",
+                     ((i, f"item {i}", i * 0.25, f"2024-01-{i % 28 + 1:02d}") for i in range(1, rows + 1)))
+    # Padding tables so the schema endpoint has something to introspect
+    for t in range(tables - 1):
+        conn.execute(f"CREATE TABLE t_{t} (id INTEGER PRIMARY KEY, item_id INTEGER REFERENCES items(id), "
+                     f"label TEXT, amount REAL, note TEXT)")
+        conn.execute(f"INSERT INTO t_{t} VALUES (1, 1, 'a', 1.0, NULL)")
+    conn.commit()
+    conn.close()
+
+
+def register(client: MemoryClient, db_id: str, path: str, result_rows: int):
+    client.tables.setdefault("database_connections", []).append({
+        "id": db_id, "user_id": USER_ID, "name": db_id, "type": "SQLite", "host": "", "port": 0,
+        "username": "", "password": "", "database_name": path, "status": "connected",
+        "last_connected": None, "table_count": 0, "total_rows": 0,
+    })
+    specs = client.tables.setdefault("api_specs", [])
+    for spec_id, path_template, query, parameters in (
+        ("list", "/items", f"SELECT id, name, price, created_at FROM items LIMIT {result_rows}", []),
+        ("by-id", "/items/{id}", "SELECT id, name, price, created_at FROM items WHERE id = :id",
+         [{"name": "id", "in": "path", "type": "integer", "required": True}]),
+    ):
+        specs.append({"id": f"{db_id}-{spec_id}", "db_id": db_id, "spec": {
+            "id": f"{db_id}-{spec_id}", "title": spec_id, "method": "GET", "path": path_template,
+            "parameters": parameters, "isPublished": True, "query": query,
+        }})
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+async def measure(http: httpx.AsyncClient, make_request, requests: int, concurrency: int):
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            response = await make_request(i)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 1),
+        "latency_ms_p50": round(percentile(latencies, 0.50), 3),
+        "latency_ms_p99": round(percentile(latencies, 0.99), 3),
+    }
+
+
+def endpoints(db_id: str, result_rows: int, rows: int):
+    query = {"query": f"SELECT id, name, price, created_at FROM items LIMIT {result_rows}"}
+    return {
+        "schema": lambda http, i: http.get(f"/database/{db_id}"),
+        "table_data": lambda http, i: http.get(f"/database/{db_id}/table/items/data"),
+        "query": lambda http, i: http.post(f"/database/{db_id}/query", json=query),
+        "published": lambda http, i: http.get(f"/{db_id}/items"),
+        "published_id": lambda http, i: http.get(f"/{db_id}/items/{i % rows + 1}"),
+    }
+
+
+async def run(args, workdir: str):
+    client = MemoryClient()
+    connectDB.metadata_store._client = client
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as http:
+        for tables in args.tables:
+            path = os.path.join(workdir, f"bench_{tables}.db")
+            build_database(path, tables, args.rows)
+            for result_rows in args.result_rows:
+                db_id = f"bench-{tables}-{result_rows}"
+                register(client, db_id, path, result_rows)
+                for name, request in endpoints(db_id, result_rows, args.rows).items():
+                    if args.only and name not in args.only:
+                        continue
+                    # Warm the schema, published routes and connections first
+                    await measure(http, lambda i: request(http, i), args.warmup, 1)
+                    for concurrency in args.concurrency:
+                        stats = await measure(http, lambda i: request(http, i), args.requests, concurrency)
+                        results.append({"endpoint": name, "tables": tables, "result_rows": result_rows,
+                                        "concurrency": concurrency, **stats})
+                        print(f"{name:13} tables={tables:<5} rows={result_rows:<6} c={concurrency:<4} "
+                              f"{stats['throughput_rps']:>9} req/s  p50 {stats['latency_ms_p50']:>8} ms  "
+                              f"p99 {stats['latency_ms_p99']:>8} ms", file=sys.stderr)
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def int_list(value: str):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tables", type=int_list, default=[10, 200], help="schema sizes, comma separated")
+    parser.add_argument("--result-rows", type=int_list, default=[10, 1000], help="rows per query/published call")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 16])
+    parser.add_argument("--rows", type=int, default=20_000, help="rows in the items table")
+    parser.add_argument("--requests", type=int, default=500, help="requests per case")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--only", type=lambda v: v.split(","), default=None, help="endpoint names to run")
+    parser.add_argument("--output", help="also write the JSON here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = asyncio.run(run(args, workdir))
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "settings": {k: v for k, v in vars(args).items() if k != "output"},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Concurrent metadata lookups: blocking supabase calls vs. MetadataStore.
+
+Simulates a supabase client whose ``execute()`` blocks for a fixed latency and
+fires N concurrent "requests" at it, first calling the client inline on the
+event loop (the old route behaviour) and then through MetadataStore.
+
+    python benchmarks/bench_metadata_store.py --requests 200 --latency-ms 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metadata_store import MetadataStore  # noqa: E402
+
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    def __init__(self, latency: float):
+        self._latency = latency
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        time.sleep(self._latency)
+        return _Response([{"id": "db-1", "type": "SQLite", "database_name": ":memory:"}])
+
+
+class FakeSupabase:
+    def __init__(self, latency: float):
+        self._latency = latency
+
+    def table(self, name):
+        return FakeQuery(self._latency)
+
+
+async def run_blocking(client, requests: int) -> float:
+    async def handler():
+        return client.table("database_connections").select("*").eq("id", "db-1").execute().data[0]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handler() for _ in range(requests)))
+    return time.perf_counter() - start
+
+
+async def run_store(store: MetadataStore, requests: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(store.get_database_connection("db-1") for _ in range(requests)))
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    client = FakeSupabase(args.latency_ms / 1000)
+    store = MetadataStore(client, max_workers=args.workers)
+
+    blocking = await run_blocking(client, args.requests)
+    offloaded = await run_store(store, args.requests)
+    store.close()
+
+    print(json.dumps({
+        "requests": args.requests,
+        "latency_ms": args.latency_ms,
+        "workers": args.workers,
+        "blocking": {"seconds": round(blocking, 3), "rps": round(args.requests / blocking, 1)},
+        "metadata_store": {"seconds": round(offloaded, 3), "rps": round(args.requests / offloaded, 1)},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
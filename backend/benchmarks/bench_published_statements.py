@@ -0,0 +1,89 @@
+"""Published API query execution: string substitution vs. compiled statements.
+
+Runs the same parameterised lookup against a generated SQLite table, first by
+splicing values into the SQL text (the old handle_published_api behaviour, so
+every call is a new statement to parse and plan) and then through
+statements.compile_query/bind_values with a reused connection so sqlite3's
+statement cache is hit.
+
+    python benchmarks/bench_published_statements.py --calls 20000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from statements import bind_values, compile_query  # noqa: E402
+
+QUERY = "SELECT id, name, email FROM users WHERE id = :user_id AND status = ':status' LIMIT :limit"
+PARAMETERS = [
+    {"name": "user_id", "type": "integer", "required": True},
+    {"name": "status", "type": "string", "required": True},
+    {"name": "limit", "type": "integer", "required": False},
+]
+
+
+def build_database(rows: int) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:", cached_statements=256)
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, email TEXT, status TEXT)")
+    conn.executemany(
+        "INSERT INTO users VALUES (?, ?, ?, ?)",
+        ((i, f"user{i}", f"user{i}@example.com", random.choice(["active", "inactive"])) for i in range(rows)),
+    )
+    conn.commit()
+    return conn
+
+
+def old_path(conn: sqlite3.Connection, params: dict):
+    sanitized_query = QUERY
+    for param, value in params.items():
+        sanitized_query = sanitized_query.replace(f":{param}", value.replace("'", "''"))
+    return conn.execute(sanitized_query).fetchall()
+
+
+def new_path(conn: sqlite3.Connection, statement, params: dict):
+    return conn.execute(statement.sqlite_sql, bind_values(statement, params)).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    conn = build_database(args.rows)
+    calls = [
+        {"user_id": str(random.randrange(args.rows)), "status": random.choice(["active", "inactive"]), "limit": "10"}
+        for _ in range(args.calls)
+    ]
+
+    start = time.perf_counter()
+    for params in calls:
+        old_path(conn, params)
+    old_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    statement = compile_query(QUERY, PARAMETERS)
+    compile_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for params in calls:
+        new_path(conn, statement, params)
+    new_seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        "calls": args.calls,
+        "rows": args.rows,
+        "string_substitution": {"seconds": round(old_seconds, 4), "us_per_call": round(old_seconds / args.calls * 1e6, 2)},
+        "compiled_statement": {"seconds": round(new_seconds, 4), "us_per_call": round(new_seconds / args.calls * 1e6, 2)},
+        "compile_once_us": round(compile_seconds * 1e6, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
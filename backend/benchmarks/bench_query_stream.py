@@ -0,0 +1,113 @@
+"""Memory use of streamed vs. materialised SQL shell results.
+
+Builds (once) a SQLite table with --rows rows and drains the NDJSON stream
+produced by /database/{db_id}/query/stream for `SELECT * FROM events`,
+sampling the process RSS as it goes. With streaming, RSS should stay flat
+however large the table is. --materialize repeats the run the way
+execute_query does it (fetchall + one JSON document) for comparison.
+
+    python benchmarks/bench_query_stream.py --rows 10000000 --db /tmp/stream_bench.db
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streaming import encode_ndjson, sqlite_events  # noqa: E402
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        # Peak rather than current RSS outside Linux
+        scale = 2 ** 20 if sys.platform == "darwin" else 2 ** 10
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def build_database(path: str, rows: int):
+    conn = sqlite3.connect(path)
+    existing = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'events'"
+    ).fetchone()[0]
+    if existing and conn.execute("SELECT MAX(id) FROM events").fetchone()[0] == rows:
+        conn.close()
+        return
+    conn.execute("DROP TABLE IF EXISTS events")
+    conn.execute("CREATE TABLE events (id INTEGER PRIMARY KEY, kind TEXT, payload TEXT, amount REAL)")
+    conn.executemany(
+        "INSERT INTO events VALUES (?, ?, ?, ?)",
+        ((i, f"kind{i % 17}", f"payload for event {i}", i * 0.25) for i in range(1, rows + 1)),
+    )
+    conn.commit()
+    conn.close()
+
+
+async def drain_stream(path: str, sample_every: int):
+    baseline = rss_mb()
+    peak = baseline
+    total_bytes = 0
+    chunks = 0
+    start = time.perf_counter()
+    async for chunk in encode_ndjson(sqlite_events(path, "SELECT * FROM events")):
+        total_bytes += len(chunk)
+        chunks += 1
+        if chunks % sample_every == 0:
+            peak = max(peak, rss_mb())
+    elapsed = time.perf_counter() - start
+    trailer = json.loads(chunk)
+    return {
+        "mode": "stream",
+        "rows": trailer["rowCount"],
+        "seconds": round(elapsed, 2),
+        "mb_sent": round(total_bytes / 2 ** 20, 1),
+        "rss_baseline_mb": round(baseline, 1),
+        "rss_peak_mb": round(peak, 1),
+        "rss_growth_mb": round(peak - baseline, 1),
+    }
+
+
+def materialize(path: str):
+    baseline = rss_mb()
+    start = time.perf_counter()
+    conn = sqlite3.connect(path)
+    cursor = conn.execute("SELECT * FROM events")
+    rows = cursor.fetchall()
+    body = json.dumps({"columns": [d[0] for d in cursor.description], "rows": rows})
+    peak = rss_mb()
+    conn.close()
+    return {
+        "mode": "materialize",
+        "rows": len(rows),
+        "seconds": round(time.perf_counter() - start, 2),
+        "mb_sent": round(len(body) / 2 ** 20, 1),
+        "rss_baseline_mb": round(baseline, 1),
+        "rss_peak_mb": round(peak, 1),
+        "rss_growth_mb": round(peak - baseline, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--db", default="/tmp/stream_bench.db")
+    parser.add_argument("--sample-every", type=int, default=100)
+    parser.add_argument("--materialize", action="store_true")
+    args = parser.parse_args()
+
+    build_database(args.db, args.rows)
+    results = [asyncio.run(drain_stream(args.db, args.sample_every))]
+    if args.materialize:
+        results.append(materialize(args.db))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
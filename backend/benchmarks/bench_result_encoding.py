@@ -0,0 +1,100 @@
+"""Encode time and payload size of query results per response format.
+
+Builds --rows x --columns of mixed values (ints, floats, text, timestamps,
+NULLs) and encodes them the way the endpoints used to (QueryResult
+validation + jsonable_encoder + json, and dict-per-row for published APIs)
+and through result_encoding for each negotiated format. Arrow is skipped
+when pyarrow is not installed.
+
+    python benchmarks/bench_result_encoding.py --rows 50000 --columns 20
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from models import QueryResult  # noqa: E402
+from result_encoding import ARROW_STREAM, COLUMNAR_JSON, JSON, encode_result, orjson, pyarrow  # noqa: E402
+
+
+def build_rows(rows: int, columns: int):
+    base = datetime.datetime(2024, 1, 1)
+    kinds = [i % 4 for i in range(columns)]
+
+    def value(kind, i):
+        if kind == 0:
+            return i
+        if kind == 1:
+            return i * 0.37
+        if kind == 2:
+            return None if i % 7 == 0 else f"value {i}"
+        return base + datetime.timedelta(seconds=i)
+
+    names = [f"col_{c}" for c in range(columns)]
+    return names, [tuple(value(kinds[c], i) for c in range(columns)) for i in range(rows)]
+
+
+def old_shell(columns, rows):
+    result = {"columns": columns, "rows": [list(r) for r in rows], "rowCount": len(rows),
+              "executionTime": 1.0, "error": None}
+    # What FastAPI did with response_model=QueryResult
+    validated = QueryResult(**result)
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def old_published(columns, rows):
+    result = {"columns": columns, "rows": [dict(zip(columns, r)) for r in rows], "rowCount": len(rows),
+              "executionTime": 1.0}
+    return json.dumps(jsonable_encoder(result), separators=(",", ":")).encode()
+
+
+def timed(fn, repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return body, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--columns", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    columns, rows = build_rows(args.rows, args.columns)
+    meta = {"rowCount": len(rows), "executionTime": 1.0, "error": None}
+    cases = {
+        "shell: QueryResult + jsonable_encoder (old)": lambda: old_shell(columns, rows),
+        "published: dict rows + jsonable_encoder (old)": lambda: old_published(columns, rows),
+        "json rows": lambda: encode_result(JSON, columns, rows, meta),
+        "json object rows": lambda: encode_result(JSON, columns, rows, meta, row_objects=True),
+        "columnar json": lambda: encode_result(COLUMNAR_JSON, columns, rows, meta),
+    }
+    if pyarrow is not None:
+        cases["arrow ipc stream"] = lambda: encode_result(ARROW_STREAM, columns, rows, meta)
+
+    results = []
+    for name, fn in cases.items():
+        body, seconds = timed(fn, args.repeat)
+        results.append({"encoding": name, "ms": round(seconds * 1000, 1), "bytes": len(body)})
+    print(json.dumps({
+        "rows": args.rows,
+        "columns": args.columns,
+        "json_encoder": "orjson" if orjson is not None else "json",
+        "arrow": pyarrow is not None,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
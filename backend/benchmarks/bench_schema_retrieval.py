@@ -0,0 +1,96 @@
+"""Prompt size and retrieval latency for pruned schema context.
+
+Generates synthetic schemas (tables named after business entities, each with
+a handful of columns and foreign keys to earlier tables) and reports, per
+schema size, the full prompt size, the pruned context size, index build time
+and per-prompt retrieval latency.
+
+    python benchmarks/bench_schema_retrieval.py --sizes 10 100 1000 10000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schema_cache import SchemaSnapshot  # noqa: E402
+from schema_retriever import estimate_tokens  # noqa: E402
+
+ENTITIES = [
+    "customer", "order", "invoice", "payment", "product", "category", "supplier", "shipment", "warehouse",
+    "employee", "department", "review", "coupon", "cart", "address", "refund", "subscription", "plan",
+    "ticket", "agent", "campaign", "lead", "account", "region", "store", "inventory", "return", "vendor",
+]
+COLUMNS = ["name", "status", "created_at", "updated_at", "amount", "email", "code", "notes", "quantity", "price"]
+PROMPTS = [
+    "total payment amount per customer last month",
+    "which products are low on inventory in each warehouse",
+    "list open tickets assigned to each agent",
+    "refunds issued for orders with a coupon",
+    "employees per department and region",
+]
+
+
+def generate_tables(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    tables = []
+    for i in range(count):
+        entity = ENTITIES[i % len(ENTITIES)]
+        name = entity if i < len(ENTITIES) else f"{entity}_{i // len(ENTITIES)}"
+        columns = [{"name": "id", "type": "integer", "nullable": False, "default": None, "isPrimaryKey": True,
+                    "isForeignKey": False, "foreignKeyTable": None, "foreignKeyColumn": None}]
+        for col in rng.sample(COLUMNS, 5):
+            columns.append({"name": col, "type": "text", "nullable": True, "default": None, "isPrimaryKey": False,
+                            "isForeignKey": False, "foreignKeyTable": None, "foreignKeyColumn": None})
+        for parent in rng.sample(range(i), min(i, 2)):
+            parent_name = tables[parent]["name"]
+            columns.append({"name": f"{parent_name}_id", "type": "integer", "nullable": True, "default": None,
+                            "isPrimaryKey": False, "isForeignKey": True, "foreignKeyTable": parent_name,
+                            "foreignKeyColumn": "id"})
+        tables.append({"name": name, "rowCount": 0, "description": f"{entity} records", "columns": columns})
+    return tables
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--token-budget", type=int, default=6000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        snapshot = SchemaSnapshot("bench", "public", generate_tables(size), "1")
+        full_tokens = estimate_tokens(snapshot.prompt_text)
+
+        start = time.perf_counter()
+        snapshot.index
+        build_ms = (time.perf_counter() - start) * 1000
+
+        latencies = []
+        context_tokens = []
+        for _ in range(args.repeat):
+            for prompt in PROMPTS:
+                start = time.perf_counter()
+                context = snapshot.prompt_context(prompt, token_budget=args.token_budget)
+                latencies.append((time.perf_counter() - start) * 1000)
+                context_tokens.append(estimate_tokens(context))
+
+        latencies.sort()
+        results.append({
+            "tables": size,
+            "full_prompt_tokens": full_tokens,
+            "pruned_prompt_tokens_mean": round(statistics.mean(context_tokens)),
+            "index_build_ms": round(build_ms, 2),
+            "retrieval_ms_p50": round(latencies[len(latencies) // 2], 3),
+            "retrieval_ms_p99": round(latencies[int(len(latencies) * 0.99) - 1], 3),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
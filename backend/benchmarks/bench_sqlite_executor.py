@@ -0,0 +1,97 @@
+"""SQLite on the event loop vs. on the SQLite executor.
+
+Runs --concurrency copies of a lookup query against a generated SQLite file,
+first the old way (sqlite3.connect + query inline in the coroutine) and then
+through sqlite_executor. Alongside, a ticker coroutine measures how late the
+event loop wakes it up, which is what every other request on the worker
+would experience.
+
+    python benchmarks/bench_sqlite_executor.py --requests 2000 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlite_executor import SQLiteExecutor  # noqa: E402
+
+QUERY = "SELECT id, name, score FROM items WHERE score BETWEEN ? AND ? ORDER BY score LIMIT 50"
+
+
+def build_database(path: str, rows: int):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT, score REAL)")
+    conn.executemany("INSERT INTO items VALUES (?, ?, ?)", ((i, f"item{i}", (i * 7919) % rows) for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+async def ticker(stop: asyncio.Event, lags):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append((time.perf_counter() - start - 0.001) * 1000)
+
+
+async def inline_query(path: str, i: int):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(QUERY, (i % 1000, i % 1000 + 500)).fetchall()
+    finally:
+        conn.close()
+
+
+async def run(mode: str, path: str, requests: int, concurrency: int, executor: SQLiteExecutor):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            if mode == "inline":
+                await inline_query(path, i)
+            else:
+                await executor.fetch(path, QUERY, (i % 1000, i % 1000 + 500))
+
+    lags = []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+    lags.sort()
+    return {
+        "mode": mode,
+        "requests_per_s": round(requests / elapsed),
+        "loop_lag_ms_p50": round(lags[len(lags) // 2], 2) if lags else None,
+        "loop_lag_ms_max": round(lags[-1], 2) if lags else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--db", default="/tmp/sqlite_executor_bench.db")
+    args = parser.parse_args()
+
+    build_database(args.db, args.rows)
+    executor = SQLiteExecutor()
+    results = [
+        asyncio.run(run(mode, args.db, args.requests, args.concurrency, executor))
+        for mode in ("inline", "executor")
+    ]
+    executor.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from supabase import create_client, Client
+from metadata_store import MetadataStore
 import os
 from dotenv import load_dotenv
 
@@ -8,3 +9,4 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+metadata_store = MetadataStore(supabase)
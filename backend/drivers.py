@@ -0,0 +1,297 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import asyncpg
+
+from introspection import (
+    count_mysql_rows, count_postgres_rows, count_sqlite_rows, get_mysql_indexes, get_mysql_schema,
+    get_mysql_schema_version, get_postgres_indexes, get_postgres_schema, get_postgres_schema_version,
+    get_sqlite_indexes, get_sqlite_schema, get_sqlite_schema_version, mysql_fetch, quote_ident, quote_mysql_ident,
+)
+from pool import POOL_CONNECT_TIMEOUT, mysql_pool_manager, pool_manager
+from sqlite_executor import sqlite_executor
+from statements import CompiledStatement, adapt_postgres_args, mysql_args
+from streaming import STREAM_FETCH_SIZE, mysql_events, postgres_events, sqlite_events
+
+Rows = Tuple[List[str], List[Sequence[Any]]]
+
+
+class Driver:
+    """Everything the routes need from a user database, per engine.
+
+    Instances are cheap and made per request by get_driver; connections live
+    in the shared pools (pool_manager, mysql_pool_manager, sqlite_executor).
+    """
+
+    dialect = ''
+
+    def __init__(self, db_id: Optional[str], db_config: Dict[str, Any]):
+        self.db_id = db_id
+        self.db_config = db_config
+
+    @property
+    def database(self) -> str:
+        return self.db_config['database_name']
+
+    @property
+    def schema_name(self) -> str:
+        return self.database
+
+    def quote(self, name: str) -> str:
+        return quote_ident(name)
+
+    async def check(self):
+        """Opens (and closes) a connection; raises if the database is unreachable."""
+        raise NotImplementedError
+
+    # fetch/execute/run_statement raise asyncio.TimeoutError once timeout
+    # seconds pass, and stop the statement on the server when that happens or
+    # when the awaiting task is cancelled.
+
+    async def fetch(self, sql: str, args: Optional[Sequence[Any]] = None, timeout: Optional[float] = None) -> Rows:
+        """Runs a read-only query."""
+        raise NotImplementedError
+
+    async def execute(self, sql: str, args: Optional[Sequence[Any]] = None, timeout: Optional[float] = None) -> Rows:
+        """Runs any statement and commits it."""
+        raise NotImplementedError
+
+    async def run_statement(self, statement: CompiledStatement, args: List[Any], timeout: Optional[float] = None) -> Rows:
+        raise NotImplementedError
+
+    def stream(self, sql: str, fetch_size: int = STREAM_FETCH_SIZE) -> AsyncIterator[Any]:
+        """Yields the column list, then batches of rows."""
+        raise NotImplementedError
+
+    async def introspect(self, row_counts: str = 'estimate') -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def schema_version(self) -> Optional[str]:
+        raise NotImplementedError
+
+    async def count_rows(self, table_name: str, timeout: Optional[float] = None) -> int:
+        """Exact COUNT(*); raises asyncio.TimeoutError when over the budget."""
+        raise NotImplementedError
+
+    async def explain(self, sql: str, analyze: bool = False, timeout: Optional[float] = None) -> Any:
+        """The engine's own plan output for sql. Only Postgres can analyze
+        (run the statement for actual timings); it rolls the run back."""
+        raise NotImplementedError
+
+    async def indexes(self) -> Dict[str, List[List[str]]]:
+        """Column lists of every index, keyed by table."""
+        raise NotImplementedError
+
+
+class PostgresDriver(Driver):
+    dialect = 'postgres'
+
+    @property
+    def schema_name(self) -> str:
+        return 'public'
+
+    async def check(self):
+        conn = await asyncpg.connect(
+            user=self.db_config['username'],
+            password=self.db_config['password'],
+            database=self.database,
+            host=self.db_config['host'],
+            port=self.db_config['port'],
+            timeout=POOL_CONNECT_TIMEOUT,
+        )
+        await conn.close()
+
+    async def fetch(self, sql: str, args: Optional[Sequence[Any]] = None, timeout: Optional[float] = None) -> Rows:
+        # asyncpg sends a cancel request to the server on timeout or cancellation
+        async with pool_manager.acquire(self.db_id, self.db_config) as conn:
+            return await conn.run(sql, lambda pg_types: args or (), timeout=timeout)
+
+    # asyncpg runs outside an explicit transaction, so every statement commits
+    execute = fetch
+
+    async def run_statement(self, statement: CompiledStatement, args: List[Any], timeout: Optional[float] = None) -> Rows:
+        async with pool_manager.acquire(self.db_id, self.db_config) as conn:
+            # Parameter types come from the connection's first prepare() of the statement
+            return await conn.run(statement.postgres_sql,
+                                  lambda pg_types: adapt_postgres_args(statement, args, pg_types), timeout=timeout)
+
+    async def stream(self, sql: str, fetch_size: int = STREAM_FETCH_SIZE) -> AsyncIterator[Any]:
+        # The pooled connection is held for as long as the client reads
+        async with pool_manager.acquire(self.db_id, self.db_config) as conn:
+            async for event in postgres_events(conn, sql, fetch_size):
+                yield event
+
+    async def introspect(self, row_counts: str = 'estimate') -> List[Dict[str, Any]]:
+        async with pool_manager.acquire(self.db_id, self.db_config) as conn:
+            return await get_postgres_schema(conn, self.database, self.schema_name, row_counts=row_counts)
+
+    async def schema_version(self) -> Optional[str]:
+        async with pool_manager.acquire(self.db_id, self.db_config) as conn:
+            return await get_postgres_schema_version(conn, self.schema_name)
+
+    async def count_rows(self, table_name: str, timeout: Optional[float] = None) -> int:
+        async with pool_manager.acquire(self.db_id, self.db_config) as conn:
+            return await count_postgres_rows(conn, table_name, self.schema_name, timeout=timeout)
+
+    async def explain(self, sql: str, analyze: bool = False, timeout: Optional[float] = None) -> Any:
+        options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+        async with pool_manager.acquire(self.db_id, self.db_config) as conn:
+            transaction = conn.transaction()
+            await transaction.start()
+            try:
+                plan = await conn.fetchval(f"EXPLAIN ({options}) {sql}", timeout=timeout)
+            finally:
+                # EXPLAIN ANALYZE really runs writes; none of it is kept
+                await transaction.rollback()
+        return json.loads(plan) if isinstance(plan, str) else plan
+
+    async def indexes(self) -> Dict[str, List[List[str]]]:
+        async with pool_manager.acquire(self.db_id, self.db_config) as conn:
+            return await get_postgres_indexes(conn, self.schema_name)
+
+
+class SQLiteDriver(Driver):
+    dialect = 'sqlite'
+
+    async def check(self):
+        await sqlite_executor.run(self.database, lambda conn: None, readonly=True)
+
+    async def fetch(self, sql: str, args: Optional[Sequence[Any]] = None, timeout: Optional[float] = None) -> Rows:
+        return await sqlite_executor.fetch(self.database, sql, args or (), timeout=timeout)
+
+    async def execute(self, sql: str, args: Optional[Sequence[Any]] = None, timeout: Optional[float] = None) -> Rows:
+        return await sqlite_executor.execute(self.database, sql, args or (), timeout=timeout)
+
+    async def run_statement(self, statement: CompiledStatement, args: List[Any], timeout: Optional[float] = None) -> Rows:
+        return await self.execute(statement.sqlite_sql, args, timeout=timeout)
+
+    def stream(self, sql: str, fetch_size: int = STREAM_FETCH_SIZE) -> AsyncIterator[Any]:
+        return sqlite_events(self.database, sql, fetch_size)
+
+    async def introspect(self, row_counts: str = 'estimate') -> List[Dict[str, Any]]:
+        return await sqlite_executor.run(self.database, get_sqlite_schema, self.database,
+                                         row_counts=row_counts, readonly=True)
+
+    async def schema_version(self) -> Optional[str]:
+        return await sqlite_executor.run(self.database, get_sqlite_schema_version, readonly=True)
+
+    async def count_rows(self, table_name: str, timeout: Optional[float] = None) -> int:
+        # The executor interrupts the COUNT(*) and raises asyncio.TimeoutError
+        return await sqlite_executor.run(self.database, count_sqlite_rows, table_name,
+                                         timeout=timeout, readonly=True)
+
+    async def explain(self, sql: str, analyze: bool = False, timeout: Optional[float] = None) -> Any:
+        _, rows = await self.fetch(f"EXPLAIN QUERY PLAN {sql}", timeout=timeout)
+        return [{"id": row[0], "parent": row[1], "detail": row[3]} for row in rows]
+
+    async def indexes(self) -> Dict[str, List[List[str]]]:
+        return await sqlite_executor.run(self.database, get_sqlite_indexes, readonly=True)
+
+
+class MySQLDriver(Driver):
+    dialect = 'mysql'
+
+    def quote(self, name: str) -> str:
+        return quote_mysql_ident(name)
+
+    async def check(self):
+        conn = await self._connect()
+        conn.close()
+
+    async def _connect(self):
+        return await mysql_pool_manager.module.connect(
+            host=self.db_config['host'],
+            port=int(self.db_config['port'] or 3306),
+            user=self.db_config['username'],
+            password=self.db_config['password'] or '',
+            db=self.database,
+            connect_timeout=POOL_CONNECT_TIMEOUT,
+        )
+
+    async def _kill_query(self, thread_id: int):
+        try:
+            conn = await self._connect()
+        except Exception as e:
+            print(f"Could not connect to cancel MySQL query {thread_id}: {str(e)}")
+            return
+        try:
+            async with conn.cursor() as cursor:
+                await cursor.execute(f"KILL QUERY {int(thread_id)}")
+        except Exception as e:
+            # Most likely the query finished in the meantime
+            print(f"KILL QUERY {thread_id} failed: {str(e)}")
+        finally:
+            conn.close()
+
+    async def fetch(self, sql: str, args: Optional[Sequence[Any]] = None, timeout: Optional[float] = None) -> Rows:
+        async with mysql_pool_manager.acquire(self.db_id, self.db_config) as conn:
+            async def run():
+                async with conn.cursor() as cursor:
+                    # Without args the driver leaves % alone, so raw SQL with LIKE
+                    # patterns passes through unescaped
+                    await cursor.execute(sql, args)
+                    rows = await cursor.fetchall()
+                    columns = [d[0] for d in cursor.description] if cursor.description else []
+                return columns, list(rows)
+
+            try:
+                return await asyncio.wait_for(run(), timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                # The server keeps going after the client stops reading; stop it
+                # there too, and drop the connection since it is mid-result
+                await asyncio.shield(self._kill_query(conn.thread_id()))
+                conn.close()
+                raise
+
+    # Pools are created with autocommit=True
+    execute = fetch
+
+    async def run_statement(self, statement: CompiledStatement, args: List[Any], timeout: Optional[float] = None) -> Rows:
+        return await self.execute(statement.mysql_sql, mysql_args(args), timeout=timeout)
+
+    async def stream(self, sql: str, fetch_size: int = STREAM_FETCH_SIZE) -> AsyncIterator[Any]:
+        async with mysql_pool_manager.acquire(self.db_id, self.db_config) as conn:
+            async for event in mysql_events(conn, sql, fetch_size, mysql_pool_manager.module.SSCursor):
+                yield event
+
+    async def introspect(self, row_counts: str = 'estimate') -> List[Dict[str, Any]]:
+        async with mysql_pool_manager.acquire(self.db_id, self.db_config) as conn:
+            return await get_mysql_schema(conn, self.database, row_counts=row_counts)
+
+    async def schema_version(self) -> Optional[str]:
+        async with mysql_pool_manager.acquire(self.db_id, self.db_config) as conn:
+            return await get_mysql_schema_version(conn, self.database)
+
+    async def count_rows(self, table_name: str, timeout: Optional[float] = None) -> int:
+        async with mysql_pool_manager.acquire(self.db_id, self.db_config) as conn:
+            return await count_mysql_rows(conn, table_name, self.database, timeout=timeout)
+
+    async def explain(self, sql: str, analyze: bool = False, timeout: Optional[float] = None) -> Any:
+        async with mysql_pool_manager.acquire(self.db_id, self.db_config) as conn:
+            rows = await asyncio.wait_for(mysql_fetch(conn, f"EXPLAIN FORMAT=JSON {sql}"), timeout=timeout)
+        return json.loads(next(iter(rows[0].values())))
+
+    async def indexes(self) -> Dict[str, List[List[str]]]:
+        async with mysql_pool_manager.acquire(self.db_id, self.db_config) as conn:
+            return await get_mysql_indexes(conn, self.database)
+
+
+DRIVERS = {
+    'PostgreSQL': PostgresDriver,
+    'MySQL': MySQLDriver,
+    'SQLite': SQLiteDriver,
+}
+
+
+def sql_dialect(db_config: Dict[str, Any]) -> str:
+    """The Driver.dialect of the connection, for analyze_sql."""
+    driver = DRIVERS.get(db_config['type'])
+    return driver.dialect if driver is not None else ''
+
+
+def get_driver(db_id: Optional[str], db_config: Dict[str, Any]) -> Driver:
+    driver = DRIVERS.get(db_config['type'])
+    if driver is None:
+        raise ValueError(f"Unsupported database type: {db_config['type']}")
+    return driver(db_id, db_config)
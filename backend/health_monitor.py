@@ -0,0 +1,265 @@
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from drivers import get_driver
+
+HEALTH_MONITOR_ENABLED = os.getenv("HEALTH_MONITOR_ENABLED", "true").lower() in ("1", "true", "yes")
+# Seconds between probes of a healthy connection, +/- HEALTH_CHECK_JITTER of it
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "60"))
+HEALTH_CHECK_JITTER = float(os.getenv("HEALTH_CHECK_JITTER", "0.2"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "10"))
+HEALTH_CHECK_CONCURRENCY = int(os.getenv("HEALTH_CHECK_CONCURRENCY", "10"))
+# Failing connections back off exponentially up to this many seconds
+HEALTH_CHECK_MAX_BACKOFF = float(os.getenv("HEALTH_CHECK_MAX_BACKOFF", "900"))
+# How often probe results are written back, and the connection list re-read
+HEALTH_FLUSH_INTERVAL = float(os.getenv("HEALTH_FLUSH_INTERVAL", "5"))
+HEALTH_REFRESH_INTERVAL = float(os.getenv("HEALTH_REFRESH_INTERVAL", "60"))
+
+# Columns written back; latency_ms and last_checked need the ALTER TABLE in
+# readme.md, and are left out while the table does not have them
+HEALTH_COLUMNS = ("status", "last_connected", "latency_ms", "last_checked")
+BASE_HEALTH_COLUMNS = ("status", "last_connected")
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _missing_column(error: Exception) -> bool:
+    message = str(error).lower()
+    return "column" in message and any(c in message for c in HEALTH_COLUMNS if c not in BASE_HEALTH_COLUMNS)
+
+
+class _Target:
+    def __init__(self, row: Dict[str, Any], due: float):
+        self.row = row
+        self.due = due
+        self.failures = 0
+        self.probing = False
+        self.health: Optional[Dict[str, Any]] = None
+
+    @property
+    def db_id(self) -> str:
+        return self.row["id"]
+
+
+class HealthMonitor:
+    """Probes every registered connection in the background.
+
+    Each connection has its own next-due time (jittered so probes do not line
+    up, backed off exponentially while it fails), at most `concurrency` probes
+    run at once, and results are buffered and written back (health columns
+    only) in one batched upsert per flush, backing off while writes fail.
+    The latest results are also kept in memory and overlaid on the cached
+    list the dashboard reads, so that read never touches a database.
+    """
+
+    def __init__(self, store, interval: float = HEALTH_CHECK_INTERVAL, jitter: float = HEALTH_CHECK_JITTER,
+                 timeout: float = HEALTH_CHECK_TIMEOUT, concurrency: int = HEALTH_CHECK_CONCURRENCY,
+                 max_backoff: float = HEALTH_CHECK_MAX_BACKOFF, flush_interval: float = HEALTH_FLUSH_INTERVAL,
+                 refresh_interval: float = HEALTH_REFRESH_INTERVAL):
+        self.store = store
+        self.interval = interval
+        self.jitter = jitter
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.max_backoff = max_backoff
+        self.flush_interval = flush_interval
+        self.refresh_interval = refresh_interval
+        self._targets: Dict[str, _Target] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._probes: set = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.probes = 0
+        self.failures = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.rows_written = 0
+        self._columns = HEALTH_COLUMNS
+        self._failed_flushes = 0
+        self._flush_after = 0.0
+
+    async def start(self):
+        if self._task is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        for probe in list(self._probes):
+            probe.cancel()
+        await asyncio.gather(self._task, *self._probes, return_exceptions=True)
+        self._task = None
+        await self.flush(force=True)
+
+    def next_delay(self, failures: int) -> float:
+        delay = min(self.interval * (2 ** min(failures, 16)), self.max_backoff) if failures else self.interval
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def track(self, row: Dict[str, Any]):
+        """Starts probing a connection right away (e.g. one just added)."""
+        if self._task is None:
+            return
+        target = self._targets.get(row["id"])
+        if target is None:
+            self._targets[row["id"]] = _Target(row, time.monotonic())
+        else:
+            target.row = row
+            target.due = time.monotonic()
+        self._wakeup.set()
+
+    def forget(self, db_id: str):
+        self._targets.pop(db_id, None)
+        self._pending.pop(db_id, None)
+
+    async def refresh(self):
+        rows = await self.store.list_all_database_connections()
+        now = time.monotonic()
+        seen = set()
+        for row in rows:
+            seen.add(row["id"])
+            target = self._targets.get(row["id"])
+            if target is None:
+                # Spread the first round of probes instead of firing them together
+                self._targets[row["id"]] = _Target(row, now + random.uniform(0, min(self.interval, self.flush_interval * 2)))
+            else:
+                target.row = row
+        for db_id in list(self._targets):
+            if db_id not in seen:
+                self.forget(db_id)
+
+    async def probe(self, target: _Target):
+        async with self._semaphore:
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(get_driver(target.db_id, target.row).check(), self.timeout)
+                ok = True
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                ok = False
+            latency_ms = round((time.perf_counter() - started) * 1000, 2)
+        self.probes += 1
+        checked = _now_iso()
+        previous = target.health or target.row
+        if ok:
+            target.failures = 0
+            health = {"status": "connected", "last_connected": checked, "latency_ms": latency_ms}
+        else:
+            self.failures += 1
+            target.failures += 1
+            health = {"status": "disconnected", "last_connected": previous.get("last_connected"), "latency_ms": None}
+        health["last_checked"] = checked
+        target.health = health
+        target.due = time.monotonic() + self.next_delay(target.failures)
+        if target.db_id in self._targets:
+            self._pending[target.db_id] = health
+
+    def _spawn(self, target: _Target):
+        target.probing = True
+
+        async def run():
+            try:
+                await self.probe(target)
+            finally:
+                target.probing = False
+                self._wakeup.set()
+
+        task = asyncio.create_task(run())
+        self._probes.add(task)
+        task.add_done_callback(self._probes.discard)
+
+    async def flush(self, force: bool = False):
+        if not self._pending or (not force and time.monotonic() < self._flush_after):
+            return
+        pending, self._pending = self._pending, {}
+        # Only connections still registered are written back
+        pending = {db_id: health for db_id, health in pending.items() if db_id in self._targets}
+        if not pending:
+            return
+        columns = self._columns
+        rows = [{"id": db_id, **{c: health[c] for c in columns}} for db_id, health in pending.items()]
+        self.flushes += 1
+        try:
+            await self.store.upsert_database_connection_health(rows)
+        except Exception as e:
+            error = e
+        else:
+            self.rows_written += len(rows)
+            if self._failed_flushes:
+                print("Health status flush recovered")
+            self._failed_flushes = 0
+            return
+
+        self.flush_errors += 1
+        # Results that came in meanwhile are newer than the ones being retried
+        for db_id, health in pending.items():
+            self._pending.setdefault(db_id, health)
+        if columns == HEALTH_COLUMNS and _missing_column(error):
+            self._columns = BASE_HEALTH_COLUMNS
+            print("database_connections has no latency_ms/last_checked columns (see readme.md); "
+                  "writing status and last_connected only")
+            return
+        # Log once per outage, and wait longer between attempts while it lasts
+        self._failed_flushes += 1
+        if self._failed_flushes == 1:
+            print(f"Health status flush failed: {str(error)}")
+        self._flush_after = time.monotonic() + min(self.flush_interval * 2 ** self._failed_flushes, self.max_backoff)
+
+    async def _run(self):
+        next_refresh = next_flush = time.monotonic()
+        while True:
+            if time.monotonic() >= next_refresh:
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    print(f"Health monitor refresh failed: {str(e)}")
+                next_refresh = time.monotonic() + self.refresh_interval
+            if time.monotonic() >= next_flush:
+                await self.flush()
+                next_flush = time.monotonic() + self.flush_interval
+            now = time.monotonic()
+            wake_at = min(next_refresh, next_flush)
+            for target in list(self._targets.values()):
+                if target.probing:
+                    continue
+                if target.due <= now:
+                    self._spawn(target)
+                else:
+                    wake_at = min(wake_at, target.due)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(wake_at - time.monotonic(), 0.01))
+            except asyncio.TimeoutError:
+                pass
+
+    def apply(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Overlays the latest probe results on (cached) database_connections rows."""
+        out = []
+        for row in rows:
+            target = self._targets.get(row.get("id"))
+            out.append({**row, **target.health} if target is not None and target.health else row)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self._task is not None,
+            "connections": len(self._targets),
+            "disconnected": sum(1 for t in self._targets.values() if t.failures),
+            "probing": len(self._probes),
+            "probes": self.probes,
+            "failures": self.failures,
+            "pending_writes": len(self._pending),
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "rows_written": self.rows_written,
+        }
@@ -0,0 +1,371 @@
+import asyncio
+import sqlite3
+from typing import Any, Dict, List, Optional
+from models import DatabaseTable
+
+# Row counts default to catalog estimates; 'none' skips them (used when only
+# the column layout is needed). Exact counts are taken per table, within a
+# time budget, by the count_*_rows functions.
+ROW_COUNT_MODES = ('estimate', 'none')
+
+# Postgres introspection runs a fixed number of catalog queries for the whole
+# schema and joins the results in Python, instead of querying per table.
+POSTGRES_TABLES_QUERY = """
+    SELECT
+        c.oid,
+        c.relname AS table_name,
+        obj_description(c.oid, 'pg_class') AS description,
+        GREATEST(c.reltuples, 0)::bigint AS estimated_rows,
+        c.relkind = 'v' AS is_view
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = $1 AND c.relkind IN ('r', 'p', 'v', 'f')
+    ORDER BY c.relname
+"""
+
+POSTGRES_COLUMNS_QUERY = """
+    SELECT
+        a.attrelid AS table_oid,
+        a.attname AS column_name,
+        format_type(a.atttypid, NULL) AS data_type,
+        NOT a.attnotnull AS nullable,
+        pg_get_expr(d.adbin, d.adrelid) AS column_default
+    FROM pg_attribute a
+    JOIN pg_class c ON c.oid = a.attrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+    WHERE n.nspname = $1 AND c.relkind IN ('r', 'p', 'v', 'f')
+      AND a.attnum > 0 AND NOT a.attisdropped
+    ORDER BY a.attrelid, a.attnum
+"""
+
+POSTGRES_KEYS_QUERY = """
+    SELECT
+        con.conrelid AS table_oid,
+        con.contype,
+        a.attname AS column_name,
+        fc.relname AS fk_table,
+        fa.attname AS fk_column
+    FROM pg_constraint con
+    JOIN pg_class c ON c.oid = con.conrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    CROSS JOIN LATERAL unnest(con.conkey, con.confkey) AS k(attnum, fattnum)
+    JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+    LEFT JOIN pg_class fc ON fc.oid = con.confrelid
+    LEFT JOIN pg_attribute fa ON fa.attrelid = con.confrelid AND fa.attnum = k.fattnum
+    WHERE n.nspname = $1 AND con.contype IN ('p', 'f')
+"""
+
+
+def quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+async def get_postgres_schema(conn, db_name: str, schema: str = 'public', row_counts: str = 'estimate') -> List[DatabaseTable]:
+    table_rows = await conn.fetch(POSTGRES_TABLES_QUERY, schema)
+    column_rows = await conn.fetch(POSTGRES_COLUMNS_QUERY, schema)
+    key_rows = await conn.fetch(POSTGRES_KEYS_QUERY, schema)
+
+    primary_keys = set()
+    foreign_keys: Dict[tuple, tuple] = {}
+    for key in key_rows:
+        if key['contype'] == 'p':
+            primary_keys.add((key['table_oid'], key['column_name']))
+        else:
+            foreign_keys.setdefault((key['table_oid'], key['column_name']), (key['fk_table'], key['fk_column']))
+
+    columns_by_table: Dict[Any, List[Dict[str, Any]]] = {}
+    for col in column_rows:
+        oid = col['table_oid']
+        fk = foreign_keys.get((oid, col['column_name']))
+        columns_by_table.setdefault(oid, []).append({
+            "name": col['column_name'],
+            "type": col['data_type'],
+            "nullable": col['nullable'],
+            "default": col['column_default'],
+            "isPrimaryKey": (oid, col['column_name']) in primary_keys,
+            "isForeignKey": fk is not None,
+            "foreignKeyTable": fk[0] if fk else None,
+            "foreignKeyColumn": fk[1] if fk else None
+        })
+
+    tables = []
+    for table_row in table_rows:
+        table_name = table_row['table_name']
+        row_count = 0
+        if row_counts == 'estimate':
+            row_count = table_row['estimated_rows']
+        tables.append({
+            "name": table_name,
+            "rowCount": row_count,
+            "rowCountIsEstimate": row_counts == 'estimate',
+            "description": table_row['description'],
+            "isView": table_row['is_view'],
+            "columns": columns_by_table.get(table_row['oid'], [])
+        })
+
+    return tables
+
+
+async def count_postgres_rows(conn, table_name: str, schema: str = 'public', timeout: Optional[float] = None) -> int:
+    # asyncpg cancels the statement server-side when the timeout expires
+    query = f"SELECT COUNT(*) FROM {quote_ident(schema)}.{quote_ident(table_name)}"
+    return await conn.fetchval(query, timeout=timeout)
+
+# Cheap change detection: any DDL rewrites the xmin of the catalog rows it
+# touches, so a hash over (oid, xmin) pairs changes whenever the schema does.
+POSTGRES_SCHEMA_VERSION_QUERY = """
+    SELECT md5(coalesce(string_agg(v, ',' ORDER BY v), '')) FROM (
+        SELECT c.oid::text || ':' || c.xmin::text AS v
+        FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = $1 AND c.relkind IN ('r', 'p', 'v', 'f')
+        UNION ALL
+        SELECT a.attrelid::text || '.' || a.attnum::text || ':' || a.xmin::text
+        FROM pg_attribute a JOIN pg_class c ON c.oid = a.attrelid JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = $1 AND c.relkind IN ('r', 'p', 'v', 'f') AND a.attnum > 0
+        UNION ALL
+        SELECT con.oid::text || ':' || con.xmin::text
+        FROM pg_constraint con JOIN pg_namespace n ON n.oid = con.connamespace
+        WHERE n.nspname = $1
+        UNION ALL
+        SELECT d.objoid::text || '/' || d.objsubid::text || ':' || d.xmin::text
+        FROM pg_description d JOIN pg_class c ON c.oid = d.objoid JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = $1 AND d.classoid = 'pg_class'::regclass
+    ) versions
+"""
+
+async def get_postgres_schema_version(conn, schema: str = 'public') -> str:
+    return await conn.fetchval(POSTGRES_SCHEMA_VERSION_QUERY, schema)
+
+# Column and table-comment checksums; any DDL that changes the layout changes them
+MYSQL_SCHEMA_VERSION_QUERY = """
+    SELECT CONCAT(
+        COUNT(*), ':', COALESCE(SUM(CRC32(CONCAT_WS(':', TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION,
+                                                   COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY))), 0), ':',
+        (SELECT COALESCE(SUM(CRC32(CONCAT_WS(':', TABLE_NAME, TABLE_COMMENT))), 0)
+         FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s))
+    FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = %s
+"""
+
+async def get_mysql_schema_version(conn, db_name: str) -> str:
+    rows = await mysql_fetch(conn, MYSQL_SCHEMA_VERSION_QUERY, (db_name, db_name))
+    return str(next(iter(rows[0].values())))
+
+def get_sqlite_schema_version(conn) -> str:
+    # Incremented by SQLite on every schema change
+    return str(conn.execute("PRAGMA schema_version").fetchone()[0])
+
+# Index columns in key order, per table; the query plan analysis uses them to
+# find foreign key columns that no index starts with.
+POSTGRES_INDEXES_QUERY = """
+    SELECT t.relname AS table_name, array_agg(a.attname ORDER BY k.ord) AS columns
+    FROM pg_index i
+    JOIN pg_class t ON t.oid = i.indrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    CROSS JOIN LATERAL unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+    JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+    WHERE n.nspname = $1
+    GROUP BY t.relname, i.indexrelid
+"""
+
+async def get_postgres_indexes(conn, schema: str = 'public') -> Dict[str, List[List[str]]]:
+    indexes: Dict[str, List[List[str]]] = {}
+    for row in await conn.fetch(POSTGRES_INDEXES_QUERY, schema):
+        indexes.setdefault(row['table_name'], []).append(list(row['columns']))
+    return indexes
+
+MYSQL_INDEXES_QUERY = """
+    SELECT TABLE_NAME, INDEX_NAME, COLUMN_NAME
+    FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = %s
+    ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+"""
+
+async def get_mysql_indexes(conn, db_name: str) -> Dict[str, List[List[str]]]:
+    return _group_indexes((r['TABLE_NAME'], r['INDEX_NAME'], r['COLUMN_NAME'])
+                          for r in await mysql_fetch(conn, MYSQL_INDEXES_QUERY, (db_name,)))
+
+def get_sqlite_indexes(conn) -> Dict[str, List[List[str]]]:
+    return _group_indexes(conn.execute(
+        "SELECT m.name, il.name, ii.name FROM sqlite_master m "
+        "JOIN pragma_index_list(m.name) il JOIN pragma_index_info(il.name) ii "
+        "WHERE m.type = 'table' ORDER BY m.name, il.name, ii.seqno"
+    ).fetchall())
+
+def _group_indexes(rows) -> Dict[str, List[List[str]]]:
+    by_index: Dict[tuple, List[str]] = {}
+    for table_name, index_name, column_name in rows:
+        by_index.setdefault((table_name, index_name), []).append(column_name)
+    indexes: Dict[str, List[List[str]]] = {}
+    for (table_name, _), columns in by_index.items():
+        indexes.setdefault(table_name, []).append(columns)
+    return indexes
+
+MYSQL_TABLES_QUERY = """
+    SELECT TABLE_NAME, TABLE_COMMENT, TABLE_ROWS, TABLE_TYPE
+    FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA = %s
+    ORDER BY TABLE_NAME
+"""
+
+MYSQL_COLUMNS_QUERY = """
+    SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, IS_NULLABLE, COLUMN_DEFAULT, COLUMN_KEY
+    FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = %s
+    ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+
+MYSQL_FOREIGN_KEYS_QUERY = """
+    SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+    FROM information_schema.KEY_COLUMN_USAGE
+    WHERE TABLE_SCHEMA = %s AND REFERENCED_TABLE_NAME IS NOT NULL
+"""
+
+
+def quote_mysql_ident(name: str) -> str:
+    return '`' + name.replace('`', '``') + '`'
+
+
+async def mysql_fetch(conn, query: str, args=None) -> List[Dict[str, Any]]:
+    async with conn.cursor() as cursor:
+        await cursor.execute(query, args)
+        rows = await cursor.fetchall()
+        columns = [d[0] for d in cursor.description] if cursor.description else []
+    return [dict(zip(columns, row)) for row in rows]
+
+
+async def count_mysql_rows(conn, table_name: str, db_name: str, timeout: Optional[float] = None) -> int:
+    # The optimizer hint makes the server abandon the scan, not just the client
+    hint = f"/*+ MAX_EXECUTION_TIME({int(timeout * 1000)}) */ " if timeout is not None else ""
+    query = f"SELECT {hint}COUNT(*) AS n FROM {quote_mysql_ident(db_name)}.{quote_mysql_ident(table_name)}"
+    try:
+        rows = await asyncio.wait_for(mysql_fetch(conn, query), timeout=timeout)
+    except Exception as e:
+        # ER_QUERY_TIMEOUT: the server hit MAX_EXECUTION_TIME first
+        if e.args and e.args[0] == 3024:
+            raise asyncio.TimeoutError() from e
+        raise
+    return rows[0]['n']
+
+
+async def get_mysql_schema(conn, db_name: str, row_counts: str = 'estimate') -> List[DatabaseTable]:
+    # Three information_schema queries for the whole database, joined here
+    table_rows = await mysql_fetch(conn, MYSQL_TABLES_QUERY, (db_name,))
+    column_rows = await mysql_fetch(conn, MYSQL_COLUMNS_QUERY, (db_name,))
+    fk_rows = await mysql_fetch(conn, MYSQL_FOREIGN_KEYS_QUERY, (db_name,))
+
+    foreign_keys = {
+        (fk['TABLE_NAME'], fk['COLUMN_NAME']): (fk['REFERENCED_TABLE_NAME'], fk['REFERENCED_COLUMN_NAME'])
+        for fk in fk_rows
+    }
+    columns_by_table: Dict[str, List[Dict[str, Any]]] = {}
+    for col in column_rows:
+        fk = foreign_keys.get((col['TABLE_NAME'], col['COLUMN_NAME']))
+        columns_by_table.setdefault(col['TABLE_NAME'], []).append({
+            "name": col['COLUMN_NAME'],
+            "type": col['DATA_TYPE'],
+            "nullable": col['IS_NULLABLE'] == 'YES',
+            "default": col['COLUMN_DEFAULT'],
+            "isPrimaryKey": col['COLUMN_KEY'] == 'PRI',
+            "isForeignKey": fk is not None,
+            "foreignKeyTable": fk[0] if fk else None,
+            "foreignKeyColumn": fk[1] if fk else None
+        })
+
+    tables = []
+    for table_row in table_rows:
+        table_name = table_row['TABLE_NAME']
+        row_count = 0
+        if row_counts == 'estimate':
+            row_count = table_row['TABLE_ROWS'] or 0
+        tables.append({
+            "name": table_name,
+            "rowCount": row_count,
+            "rowCountIsEstimate": row_counts == 'estimate',
+            "description": table_row['TABLE_COMMENT'],
+            "isView": table_row['TABLE_TYPE'] == 'VIEW',
+            "columns": columns_by_table.get(table_name, [])
+        })
+
+    return tables
+
+def _sqlite_row_estimates(cursor) -> Dict[str, int]:
+    # sqlite_stat1 only exists once ANALYZE has run; the first number of each
+    # stat is the (approximate) row count of the table or index.
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='sqlite_stat1'")
+    if not cursor.fetchone():
+        return {}
+    estimates: Dict[str, int] = {}
+    cursor.execute("SELECT tbl, stat FROM sqlite_stat1")
+    for tbl, stat in cursor.fetchall():
+        try:
+            rows = int(str(stat).split()[0])
+        except (ValueError, IndexError):
+            continue
+        estimates[tbl] = max(estimates.get(tbl, 0), rows)
+    return estimates
+
+def _sqlite_rowid_estimate(cursor, table_name: str) -> int:
+    # MAX(rowid) is a b-tree seek; it over-counts after deletes but never scans
+    try:
+        cursor.execute(f"SELECT MAX(rowid) FROM {quote_ident(table_name)}")
+        return cursor.fetchone()[0] or 0
+    except sqlite3.OperationalError:  # WITHOUT ROWID tables
+        return 0
+
+def count_sqlite_rows(conn, table_name: str) -> int:
+    # COUNT(*) runs as a single b-tree opcode that progress handlers never see;
+    # sqlite_executor's timeout interrupts the connection instead
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM {quote_ident(table_name)}")
+    return cursor.fetchone()[0]
+
+def get_sqlite_schema(conn, db_name: str, row_counts: str = 'estimate') -> List[DatabaseTable]:
+    tables = []
+    cursor = conn.cursor()
+    estimates = _sqlite_row_estimates(cursor) if row_counts == 'estimate' else {}
+    
+    # Get all tables
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    table_rows = cursor.fetchall()
+    
+    for table_row in table_rows:
+        table_name = table_row[0]
+        
+        # Get column information
+        cursor.execute(f"PRAGMA table_info({table_name})")
+        columns = cursor.fetchall()
+        
+        # Get foreign key information
+        cursor.execute(f"PRAGMA foreign_key_list({table_name})")
+        fk_info = {row[3]: (row[2], row[4]) for row in cursor.fetchall()}  # column: (table, column)
+        
+        # Get row count
+        row_count = 0
+        if row_counts == 'estimate':
+            row_count = estimates[table_name] if table_name in estimates else _sqlite_rowid_estimate(cursor, table_name)
+        
+        # Get table comment (SQLite doesn't support table comments natively)
+        description = None
+        
+        tables.append({
+            "name": table_name,
+            "rowCount": row_count,
+            "rowCountIsEstimate": row_counts == 'estimate',
+            "description": description,
+            "columns": [
+                {
+                    "name": col[1],
+                    "type": col[2],
+                    "nullable": col[3] == 0,
+                    "default": col[4],
+                    "isPrimaryKey": col[5] > 0,  # position within a composite key
+                    "isForeignKey": col[1] in fk_info,
+                    "foreignKeyTable": fk_info.get(col[1], (None, None))[0],
+                    "foreignKeyColumn": fk_info.get(col[1], (None, None))[1]
+                } for col in columns
+            ]
+        })
+    
+    return tables
@@ -0,0 +1,390 @@
+import asyncio
+import itertools
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from bisect import bisect_right
+from collections import Counter, deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+from result_encoding import dumps
+from sql_analysis import analyze_sql
+
+# Job metadata (jobs.sqlite) and spilled results live here
+JOBS_DIR = os.getenv("JOBS_DIR", "jobs")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Jobs running at once against one database, whoever submitted them
+JOB_MAX_PER_DATABASE = int(os.getenv("JOB_MAX_PER_DATABASE", "2"))
+JOB_MAX_QUEUED_PER_USER = int(os.getenv("JOB_MAX_QUEUED_PER_USER", "20"))
+JOB_TIMEOUT_MS = int(os.getenv("JOB_TIMEOUT_MS", "3600000"))
+# Rows per column chunk in the result file
+JOB_CHUNK_ROWS = int(os.getenv("JOB_CHUNK_ROWS", "10000"))
+# Finished jobs and their results are removed after this many seconds
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "86400"))
+
+TERMINAL_STATES = {'succeeded', 'failed', 'cancelled'}
+
+
+class JobError(ValueError):
+    pass
+
+
+class ResultWriter:
+    """Spills result rows to disk column-wise.
+
+    chunks.jsonl holds one JSON document per JOB_CHUNK_ROWS rows, with one
+    array per column ({"c": [[col0...], [col1...]]}); index.json records the
+    columns and, per chunk, its first row number and byte range, so any page
+    is read by seeking straight to the chunks that cover it.
+    """
+
+    def __init__(self, directory: str, chunk_rows: int = JOB_CHUNK_ROWS):
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self._buffer: List[Any] = []
+        self._chunks: List[Tuple[int, int, int]] = []
+        self._offset = 0
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(os.path.join(directory, 'chunks.jsonl'), 'wb')
+
+    def add(self, rows) -> bool:
+        """Buffers rows; True when a full chunk is ready for flush()."""
+        self._buffer.extend(rows)
+        return len(self._buffer) >= self.chunk_rows
+
+    def flush(self):
+        while self._buffer:
+            chunk, self._buffer = self._buffer[:self.chunk_rows], self._buffer[self.chunk_rows:]
+            data = dumps({"c": [list(column) for column in zip(*chunk)]}) + b'\n'
+            self._file.write(data)
+            self._chunks.append((self.rows, self._offset, len(data)))
+            self.rows += len(chunk)
+            self._offset += len(data)
+
+    def finish(self, columns: List[str]):
+        self.flush()
+        self._file.close()
+        with open(os.path.join(self.directory, 'index.json'), 'w') as f:
+            json.dump({"columns": columns, "rows": self.rows, "chunks": self._chunks}, f)
+
+    def close(self):
+        self._file.close()
+
+
+def read_result_page(directory: str, offset: int, limit: int) -> Tuple[List[str], List[List[Any]], int]:
+    with open(os.path.join(directory, 'index.json')) as f:
+        index = json.load(f)
+    chunks = index['chunks']
+    rows: List[List[Any]] = []
+    i = max(0, bisect_right([c[0] for c in chunks], offset) - 1)
+    with open(os.path.join(directory, 'chunks.jsonl'), 'rb') as f:
+        while len(rows) < limit and i < len(chunks):
+            start, position, length = chunks[i]
+            f.seek(position)
+            columns = json.loads(f.read(length))['c']
+            chunk_rows = [list(row) for row in zip(*columns)]
+            rows.extend(chunk_rows[max(0, offset - start):][:limit - len(rows)])
+            i += 1
+    return index['columns'], rows, index['rows']
+
+
+class Job:
+    def __init__(self, job_id: str, db_id: str, user_id: str, query: str, state: str = 'queued',
+                 error: Optional[str] = None, row_count: int = 0, created_at: Optional[float] = None,
+                 started_at: Optional[float] = None, finished_at: Optional[float] = None):
+        self.id = job_id
+        self.db_id = db_id
+        self.user_id = user_id
+        self.query = query
+        self.state = state
+        self.error = error
+        self.row_count = row_count
+        self.created_at = created_at or time.time()
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.task: Optional[asyncio.Task] = None
+        self.cancel_requested = False
+        self._changed = asyncio.Event()
+
+    def touch(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait_changed(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def row(self) -> tuple:
+        return (self.id, self.db_id, self.user_id, self.query, self.state, self.error, self.row_count,
+                self.created_at, self.started_at, self.finished_at)
+
+    def info(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "id": self.id,
+            "dbId": self.db_id,
+            "userId": self.user_id,
+            "query": self.query,
+            "state": self.state,
+            "error": self.error,
+            "rowCount": self.row_count,
+            "createdAt": self.created_at,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+            "elapsedMs": (end - self.started_at) * 1000 if self.started_at else None,
+        }
+
+
+class _JobStore:
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, db_id TEXT, user_id TEXT, query TEXT, state TEXT, error TEXT,"
+                " row_count INTEGER, created_at REAL, started_at REAL, finished_at REAL)"
+            )
+
+    def save(self, row: tuple):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+
+    def delete(self, job_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def load(self) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute("SELECT * FROM jobs ORDER BY created_at").fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobManager:
+    """Runs submitted queries in the background and spills their results.
+
+    A fixed set of workers takes the next job from the user with the fewest
+    jobs running, then the one served longest ago; within a user's queue the
+    oldest job whose database is below JOB_MAX_PER_DATABASE running jobs
+    goes first. Job state is kept in a local SQLite file, so queued jobs, and
+    read-only jobs that were running when the process stopped, are picked up
+    again on the next start. Interrupted writes are failed instead, since
+    they may already have been applied.
+    """
+
+    def __init__(self, directory: str = JOBS_DIR, workers: int = JOB_WORKERS,
+                 per_database: int = JOB_MAX_PER_DATABASE):
+        self.directory = directory
+        self.workers = workers
+        self.per_database = per_database
+        self._store: Optional[_JobStore] = None
+        self._events: Optional[Callable[[Job], AsyncIterator[Any]]] = None
+        self._jobs: Dict[str, Job] = {}
+        self._queues: Dict[str, Deque[Job]] = {}
+        self._running_per_db: Counter = Counter()
+        self._running_per_user: Counter = Counter()
+        self._last_served: Dict[str, int] = {}
+        self._served = itertools.count(1)
+        self._wakeup: Optional[asyncio.Condition] = None
+        self._workers: List[asyncio.Task] = []
+        self.completed = Counter()
+
+    async def start(self, events: Callable[[Job], AsyncIterator[Any]]):
+        """events(job) yields the column list, then row batches (Driver.stream)."""
+        self._events = events
+        self._wakeup = asyncio.Condition()
+        os.makedirs(os.path.join(self.directory, 'results'), exist_ok=True)
+        self._store = await asyncio.to_thread(_JobStore, os.path.join(self.directory, 'jobs.sqlite'))
+        for row in await asyncio.to_thread(self._store.load):
+            job = Job(*row)
+            self._jobs[job.id] = job
+            # The connection's dialect is not known here, so it must read as
+            # a read whether or not '#' starts a comment (MySQL)
+            if job.state == 'running' and not all(analyze_sql(job.query, d).is_read for d in ('', 'mysql')):
+                job.state, job.finished_at = 'failed', time.time()
+                job.error = "Interrupted by a restart; statements that change data are not run again"
+                await self._save(job)
+            elif job.state not in TERMINAL_STATES:
+                # Interrupted by the restart; results are rebuilt from scratch
+                job.state, job.row_count, job.started_at = 'queued', 0, None
+                self._enqueue(job)
+        await self._expire()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+    def _result_dir(self, job_id: str) -> str:
+        return os.path.join(self.directory, 'results', job_id)
+
+    async def _save(self, job: Job):
+        job.touch()
+        if self._store is not None:
+            await asyncio.to_thread(self._store.save, job.row())
+
+    def _enqueue(self, job: Job):
+        self._queues.setdefault(job.user_id, deque()).append(job)
+
+    def _dequeue(self, job: Job):
+        queue = self._queues.get(job.user_id)
+        if queue is None or job not in queue:
+            return
+        queue.remove(job)
+        if not queue:
+            del self._queues[job.user_id]
+
+    def _pick(self) -> Optional[Job]:
+        best = None
+        for user, queue in self._queues.items():
+            job = next((j for j in queue if self._running_per_db[j.db_id] < self.per_database), None)
+            if job is None:
+                continue
+            rank = (self._running_per_user[user], self._last_served.get(user, 0))
+            if best is None or rank < best[0]:
+                best = (rank, job)
+        if best is None:
+            return None
+        job = best[1]
+        self._dequeue(job)
+        self._last_served[job.user_id] = next(self._served)
+        return job
+
+    async def _notify(self):
+        async with self._wakeup:
+            self._wakeup.notify_all()
+
+    async def submit(self, db_id: str, user_id: str, query: str) -> Job:
+        if self._wakeup is None:
+            raise JobError("The job queue is not running")
+        if len(self._queues.get(user_id, ())) >= JOB_MAX_QUEUED_PER_USER:
+            raise JobError(f"At most {JOB_MAX_QUEUED_PER_USER} queued jobs per user")
+        job = Job(str(uuid.uuid4()), db_id, user_id, query)
+        self._jobs[job.id] = job
+        await self._save(job)
+        self._enqueue(job)
+        await self._notify()
+        return job
+
+    def get(self, db_id: str, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        return job if job is not None and job.db_id == db_id else None
+
+    def list(self, db_id: str, user_id: Optional[str] = None) -> List[Job]:
+        return [j for j in self._jobs.values() if j.db_id == db_id and (user_id is None or j.user_id == user_id)]
+
+    async def cancel(self, job: Job):
+        if job.state == 'queued':
+            self._dequeue(job)
+            job.state, job.finished_at = 'cancelled', time.time()
+            await self._save(job)
+        elif job.state == 'running' and job.task is not None:
+            job.cancel_requested = True
+            job.task.cancel()
+            await asyncio.gather(job.task, return_exceptions=True)
+
+    async def delete(self, job: Job):
+        await self.cancel(job)
+        self._jobs.pop(job.id, None)
+        await asyncio.to_thread(shutil.rmtree, self._result_dir(job.id), True)
+        if self._store is not None:
+            await asyncio.to_thread(self._store.delete, job.id)
+
+    async def page(self, job: Job, offset: int, limit: int) -> Tuple[List[str], List[List[Any]], int]:
+        if job.state != 'succeeded':
+            raise JobError(f"Job is {job.state}; results are available once it has succeeded")
+        return await asyncio.to_thread(read_result_page, self._result_dir(job.id), offset, limit)
+
+    async def _worker(self):
+        while True:
+            async with self._wakeup:
+                job = self._pick()
+                while job is None:
+                    await self._wakeup.wait()
+                    job = self._pick()
+                self._running_per_db[job.db_id] += 1
+                self._running_per_user[job.user_id] += 1
+            try:
+                job.task = asyncio.create_task(self._run(job))
+                await asyncio.wait([job.task])
+            finally:
+                if not job.task.done():
+                    # Shutting down: leave the job 'running' for the next start to handle
+                    job.task.cancel()
+                self._running_per_db[job.db_id] -= 1
+                self._running_per_user[job.user_id] -= 1
+                await self._notify()
+            await self._expire()
+
+    async def _run(self, job: Job):
+        job.state, job.started_at, job.row_count, job.error = 'running', time.time(), 0, None
+        await self._save(job)
+        directory = self._result_dir(job.id)
+        await asyncio.to_thread(shutil.rmtree, directory, True)
+        try:
+            await asyncio.wait_for(self._spill(job, directory), JOB_TIMEOUT_MS / 1000)
+            job.state = 'succeeded'
+        except asyncio.CancelledError:
+            if not job.cancel_requested:
+                raise
+            job.state = 'cancelled'
+        except asyncio.TimeoutError:
+            job.state, job.error = 'failed', f"Job exceeded the {JOB_TIMEOUT_MS} ms limit"
+        except Exception as e:
+            job.state, job.error = 'failed', str(e)
+        job.finished_at = time.time()
+        self.completed[job.state] += 1
+        if job.state != 'succeeded':
+            await asyncio.to_thread(shutil.rmtree, directory, True)
+        await self._save(job)
+
+    async def _spill(self, job: Job, directory: str):
+        events = self._events(job)
+        writer = await asyncio.to_thread(ResultWriter, directory)
+        columns = None
+        try:
+            async for event in events:
+                if columns is None:
+                    columns = event
+                    continue
+                if writer.add(event):
+                    await asyncio.to_thread(writer.flush)
+                    job.row_count = writer.rows
+                    await self._save(job)
+            await asyncio.to_thread(writer.finish, columns or [])
+            job.row_count = writer.rows
+        finally:
+            await events.aclose()
+            writer.close()
+
+    async def _expire(self):
+        cutoff = time.time() - JOB_RESULT_TTL
+        for job in [j for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            await self.delete(job)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": sum(len(q) for q in self._queues.values()),
+            "running": sum(self._running_per_db.values()),
+            "workers": len(self._workers),
+            "completed": dict(self.completed),
+        }
+
+
+job_manager = JobManager()
@@ -0,0 +1,59 @@
+import asyncio
+import json
+import os
+from typing import Dict, Optional
+
+# LLM_BACKEND=fake swaps Gemini for a deterministic offline stand-in
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+
+
+class GeminiModel:
+    def __init__(self, model_name: str = GEMINI_MODEL):
+        import google.generativeai as genai
+
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        self._model = genai.GenerativeModel(model_name)
+
+    async def generate(self, prompt: str) -> str:
+        response = await self._model.generate_content_async(prompt)
+        return response.text
+
+
+class FakeModel:
+    def __init__(self, responses: Optional[Dict[str, str]] = None, latency: float = 0.0):
+        # responses maps a user prompt to the raw text the model should return
+        self.responses = responses or {}
+        self.latency = latency
+        self.calls = 0
+
+    async def generate(self, prompt: str) -> str:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        user_prompt = prompt.rsplit("User Prompt:", 1)[-1].strip()
+        if user_prompt in self.responses:
+            return self.responses[user_prompt]
+        if "OpenAPI" in prompt:
+            return json.dumps({
+                "id": "fake", "title": user_prompt, "description": user_prompt, "method": "GET",
+                "path": "/fake", "summary": user_prompt, "tags": ["Fake"], "parameters": [],
+                "requestBody": None, "responses": [{"status": 200, "description": "OK", "example": {}}],
+                "security": [], "createdAt": "", "isPublished": False, "query": "SELECT 1",
+            })
+        return json.dumps({"query": "SELECT 1", "explanation": f"Fake response for: {user_prompt}", "confidence": 50})
+
+
+_model = None
+
+
+def get_model():
+    global _model
+    if _model is None:
+        _model = FakeModel() if LLM_BACKEND == "fake" else GeminiModel()
+    return _model
+
+
+def set_model(model):
+    global _model
+    _model = model
@@ -1,13 +1,43 @@
+import logging
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from route import router
+from route import router, ai_query_cache, job_events, health_monitor
+from health_monitor import HEALTH_MONITOR_ENABLED
+from jobs import job_manager
+from pool import pool_manager, mysql_pool_manager
+from sqlite_executor import sqlite_executor
+from connectDB import metadata_store
 from fastapi.middleware.cors import CORSMiddleware
+from metrics import MetricsMiddleware
 
-app = FastAPI()
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await pool_manager.start()
+    await mysql_pool_manager.start()
+    await job_manager.start(job_events)
+    if HEALTH_MONITOR_ENABLED:
+        await health_monitor.start()
+    yield
+    await health_monitor.close()
+    await job_manager.close()
+    await pool_manager.close()
+    await mysql_pool_manager.close()
+    metadata_store.close()
+    ai_query_cache.close()
+    sqlite_executor.close()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],           
+    allow_origins=["*"],
     allow_credentials=True,
-    allow_methods=["*"],             
-    allow_headers=["*"],             
+    allow_methods=["*"],
+    allow_headers=["*"],
 )
+# Outermost, so the timings include CORS handling and every route
+app.add_middleware(MetricsMiddleware)
 app.include_router(router)
@@ -0,0 +1,108 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from cache import TTLCache
+from metrics import span
+
+# The supabase client is synchronous, so every call is offloaded to a bounded
+# thread pool instead of running on the event loop.
+METADATA_STORE_WORKERS = int(os.getenv("METADATA_STORE_WORKERS", "16"))
+# database_connections rows almost never change, so lookups by id are cached
+CONNECTION_CACHE_SIZE = int(os.getenv("CONNECTION_CACHE_SIZE", "1024"))
+CONNECTION_CACHE_TTL = float(os.getenv("CONNECTION_CACHE_TTL", "300"))
+# Per-user connection lists for the dashboard; health fields come from the monitor
+CONNECTION_LIST_CACHE_TTL = float(os.getenv("CONNECTION_LIST_CACHE_TTL", "300"))
+
+
+class MetadataStore:
+    def __init__(self, client, max_workers: int = METADATA_STORE_WORKERS):
+        self._client = client
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="metadata-store")
+        self.connection_cache = TTLCache(max_size=CONNECTION_CACHE_SIZE, ttl=CONNECTION_CACHE_TTL)
+        self.connection_list_cache = TTLCache(max_size=CONNECTION_CACHE_SIZE, ttl=CONNECTION_LIST_CACHE_TTL)
+
+    async def _execute(self, build: Callable[[Any], Any]) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        with span("metadata"):
+            response = await loop.run_in_executor(self._executor, lambda: build(self._client).execute())
+        return response.data or []
+
+    async def _first(self, build: Callable[[Any], Any]) -> Optional[Dict[str, Any]]:
+        data = await self._execute(build)
+        return data[0] if data else None
+
+    # users
+    async def find_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        return await self._first(lambda c: c.table("users").select("id").eq("email", email))
+
+    async def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return await self._first(lambda c: c.table("users").select("id").eq("id", user_id))
+
+    async def insert_user(self, user: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await self._first(lambda c: c.table("users").insert(user))
+
+    # database_connections
+    async def get_database_connection(self, db_id: str) -> Optional[Dict[str, Any]]:
+        db_config = self.connection_cache.get(db_id)
+        if db_config is None:
+            db_config = await self._first(lambda c: c.table("database_connections").select("*").eq("id", db_id))
+            if db_config is not None:
+                self.connection_cache.set(db_id, db_config)
+        return db_config
+
+    async def list_database_connections(self, user_id: str) -> List[Dict[str, Any]]:
+        rows = self.connection_list_cache.get(user_id)
+        if rows is None:
+            rows = await self._execute(lambda c: c.table("database_connections").select("*").eq("user_id", user_id))
+            self.connection_list_cache.set(user_id, rows)
+        return rows
+
+    async def list_all_database_connections(self) -> List[Dict[str, Any]]:
+        return await self._execute(lambda c: c.table("database_connections").select("*"))
+
+    async def upsert_database_connection_health(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # One request for every row; each carries its id and the health columns
+        # only, so edits made since the rows were read are kept. The caches are
+        # overlaid with the health in memory instead of invalidated
+        return await self._execute(lambda c: c.table("database_connections").upsert(rows, on_conflict="id"))
+
+    async def insert_database_connection(self, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        inserted = await self._first(lambda c: c.table("database_connections").insert(row))
+        self.invalidate_database_connection(row.get("id"))
+        return inserted
+
+    async def update_database_connection(self, db_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        updated = await self._first(lambda c: c.table("database_connections").update(fields).eq("id", db_id))
+        self.invalidate_database_connection(db_id)
+        return updated
+
+    async def delete_database_connection(self, db_id: str) -> Optional[Dict[str, Any]]:
+        deleted = await self._first(lambda c: c.table("database_connections").delete().eq("id", db_id))
+        self.invalidate_database_connection(db_id)
+        return deleted
+
+    def invalidate_database_connection(self, db_id: Optional[str]):
+        if db_id is not None:
+            self.connection_cache.invalidate(db_id)
+        self.connection_list_cache.clear()
+
+    # api_specs
+    async def insert_api_spec(self, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await self._first(lambda c: c.table("api_specs").insert(row))
+
+    async def update_api_spec(self, spec_id: str, db_id: str, spec: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await self._first(
+            lambda c: c.table("api_specs").update({"spec": spec}).eq("id", spec_id).eq("db_id", db_id)
+        )
+
+    async def list_api_specs(self, db_id: str) -> List[Dict[str, Any]]:
+        return await self._execute(lambda c: c.table("api_specs").select("id, spec").eq("db_id", db_id))
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {"database_connections": self.connection_cache.stats(),
+                "database_connection_lists": self.connection_list_cache.stats()}
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,195 @@
+import contextvars
+import logging
+import math
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Requests slower than this are logged with their span breakdown; 0 = off
+METRICS_SLOW_REQUEST_MS = float(os.getenv("METRICS_SLOW_REQUEST_MS", "0"))
+# Per-db_id request histograms; turn off when there are very many databases
+METRICS_DB_LABELS = os.getenv("METRICS_DB_LABELS", "true").lower() in ("1", "true", "yes")
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [per-bucket counts, sum, count]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, *labelvalues: str):
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = [[0] * len(self.buckets), 0.0, 0]
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labelvalues)} {count}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge",
+                f"{self.name} {_number(self.value)}"]
+
+
+REQUEST_DURATION = Histogram("sqlapi_request_duration_seconds", "HTTP request latency by route template.",
+                             ("method", "route", "status"))
+DB_REQUEST_DURATION = Histogram("sqlapi_db_request_duration_seconds", "HTTP request latency by database.",
+                                ("db_id",))
+SPAN_DURATION = Histogram("sqlapi_span_duration_seconds",
+                          "Time spent per request phase (metadata, admission, pool_acquire, query, serialize, llm).",
+                          ("span",))
+REQUESTS_IN_FLIGHT = Gauge("sqlapi_requests_in_flight", "HTTP requests being handled.")
+REGISTRY = [REQUEST_DURATION, DB_REQUEST_DURATION, SPAN_DURATION, REQUESTS_IN_FLIGHT]
+
+
+class Trace:
+    """Spans recorded while handling one request."""
+
+    def __init__(self):
+        self.route: Optional[str] = None
+        self.spans: List[Tuple[str, float]] = []
+
+    def totals(self) -> Dict[str, float]:
+        totals: Dict[str, float] = {}
+        for name, seconds in self.spans:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.totals().items())
+
+
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("sqlapi_trace", default=None)
+
+
+def record(name: str, seconds: float):
+    SPAN_DURATION.observe(seconds, name)
+    trace = _trace.get()
+    if trace is not None:
+        trace.spans.append((name, seconds))
+
+
+@contextmanager
+def span(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def set_route(route: str):
+    """Overrides the route label, e.g. with a published endpoint's own path."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.route = route
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and adds its spans as a Server-Timing header.
+
+    Plain ASGI rather than BaseHTTPMiddleware, so streaming responses and the
+    disconnect watch in queries.py see the untouched receive channel.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace = Trace()
+        token = _trace.set(trace)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace.spans:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", trace.server_timing().encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            _trace.reset(token)
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            label = trace.route or (route.path if route is not None else "unmatched")
+            REQUEST_DURATION.observe(elapsed, scope["method"], label, str(status))
+            db_id = (scope.get("path_params") or {}).get("db_id")
+            # Not for 404s, so made-up ids cannot grow the series without bound
+            if METRICS_DB_LABELS and db_id and route is not None and status != 404:
+                DB_REQUEST_DURATION.observe(elapsed, db_id)
+            if METRICS_SLOW_REQUEST_MS and elapsed * 1000 >= METRICS_SLOW_REQUEST_MS:
+                logger.warning("Slow request %s %s %s %.1f ms [%s]", scope["method"], label, status,
+                               elapsed * 1000, trace.server_timing())
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Literal, Dict
+from typing import Literal, Dict, Optional
 
 class User(BaseModel):
     id: str
@@ -16,6 +16,11 @@ class DatabaseConnectionCreate(BaseModel):
     password: str
     database_name: str
     user_id: str
+    # Admission limits for this database; unset uses the ADMISSION_*/RATE_LIMIT_* defaults
+    max_concurrent_queries: Optional[int] = None
+    max_queued_queries: Optional[int] = None
+    rate_limit_per_second: Optional[float] = None  # per published endpoint or SQL shell
+    user_rate_limit_per_second: Optional[float] = None
 
 class DatabaseConnectionResponse(BaseModel):
     id: str
@@ -24,7 +29,9 @@ class DatabaseConnectionResponse(BaseModel):
     host: str
     port: int
     status: str
-    last_connected: str
+    last_connected: Optional[str] = None
+    latency_ms: Optional[float] = None
+    last_checked: Optional[str] = None
     table_count: int
     total_rows: int
 
@@ -43,8 +50,23 @@ class Column(BaseModel):
 class DatabaseTable(BaseModel):
     name: str
     rowCount: int
+    rowCountIsEstimate: bool = False
+    rowCountComputedAt: Optional[str] = None
     columns: List[Column]
     description: Optional[str]
+    isView: bool = False
+
+class TableRowCount(BaseModel):
+    table: str
+    rowCount: int
+    exact: bool
+    computedAt: str
+
+class TablePage(BaseModel):
+    columns: List[str]
+    rows: List[Dict[str, Any]]
+    pageSize: int
+    nextCursor: Optional[str] = None
 
 class Schema(BaseModel):
     name: str
@@ -52,6 +74,9 @@ class Schema(BaseModel):
 
 class QueryRequest(BaseModel):
     query: str
+    queryId: Optional[str] = None  # Client-chosen id for POST /database/{db_id}/query/{queryId}/cancel
+    timeoutMs: Optional[int] = None  # Defaults to QUERY_TIMEOUT_MS, capped at QUERY_MAX_TIMEOUT_MS
+    confirm: bool = False  # Run even if the statement was flagged as expensive (SQL_GUARD_MODE=confirm)
 
 class QueryResult(BaseModel):
     columns: List[str]
@@ -59,6 +84,74 @@ class QueryResult(BaseModel):
     rowCount: int
     executionTime: float
     error: Optional[str]
+    queryId: Optional[str] = None
+    appliedLimit: Optional[int] = None  # Set when SQL_AUTO_LIMIT/SQL_MAX_LIMIT changed the statement
+
+class QueryJob(BaseModel):
+    id: str
+    dbId: str
+    userId: str
+    query: str
+    state: Literal['queued', 'running', 'succeeded', 'failed', 'cancelled']
+    error: Optional[str] = None
+    rowCount: int  # Rows spilled so far while running
+    createdAt: float
+    startedAt: Optional[float] = None
+    finishedAt: Optional[float] = None
+    elapsedMs: Optional[float] = None
+
+class QueryJobPage(BaseModel):
+    columns: List[str]
+    rows: List[List[Any]]
+    offset: int
+    totalRows: int
+    nextOffset: Optional[int] = None
+
+class ExplainRequest(BaseModel):
+    query: str
+    analyze: bool = False  # Also run the statement for actual timings
+    timeoutMs: Optional[int] = None
+
+class PlanNode(BaseModel):
+    id: int
+    operation: str
+    table: Optional[str] = None
+    index: Optional[str] = None
+    fullScan: bool = False
+    estimatedRows: Optional[float] = None
+    estimatedCost: Optional[float] = None  # Including children, in the engine's cost units
+    actualRows: Optional[float] = None
+    actualTimeMs: Optional[float] = None  # Including children, all loops
+    selfCost: Optional[float] = None
+    selfTimeMs: Optional[float] = None
+    detail: Optional[str] = None
+    children: List["PlanNode"] = []
+
+class PlanHotspot(BaseModel):
+    nodeId: int
+    operation: str
+    table: Optional[str] = None
+    metric: Literal['time', 'cost', 'rows']
+    value: float
+    share: float
+
+class PlanWarning(BaseModel):
+    kind: Literal['full_scan', 'missing_fk_index', 'expensive_node']
+    message: str
+    table: Optional[str] = None
+    column: Optional[str] = None
+    nodeId: Optional[int] = None
+
+class QueryPlan(BaseModel):
+    dialect: str
+    analyzed: bool
+    planningTimeMs: Optional[float] = None
+    executionTimeMs: Optional[float] = None
+    rowCount: Optional[int] = None
+    plan: PlanNode
+    hotspots: List[PlanHotspot]
+    warnings: List[PlanWarning]
+    raw: Any = None
 
 class AIQueryRequest(BaseModel):
     prompt: str
@@ -85,6 +178,11 @@ class APIResponse(BaseModel):
     description: str
     example: Dict[str, Any]
     
+class APICacheConfig(BaseModel):
+    enabled: bool = False
+    ttl: float = 60  # seconds a result is served without touching the database
+    staleWhileRevalidate: float = 0  # extra seconds a stale result is served while it refreshes
+
 class GeneratedAPIDetails(BaseModel):
     id: str
     title: str
@@ -101,6 +199,8 @@ class GeneratedAPIDetails(BaseModel):
     isPublished: bool
     publishedUrl: Optional[str] = None
     query: Optional[str] = None  # Store the generated SQL query
+    cache: Optional[APICacheConfig] = None  # Opt-in result cache for GET endpoints
+    coalesce: Optional[bool] = None  # Share one execution between identical concurrent calls; None uses PUBLISHED_COALESCE
 
 class APIGenerateRequest(BaseModel):
     prompt: str
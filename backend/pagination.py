@@ -0,0 +1,164 @@
+import base64
+import datetime
+import decimal
+import json
+import os
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from introspection import quote_ident, quote_mysql_ident
+
+TABLE_PAGE_SIZE = int(os.getenv("TABLE_PAGE_SIZE", "25"))
+TABLE_PAGE_MAX_SIZE = int(os.getenv("TABLE_PAGE_MAX_SIZE", "1000"))
+
+# Key values are alias-selected next to the projection so the cursor can be
+# built even when the caller did not ask for the key columns
+_KEY_ALIAS = "__page_key_{}"
+
+
+class PaginationError(ValueError):
+    pass
+
+
+# Cursor values keep their Python type so they bind back to the driver as-is
+_TAGGED_TYPES = {
+    "datetime": (datetime.datetime, lambda v: v.isoformat(), datetime.datetime.fromisoformat),
+    "date": (datetime.date, lambda v: v.isoformat(), datetime.date.fromisoformat),
+    "time": (datetime.time, lambda v: v.isoformat(), datetime.time.fromisoformat),
+    "decimal": (decimal.Decimal, str, decimal.Decimal),
+    "uuid": (uuid.UUID, str, uuid.UUID),
+    "bytes": (bytes, lambda v: base64.b64encode(v).decode(), base64.b64decode),
+}
+
+
+def _tag(value: Any) -> Any:
+    for name, (cls, dump, _) in _TAGGED_TYPES.items():
+        # datetime is a date subclass, so the exact type decides
+        if type(value) is cls or (cls is bytes and isinstance(value, (bytes, memoryview))):
+            return {"$t": name, "v": dump(bytes(value) if cls is bytes else value)}
+    return value
+
+
+def _untag(value: Any) -> Any:
+    if isinstance(value, dict):
+        _, _, load = _TAGGED_TYPES[value["$t"]]
+        return load(value["v"])
+    return value
+
+
+def encode_cursor(order: List[str], values: List[Any]) -> str:
+    payload = json.dumps({"o": order, "k": [_tag(v) for v in values]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str, order: List[str]) -> List[Any]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        values = [_untag(v) for v in payload["k"]]
+    except Exception:
+        raise PaginationError("Invalid cursor")
+    if payload.get("o") != order or len(values) != len(order) - 2:
+        raise PaginationError("Cursor does not match the requested sort")
+    return values
+
+
+class PageQuery:
+    """Keyset page over a table described by a schema snapshot entry.
+
+    Rows are ordered by the optional sort column followed by the primary key
+    (or rowid/ctid when there is none), and each page starts strictly after
+    the last key of the previous one, so every page is an index range scan
+    no matter how deep it is. Views (and MySQL tables without a primary key)
+    have nothing to seek on, so they fall back to OFFSET pages.
+    """
+
+    def __init__(self, dialect: str, table: Dict[str, Any], schema: Optional[str] = None,
+                 columns: Optional[List[str]] = None, sort: Optional[str] = None, descending: bool = False):
+        self.dialect = dialect
+        quote = quote_mysql_ident if dialect == 'mysql' else quote_ident
+        self._quote = quote
+        by_name = {col['name']: col for col in table['columns']}
+        self.columns = columns or list(by_name)
+        unknown = [name for name in self.columns + ([sort] if sort else []) if name not in by_name]
+        if unknown:
+            raise PaginationError(f"Unknown column(s): {', '.join(unknown)}")
+
+        keys = [col['name'] for col in table['columns'] if col['isPrimaryKey']]
+        # (select expression, comparison expression, placeholder cast)
+        self._keys: List[Tuple[str, str, str]] = [(quote(k), quote(k), '') for k in keys]
+        if not self._keys and not table.get('isView'):
+            if dialect == 'sqlite':
+                self._keys = [('rowid', 'rowid', '')]
+            elif dialect == 'postgres':
+                # Ordered by physical location; Postgres 14+ plans this as a TID range scan
+                self._keys = [('ctid::text', 'ctid', '::text::tid')]
+        self.offset_paging = not self._keys
+        if self.offset_paging:
+            self._keys = [(quote(sort), quote(sort), '')] if sort else []
+        elif sort and keys[:1] != [sort]:
+            # Row-value comparisons skip NULLs, which would silently drop rows
+            if sort not in keys and by_name[sort]['nullable']:
+                raise PaginationError(f"Cannot sort by nullable column {sort}")
+            # A later column of a composite key moves to the front instead of repeating
+            self._keys = [key for key in self._keys if key[1] != quote(sort)]
+            self._keys.insert(0, (quote(sort), quote(sort), ''))
+
+        self.descending = descending
+        self.order = [sort or '', 'desc' if descending else 'asc']
+        self.order += ['offset'] if self.offset_paging else [k[1] for k in self._keys]
+        ref = quote(table['name'])
+        self.table_ref = f"{quote(schema)}.{ref}" if schema and dialect in ('postgres', 'mysql') else ref
+
+    def _placeholder(self, n: int) -> str:
+        if self.dialect == 'mysql':
+            return "%s"
+        return f"${n}" if self.dialect == 'postgres' else "?"
+
+    def sql(self, after: Optional[List[Any]], limit: int) -> Tuple[str, List[Any]]:
+        select = [self._quote(c) for c in self.columns]
+        if self.offset_paging:
+            return self._offset_sql(select, after, limit), []
+        select += [f"{expr} AS {_KEY_ALIAS.format(i)}" for i, (expr, _, _) in enumerate(self._keys)]
+        direction = 'DESC' if self.descending else 'ASC'
+        sql = f"SELECT {', '.join(select)} FROM {self.table_ref}"
+        args: List[Any] = []
+        if after is not None:
+            lhs = [cmp for _, cmp, _ in self._keys]
+            rhs = [self._placeholder(i + 1) + cast for i, (_, _, cast) in enumerate(self._keys)]
+            if len(lhs) > 1:
+                lhs, rhs = [f"({', '.join(lhs)})"], [f"({', '.join(rhs)})"]
+            sql += f" WHERE {lhs[0]} {'<' if self.descending else '>'} {rhs[0]}"
+            args = list(after)
+        sql += " ORDER BY " + ", ".join(f"{cmp} {direction}" for _, cmp, _ in self._keys)
+        # One extra row tells us whether there is a next page
+        sql += f" LIMIT {int(limit) + 1}"
+        return sql, args
+
+    def _offset_sql(self, select: List[str], after: Optional[List[Any]], limit: int) -> str:
+        sql = f"SELECT {', '.join(select)} FROM {self.table_ref}"
+        if self._keys:
+            sql += f" ORDER BY {self._keys[0][1]} {'DESC' if self.descending else 'ASC'}"
+        sql += f" LIMIT {int(limit) + 1}"
+        if after:
+            sql += f" OFFSET {int(after[0])}"
+        return sql
+
+    def page(self, rows: List[Any], limit: int,
+             after: Optional[List[Any]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        width = len(self.columns)
+        result = [dict(zip(self.columns, tuple(row)[:width])) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            if self.offset_paging:
+                next_cursor = encode_cursor(self.order, [(after[0] if after else 0) + limit])
+            else:
+                next_cursor = encode_cursor(self.order, list(tuple(rows[limit - 1])[width:]))
+        return result, next_cursor
+
+    def decode(self, cursor: Optional[str]) -> Optional[List[Any]]:
+        if not cursor:
+            return None
+        after = decode_cursor(cursor, self.order)
+        if self.offset_paging and not (type(after[0]) is int and after[0] >= 0):
+            raise PaginationError("Invalid cursor")
+        return after
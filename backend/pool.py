@@ -0,0 +1,290 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import asyncpg
+
+from metrics import record
+
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# Pools with nothing borrowed from them for this long are closed
+POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))
+POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))
+POOL_HEALTH_CHECK_TIMEOUT = float(os.getenv("DB_POOL_HEALTH_CHECK_TIMEOUT", "5"))
+POOL_CONNECT_TIMEOUT = float(os.getenv("DB_POOL_CONNECT_TIMEOUT", "10"))
+# Prepared statements kept per pooled connection by asyncpg (and column and
+# parameter types kept alongside them by PooledConnection)
+STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+# Server-side cap on any one statement for pooled connections; 0 disables it.
+# Requests carry their own, usually shorter, budgets (QUERY_TIMEOUT_MS).
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "300000"))
+
+
+def _config_key(db_config: Dict[str, Any]) -> Tuple:
+    return (
+        db_config['host'],
+        db_config['port'],
+        db_config['username'],
+        db_config['password'],
+        db_config['database_name'],
+    )
+
+
+class PooledConnection(asyncpg.Connection):
+    """Remembers the column names and parameter types of the statements it ran.
+
+    prepare() always does a fresh Parse/Describe round trip; only fetch() and
+    execute() use asyncpg's statement cache. So a statement is prepared once
+    per connection to learn its types, and later calls go through fetch().
+    """
+
+    __slots__ = ('_described',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._described: OrderedDict = OrderedDict()
+
+    async def run(self, sql: str, bind: Callable[[List[str]], Sequence[Any]],
+                  timeout: Optional[float] = None) -> Tuple[List[str], List[Any]]:
+        """Columns and rows of sql; bind turns the parameter type names into the arguments."""
+        described = self._described.get(sql)
+        if described is None:
+            statement = await self.prepare(sql, timeout=timeout)
+            columns = [attr.name for attr in statement.get_attributes()]
+            param_types = [param.name for param in statement.get_parameters()]
+            self._described[sql] = (columns, param_types)
+            if len(self._described) > STATEMENT_CACHE_SIZE:
+                self._described.popitem(last=False)
+            return columns, await statement.fetch(*bind(param_types), timeout=timeout)
+        self._described.move_to_end(sql)
+        columns, param_types = described
+        try:
+            rows = await self.fetch(sql, *bind(param_types), timeout=timeout)
+        except asyncpg.PostgresError:
+            # The types may be out of date after DDL; describe it again next time
+            self._described.pop(sql, None)
+            raise
+        return list(rows[0].keys()) if rows else columns, rows
+
+
+class _PoolEntry:
+    def __init__(self, pool: asyncpg.Pool, key: Tuple):
+        self.pool = pool
+        self.key = key
+        # Connections checked out (or being waited for) through acquire()
+        self.borrowed = 0
+        self.last_used = time.monotonic()
+        self.last_checked = time.monotonic()
+
+
+class PoolManager:
+    def __init__(self, min_size: int = POOL_MIN_SIZE, max_size: int = POOL_MAX_SIZE,
+                 idle_timeout: float = POOL_IDLE_TIMEOUT,
+                 health_check_interval: float = POOL_HEALTH_CHECK_INTERVAL):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self._pools: Dict[str, _PoolEntry] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._maintenance_task: Optional[asyncio.Task] = None
+
+    async def get_pool(self, db_id: str, db_config: Dict[str, Any]) -> asyncpg.Pool:
+        return (await self._get_entry(db_id, db_config)).pool
+
+    async def _get_entry(self, db_id: str, db_config: Dict[str, Any]) -> _PoolEntry:
+        key = _config_key(db_config)
+        entry = self._pools.get(db_id)
+        if entry is not None and entry.key == key:
+            entry.last_used = time.monotonic()
+            return entry
+
+        lock = self._locks.setdefault(db_id, asyncio.Lock())
+        async with lock:
+            entry = self._pools.get(db_id)
+            if entry is not None and entry.key != key:
+                # Connection settings changed since the pool was created
+                await self.close_pool(db_id)
+                entry = None
+            if entry is None:
+                pool = await self._create_pool(db_config)
+                entry = _PoolEntry(pool, key)
+                self._pools[db_id] = entry
+            entry.last_used = time.monotonic()
+            return entry
+
+    async def _create_pool(self, db_config: Dict[str, Any]):
+        return await asyncpg.create_pool(
+            user=db_config['username'],
+            password=db_config['password'],
+            database=db_config['database_name'],
+            host=db_config['host'],
+            port=db_config['port'],
+            min_size=self.min_size,
+            max_size=self.max_size,
+            max_inactive_connection_lifetime=self.idle_timeout,
+            timeout=POOL_CONNECT_TIMEOUT,
+            statement_cache_size=STATEMENT_CACHE_SIZE,
+            connection_class=PooledConnection,
+            server_settings={"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)} if DB_STATEMENT_TIMEOUT_MS else None,
+        )
+
+    async def _close_pool(self, pool):
+        try:
+            await asyncio.wait_for(pool.close(), timeout=POOL_HEALTH_CHECK_TIMEOUT)
+        except Exception:
+            pool.terminate()
+
+    async def _ping(self, pool) -> bool:
+        """False when no connection could be borrowed in time: the pool is busy, not broken."""
+        acquired = False
+
+        async def ping():
+            nonlocal acquired
+            async with pool.acquire() as conn:
+                acquired = True
+                await self._ping_connection(conn)
+
+        try:
+            await asyncio.wait_for(ping(), timeout=POOL_HEALTH_CHECK_TIMEOUT)
+        except asyncio.TimeoutError:
+            if acquired:
+                raise
+            return False
+        return True
+
+    async def _ping_connection(self, conn):
+        await conn.fetchval("SELECT 1")
+
+    def _pool_stats(self, pool) -> Dict[str, Any]:
+        return {
+            "size": pool.get_size(),
+            "idle": pool.get_idle_size(),
+            "min_size": pool.get_min_size(),
+            "max_size": pool.get_max_size(),
+        }
+
+    @asynccontextmanager
+    async def acquire(self, db_id: str, db_config: Dict[str, Any]):
+        started = time.perf_counter()
+        entry = await self._get_entry(db_id, db_config)
+        entry.borrowed += 1
+        try:
+            async with entry.pool.acquire() as conn:
+                record("pool_acquire", time.perf_counter() - started)
+                yield conn
+        finally:
+            entry.borrowed -= 1
+            entry.last_used = time.monotonic()
+
+    async def close_pool(self, db_id: str):
+        entry = self._pools.pop(db_id, None)
+        if entry is None:
+            return
+        await self._close_pool(entry.pool)
+
+    async def _check_health(self, db_id: str, entry: _PoolEntry):
+        if self._pool_stats(entry.pool)["idle"] == 0:
+            # Every open connection is in use; a ping would only queue behind the queries
+            return
+        try:
+            if await self._ping(entry.pool):
+                entry.last_checked = time.monotonic()
+        except Exception as e:
+            print(f"Pool health check failed for {db_id}: {str(e)}")
+            # Dropped here and recreated lazily on the next request
+            if self._pools.get(db_id) is entry:
+                await self.close_pool(db_id)
+
+    async def run_maintenance(self):
+        now = time.monotonic()
+        for db_id, entry in list(self._pools.items()):
+            if not entry.borrowed and now - entry.last_used > self.idle_timeout:
+                await self.close_pool(db_id)
+            elif now - entry.last_checked > self.health_check_interval:
+                await self._check_health(db_id, entry)
+
+    async def _maintenance_loop(self):
+        interval = min(self.health_check_interval, self.idle_timeout)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.run_maintenance()
+            except Exception as e:
+                print(f"Pool maintenance failed: {str(e)}")
+
+    async def start(self):
+        if self._maintenance_task is None:
+            self._maintenance_task = asyncio.create_task(self._maintenance_loop())
+
+    async def close(self):
+        if self._maintenance_task is not None:
+            self._maintenance_task.cancel()
+            try:
+                await self._maintenance_task
+            except asyncio.CancelledError:
+                pass
+            self._maintenance_task = None
+        for db_id in list(self._pools):
+            await self.close_pool(db_id)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {db_id: self._pool_stats(entry.pool) for db_id, entry in self._pools.items()}
+
+
+class MySQLPoolManager(PoolManager):
+    """The same lifecycle (idle eviction, health checks) over aiomysql pools.
+
+    `module` is aiomysql unless something with the same API is assigned to it;
+    tests use tests/mysql_stub.py to run the MySQL path without a server.
+    """
+
+    _module = None
+
+    @property
+    def module(self):
+        if self._module is None:
+            import aiomysql
+            self._module = aiomysql
+        return self._module
+
+    @module.setter
+    def module(self, module):
+        self._module = module
+
+    async def _create_pool(self, db_config: Dict[str, Any]):
+        return await self.module.create_pool(
+            host=db_config['host'],
+            port=int(db_config['port'] or 3306),
+            user=db_config['username'],
+            password=db_config['password'] or '',
+            db=db_config['database_name'],
+            minsize=self.min_size,
+            maxsize=self.max_size,
+            pool_recycle=int(self.idle_timeout),
+            connect_timeout=POOL_CONNECT_TIMEOUT,
+            autocommit=True,
+            # Applies to SELECTs only; MySQL has no session-wide limit for writes
+            init_command=f"SET SESSION max_execution_time = {DB_STATEMENT_TIMEOUT_MS}" if DB_STATEMENT_TIMEOUT_MS else None,
+        )
+
+    async def _close_pool(self, pool):
+        pool.close()
+        try:
+            await asyncio.wait_for(pool.wait_closed(), timeout=POOL_HEALTH_CHECK_TIMEOUT)
+        except Exception:
+            pool.terminate()
+
+    async def _ping_connection(self, conn):
+        await conn.ping(reconnect=False)
+
+    def _pool_stats(self, pool) -> Dict[str, Any]:
+        return {"size": pool.size, "idle": pool.freesize, "min_size": pool.minsize, "max_size": pool.maxsize}
+
+
+pool_manager = PoolManager()
+mysql_pool_manager = MySQLPoolManager()
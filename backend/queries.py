@@ -0,0 +1,154 @@
+import asyncio
+import os
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional
+
+from fastapi import Request
+
+# Per-request budgets; the shell can ask for more, up to QUERY_MAX_TIMEOUT_MS
+QUERY_TIMEOUT_MS = int(os.getenv("QUERY_TIMEOUT_MS", "30000"))
+QUERY_MAX_TIMEOUT_MS = int(os.getenv("QUERY_MAX_TIMEOUT_MS", "600000"))
+PUBLISHED_QUERY_TIMEOUT_MS = int(os.getenv("PUBLISHED_QUERY_TIMEOUT_MS", "10000"))
+
+
+class QueryCancelled(Exception):
+    pass
+
+
+def query_timeout(timeout_ms: Optional[int], default_ms: int = QUERY_TIMEOUT_MS) -> float:
+    return min(max(timeout_ms or default_ms, 1), QUERY_MAX_TIMEOUT_MS) / 1000
+
+
+async def wait_for_disconnect(request: Request):
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+class RunningQuery:
+    def __init__(self, query_id: str, db_id: str, sql: str, user: Optional[str], task: asyncio.Task):
+        self.query_id = query_id
+        self.db_id = db_id
+        self.sql = sql
+        self.user = user
+        self.task = task
+        self.started = time.time()
+        self.cancel_reason: Optional[str] = None
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "queryId": self.query_id,
+            "query": self.sql,
+            "user": self.user,
+            "startedAt": self.started,
+            "runningMs": (time.time() - self.started) * 1000,
+        }
+
+
+class QueryRegistry:
+    """Queries in flight, so they can be cancelled by id or on client disconnect.
+
+    A query runs as its own task; cancelling that task is what the drivers
+    turn into a server-side cancel (asyncpg's cancel request, an SQLite
+    interrupt, MySQL KILL QUERY).
+    """
+
+    def __init__(self):
+        self._running: Dict[str, RunningQuery] = {}
+        self.cancelled = 0
+        self.disconnected = 0
+
+    @staticmethod
+    def new_id() -> str:
+        return str(uuid.uuid4())
+
+    async def run(self, db_id: str, sql: str, work: Awaitable[Any], request: Optional[Request] = None,
+                  query_id: Optional[str] = None, user: Optional[str] = None) -> Any:
+        query_id = query_id or self.new_id()
+        if query_id in self._running:
+            if asyncio.iscoroutine(work):
+                work.close()
+            raise ValueError(f"Query id {query_id} is already running")
+        task = asyncio.ensure_future(work)
+        running = self._running[query_id] = RunningQuery(query_id, db_id, sql, user, task)
+        watcher = asyncio.ensure_future(wait_for_disconnect(request)) if request is not None else None
+        try:
+            await asyncio.wait([task] + ([watcher] if watcher else []), return_when=asyncio.FIRST_COMPLETED)
+            if not task.done():
+                self.disconnected += 1
+                running.cancel_reason = "Client disconnected"
+                task.cancel()
+            try:
+                return await task
+            except asyncio.CancelledError:
+                if running.cancel_reason is None:
+                    raise
+                raise QueryCancelled(running.cancel_reason) from None
+        finally:
+            # Also reached when the request itself is cancelled
+            task.cancel()
+            if watcher is not None:
+                watcher.cancel()
+            self._running.pop(query_id, None)
+
+    async def stream(self, db_id: str, sql: str, events: AsyncIterator[Any], timeout: float,
+                     query_id: Optional[str] = None, user: Optional[str] = None) -> AsyncIterator[Any]:
+        """events, iterated as a registered query bounded by timeout.
+
+        The database side runs as the query's task and hands over one event at
+        a time, so a slow reader holds at most one batch. Cancelling the query
+        or running out of time raises in the reader once pending events are read.
+        """
+        handoff: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+        async def pump():
+            try:
+                async for event in events:
+                    await handoff.put(event)
+            finally:
+                await events.aclose()
+
+        async def work():
+            try:
+                await asyncio.wait_for(pump(), timeout)
+            except asyncio.TimeoutError:
+                raise asyncio.TimeoutError(f"Query timed out after {int(timeout * 1000)} ms") from None
+
+        # No request: the response streaming the events watches for disconnects
+        runner = asyncio.ensure_future(self.run(db_id, sql, work(), query_id=query_id, user=user))
+        try:
+            while True:
+                getter = asyncio.ensure_future(handoff.get())
+                await asyncio.wait([getter, runner], return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield getter.result()
+                    continue
+                getter.cancel()
+                if handoff.empty():
+                    # Finished: returns, or raises the timeout or QueryCancelled
+                    runner.result()
+                    return
+                yield handoff.get_nowait()
+        finally:
+            runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+
+    def cancel(self, db_id: str, query_id: str) -> bool:
+        running = self._running.get(query_id)
+        if running is None or running.db_id != db_id or running.task.done():
+            return False
+        self.cancelled += 1
+        running.cancel_reason = "Query cancelled"
+        running.task.cancel()
+        return True
+
+    def list(self, db_id: str) -> List[Dict[str, Any]]:
+        return [q.info() for q in self._running.values() if q.db_id == db_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"running": len(self._running), "cancelled": self.cancelled, "disconnected": self.disconnected}
+
+
+query_registry = QueryRegistry()
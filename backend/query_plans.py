@@ -0,0 +1,230 @@
+import os
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Full scans of tables smaller than this are not worth a warning
+EXPLAIN_FULL_SCAN_MIN_ROWS = int(os.getenv("EXPLAIN_FULL_SCAN_MIN_ROWS", "1000"))
+# How many of the most expensive nodes to report, and the share of the whole
+# plan above which one is also flagged as a warning
+EXPLAIN_HOTSPOTS = int(os.getenv("EXPLAIN_HOTSPOTS", "3"))
+EXPLAIN_EXPENSIVE_SHARE = float(os.getenv("EXPLAIN_EXPENSIVE_SHARE", "0.5"))
+
+_SQLITE_DETAIL = re.compile(
+    r"^(SCAN|SEARCH) (?:TABLE )?(\S+)(?: AS (\S+))?(?: USING (?:(?:COVERING )?INDEX (\S+)|(INTEGER PRIMARY KEY|PRIMARY KEY)))?"
+)
+_TABLE_REFERENCE = re.compile(
+    r"\b(?:FROM|JOIN|UPDATE|INTO)\s+((?:[`\"\[]?\w+[`\"\]]?\.)?[`\"\[]?\w+[`\"\]]?)(?:\s+(?:AS\s+)?(\w+))?",
+    re.I,
+)
+_NOT_ALIASES = {
+    "where", "on", "using", "join", "inner", "left", "right", "full", "cross", "natural", "outer", "group",
+    "order", "limit", "offset", "having", "union", "except", "intersect", "set", "values", "window", "as",
+}
+_MYSQL_WRAPPERS = {
+    "ordering_operation": "Sort",
+    "grouping_operation": "Group",
+    "duplicates_removal": "Distinct",
+    "windowing": "Window",
+    "buffer_result": "Buffer",
+}
+
+
+def _node(operation: str, children: Optional[List[Dict[str, Any]]] = None, **fields) -> Dict[str, Any]:
+    return {"operation": operation, "children": children or [], **fields}
+
+
+def _float(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _unquote(name: str) -> str:
+    return name.split(".")[-1].strip('`"[]')
+
+
+def table_aliases(sql: str) -> Dict[str, str]:
+    """alias -> table for the FROM/JOIN references in sql (best effort)."""
+    aliases = {}
+    for table, alias in _TABLE_REFERENCE.findall(sql):
+        table = _unquote(table)
+        aliases[table.lower()] = table
+        if alias and alias.lower() not in _NOT_ALIASES:
+            aliases[alias.lower()] = table
+    return aliases
+
+
+# Engine output -> one tree of plain dicts shaped like models.PlanNode
+
+def postgres_plan(raw: Any) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    document = raw[0] if isinstance(raw, list) else raw
+
+    def walk(plan: Dict[str, Any]) -> Dict[str, Any]:
+        children = [walk(child) for child in plan.get("Plans", [])]
+        loops = plan.get("Actual Loops") or 1
+        actual_time = plan.get("Actual Total Time")
+        node = _node(
+            plan["Node Type"], children,
+            table=plan.get("Relation Name"),
+            index=plan.get("Index Name"),
+            fullScan=plan["Node Type"] == "Seq Scan",
+            estimatedRows=_float(plan.get("Plan Rows")),
+            estimatedCost=_float(plan.get("Total Cost")),
+            actualRows=plan["Actual Rows"] * loops if "Actual Rows" in plan else None,
+            actualTimeMs=actual_time * loops if actual_time is not None else None,
+            detail=plan.get("Filter") or plan.get("Index Cond") or plan.get("Hash Cond")
+            or plan.get("Merge Cond") or plan.get("Join Filter"),
+        )
+        if node["estimatedCost"] is not None:
+            node["selfCost"] = max(node["estimatedCost"] - sum(c.get("estimatedCost") or 0 for c in children), 0)
+        if node["actualTimeMs"] is not None:
+            node["selfTimeMs"] = max(node["actualTimeMs"] - sum(c.get("actualTimeMs") or 0 for c in children), 0)
+        return node
+
+    timings = {"planningTimeMs": document.get("Planning Time"), "executionTimeMs": document.get("Execution Time")}
+    return walk(document["Plan"]), timings
+
+
+def sqlite_plan(raw: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    root = _node("QUERY PLAN")
+    nodes = {0: root}
+    for row in raw:
+        match = _SQLITE_DETAIL.match(row["detail"])
+        if match:
+            kind, table, _, index, primary_key = match.groups()
+            node = _node(kind, table=table, index=index or primary_key,
+                         fullScan=kind == "SCAN" and not (index or primary_key), detail=row["detail"])
+        else:
+            node = _node(row["detail"])
+        nodes[row["id"]] = node
+        nodes.get(row["parent"], root)["children"].append(node)
+    return root, {}
+
+
+def mysql_plan(raw: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    def table_node(table: Dict[str, Any]) -> Dict[str, Any]:
+        cost = table.get("cost_info") or {}
+        read_cost, eval_cost = _float(cost.get("read_cost")), _float(cost.get("eval_cost"))
+        children = []
+        for sub in [table.get("materialized_from_subquery")] + table.get("attached_subqueries", []):
+            if sub:
+                children.extend(walk(sub.get("query_block") or {}))
+        return _node(
+            table.get("access_type", "table"), children,
+            table=table.get("table_name"),
+            index=table.get("key"),
+            fullScan=table.get("access_type") == "ALL",
+            estimatedRows=_float(table.get("rows_examined_per_scan")),
+            estimatedCost=_float(cost.get("prefix_cost")),
+            selfCost=(read_cost or 0) + (eval_cost or 0) if read_cost is not None or eval_cost is not None else None,
+            detail=table.get("attached_condition"),
+        )
+
+    def walk(block: Dict[str, Any]) -> List[Dict[str, Any]]:
+        nodes = []
+        if "table" in block:
+            nodes.append(table_node(block["table"]))
+        if "nested_loop" in block:
+            nodes.append(_node("Nested Loop", [n for item in block["nested_loop"] for n in walk(item)]))
+        for key, operation in _MYSQL_WRAPPERS.items():
+            if key in block:
+                nodes.append(_node(operation, walk(block[key])))
+        if "union_result" in block:
+            specs = block["union_result"].get("query_specifications", [])
+            nodes.append(_node("Union", [n for spec in specs for n in walk(spec.get("query_block") or {})]))
+        for key in ("attached_subqueries", "optimized_away_subqueries"):
+            for sub in block.get(key, []):
+                nodes.extend(walk(sub.get("query_block") or {}))
+        return nodes
+
+    block = raw.get("query_block", raw)
+    root = _node("Query Block", walk(block),
+                 estimatedCost=_float((block.get("cost_info") or {}).get("query_cost")))
+    return root, {}
+
+
+PLAN_PARSERS = {"postgres": postgres_plan, "sqlite": sqlite_plan, "mysql": mysql_plan}
+
+
+def _walk(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node["children"]:
+        yield from _walk(child)
+
+
+def _weight(node: Dict[str, Any], metric: str) -> float:
+    if metric == "time":
+        return node.get("selfTimeMs") or 0.0
+    if metric == "cost":
+        return node.get("selfCost") or 0.0
+    # No costs at all (SQLite): rows a full scan reads is the best proxy
+    return (node.get("estimatedRows") or 0.0) if node.get("fullScan") else 0.0
+
+
+def analyze_plan(dialect: str, raw: Any, sql: str, tables: List[Dict[str, Any]],
+                 indexes: Dict[str, List[List[str]]]) -> Dict[str, Any]:
+    """Normalises raw EXPLAIN output and annotates it with warnings and hotspots.
+
+    tables is the schema snapshot (for row counts and foreign keys) and indexes
+    the driver's index column lists, both keyed by the real table names.
+    """
+    root, timings = PLAN_PARSERS[dialect](raw)
+    by_name = {t["name"].lower(): t for t in tables}
+    aliases = table_aliases(sql)
+
+    nodes = list(_walk(root))
+    for node_id, node in enumerate(nodes):
+        node["id"] = node_id
+        if node.get("table"):
+            # SQLite and MySQL print aliases; report the real table
+            node["table"] = aliases.get(node["table"].lower(), node["table"])
+            table = by_name.get(node["table"].lower())
+            if table is not None and node.get("fullScan") and not node.get("estimatedRows"):
+                node["estimatedRows"] = float(table["rowCount"])
+
+    warnings = []
+    for node in nodes:
+        if not node.get("fullScan"):
+            continue
+        table = by_name.get((node.get("table") or "").lower())
+        rows = table["rowCount"] if table is not None and table["rowCount"] else node.get("estimatedRows") or 0
+        if rows >= EXPLAIN_FULL_SCAN_MIN_ROWS:
+            warnings.append({"kind": "full_scan", "table": node["table"], "nodeId": node["id"],
+                             "message": f"Full scan of {node['table']} (~{int(rows)} rows)"
+                                        + (f" filtered by {node['detail']}" if node.get("detail") and dialect != "sqlite" else "")})
+
+    planned = {node["table"].lower() for node in nodes if node.get("table")}
+    for name in sorted(planned):
+        table = by_name.get(name)
+        if table is None:
+            continue
+        leading = {columns[0].lower() for columns in indexes.get(table["name"], []) if columns}
+        primary_key = [c["name"] for c in table["columns"] if c["isPrimaryKey"]]
+        if primary_key:
+            leading.add(primary_key[0].lower())
+        for column in table["columns"]:
+            if column["isForeignKey"] and column["name"].lower() not in leading:
+                warnings.append({
+                    "kind": "missing_fk_index", "table": table["name"], "column": column["name"],
+                    "message": f"{table['name']}.{column['name']} references "
+                               f"{column['foreignKeyTable']}({column['foreignKeyColumn']}) but no index starts with it",
+                })
+
+    metric = "time" if any(n.get("selfTimeMs") is not None for n in nodes) else \
+        "cost" if any(n.get("selfCost") is not None for n in nodes) else "rows"
+    total = sum(_weight(n, metric) for n in nodes)
+    hotspots = []
+    if total > 0:
+        ranked = sorted((n for n in nodes if _weight(n, metric) > 0), key=lambda n: _weight(n, metric), reverse=True)
+        for node in ranked[:EXPLAIN_HOTSPOTS]:
+            share = _weight(node, metric) / total
+            hotspots.append({"nodeId": node["id"], "operation": node["operation"], "table": node.get("table"),
+                             "metric": metric, "value": round(_weight(node, metric), 3), "share": round(share, 4)})
+            if share >= EXPLAIN_EXPENSIVE_SHARE and len(nodes) > 2:
+                warnings.append({"kind": "expensive_node", "table": node.get("table"), "nodeId": node["id"],
+                                 "message": f"{node['operation']}" + (f" on {node['table']}" if node.get("table") else "")
+                                            + f" accounts for {share:.0%} of the plan's {metric}"})
+
+    return {"dialect": dialect, "plan": root, "hotspots": hotspots, "warnings": warnings,
+            **{k: v for k, v in timings.items() if v is not None}}
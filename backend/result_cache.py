@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+from cache import TTLCache
+
+PUBLISHED_CACHE_SIZE = int(os.getenv("PUBLISHED_CACHE_SIZE", "1024"))
+# Upper bound on the ttl/staleWhileRevalidate a spec may ask for
+PUBLISHED_CACHE_MAX_TTL = float(os.getenv("PUBLISHED_CACHE_MAX_TTL", "3600"))
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return '*' in candidates or etag in candidates
+
+
+class CachePolicy:
+    def __init__(self, ttl: float, stale_while_revalidate: float = 0.0):
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+
+    @classmethod
+    def from_spec(cls, spec: Dict[str, Any]) -> Optional["CachePolicy"]:
+        config = spec.get('cache') or {}
+        if not config.get('enabled'):
+            return None
+        ttl = min(max(float(config.get('ttl') or 0), 0.0), PUBLISHED_CACHE_MAX_TTL)
+        swr = min(max(float(config.get('staleWhileRevalidate') or 0), 0.0), PUBLISHED_CACHE_MAX_TTL)
+        return cls(ttl, swr) if ttl or swr else None
+
+
+class CachedResult:
+    __slots__ = ('body', 'etag', 'fresh_until', 'generation')
+
+    def __init__(self, body: bytes, etag: str, fresh_until: float, generation: int):
+        self.body = body
+        self.etag = etag
+        self.fresh_until = fresh_until
+        self.generation = generation
+
+    def is_fresh(self) -> bool:
+        return time.monotonic() < self.fresh_until
+
+    def max_age(self) -> int:
+        return max(0, int(self.fresh_until - time.monotonic()))
+
+
+class PublishedResultCache:
+    """Encoded results of published GET endpoints, keyed by (db_id, spec,
+    query, bound arguments).
+
+    Every db_id has a generation number that any write through that database
+    bumps; entries from an older generation are treated as missing, so a write
+    invalidates all of the database's results in O(1).
+    """
+
+    def __init__(self, max_size: int = PUBLISHED_CACHE_SIZE):
+        self._entries = TTLCache(max_size=max_size)
+        self._generations: Dict[str, int] = {}
+        self._refreshing: Set[Hashable] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.stale_hits = 0
+        self.refreshes = 0
+        self.db_invalidations = 0
+
+    @staticmethod
+    def key(db_id: str, spec_id: str, query: str, args, media_type: str = '') -> Hashable:
+        # Bound (already coerced) values, so "5" and "05" share an entry
+        return (db_id, spec_id, query, tuple(args), media_type)
+
+    def generation(self, db_id: str) -> int:
+        return self._generations.get(db_id, 0)
+
+    def get(self, key: Hashable) -> Optional[CachedResult]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.generation != self.generation(key[0]):
+            self._entries.invalidate(key)
+            return None
+        if entry is not None and not entry.is_fresh():
+            self.stale_hits += 1
+        return entry
+
+    def set(self, key: Hashable, body: bytes, etag: str, policy: CachePolicy, generation: int):
+        if generation != self.generation(key[0]):
+            # A write landed while this result was being computed
+            return
+        entry = CachedResult(body, etag, time.monotonic() + policy.ttl, generation)
+        self._entries.set(key, entry, ttl=policy.ttl + policy.stale_while_revalidate)
+
+    def revalidate(self, key: Hashable, refresh: Callable[[], Awaitable[None]]):
+        """Runs refresh in the background unless one is already running for key."""
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        async def run():
+            try:
+                self.refreshes += 1
+                await refresh()
+            except Exception as e:
+                print(f"Background refresh failed for {key[:2]}: {str(e)}")
+            finally:
+                self._refreshing.discard(key)
+
+        task = asyncio.create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def invalidate_db(self, db_id: str):
+        self._generations[db_id] = self.generation(db_id) + 1
+        self.db_invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._entries.stats(),
+            "stale_hits": self.stale_hits,
+            "refreshes": self.refreshes,
+            "db_invalidations": self.db_invalidations,
+        }
@@ -0,0 +1,126 @@
+import base64
+import datetime
+import decimal
+import json
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import orjson
+except ImportError:
+    # The stdlib encoder is the fallback
+    orjson = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.sqlapi.columnar+json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+# ?format= values, for clients that cannot set Accept
+FORMATS = {"json": JSON, "columnar": COLUMNAR_JSON, "arrow": ARROW_STREAM}
+
+
+class NotAcceptable(ValueError):
+    pass
+
+
+def _default(value: Any) -> Any:
+    # The conversions FastAPI's jsonable_encoder applies to database values
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        raw = bytes(value)
+        try:
+            return raw.decode()
+        except UnicodeDecodeError:
+            return base64.b64encode(raw).decode()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return str(value)
+
+
+def dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(value, default=_default, separators=(",", ":")).encode()
+
+
+def negotiate(accept: Optional[str], format: Optional[str] = None) -> str:
+    """The media type to answer with, from ?format= or else the Accept header."""
+    if format:
+        if format not in FORMATS:
+            raise NotAcceptable(f"Unknown format '{format}'; use one of {', '.join(FORMATS)}")
+        chosen = FORMATS[format]
+        if chosen == ARROW_STREAM and pyarrow is None:
+            raise NotAcceptable("Arrow output needs pyarrow installed on the server")
+        return chosen
+
+    ranges = []
+    for i, part in enumerate((accept or "*/*").split(",")):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            ranges.append((-q, i, media_type.lower()))
+    for _, _, media_type in sorted(ranges):
+        if media_type in ("*/*", "application/*", JSON):
+            return JSON
+        if media_type == COLUMNAR_JSON:
+            return COLUMNAR_JSON
+        if media_type == ARROW_STREAM and pyarrow is not None:
+            return ARROW_STREAM
+    if ranges and all(media_type == ARROW_STREAM for _, _, media_type in ranges):
+        raise NotAcceptable("Arrow output needs pyarrow installed on the server")
+    # Anything else (text/plain, a browser's text/html, ...) gets the default
+    return JSON
+
+
+def _arrow_column(values: List[Any]):
+    try:
+        return pyarrow.array(values)
+    except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError, TypeError):
+        # Mixed types in one column (common in SQLite): fall back to text
+        return pyarrow.array([None if v is None else str(_default(v)) if not isinstance(v, str) else v for v in values])
+
+
+def encode_result(media_type: str, columns: List[str], rows: Sequence[Sequence[Any]],
+                  meta: Dict[str, Any], row_objects: bool = False) -> bytes:
+    """Encodes a result set, with meta (rowCount, executionTime, ...) alongside.
+
+    JSON keeps the existing shapes: rows as arrays, or as objects keyed by
+    column name when row_objects is set (published APIs). Columnar JSON and
+    Arrow carry one array per column instead.
+    """
+    if media_type == JSON:
+        if row_objects:
+            body_rows = [dict(zip(columns, row)) for row in rows]
+        else:
+            body_rows = [list(row) for row in rows]
+        return dumps({"columns": columns, "rows": body_rows, **meta})
+
+    data = [list(column) for column in zip(*rows)] if rows else [[] for _ in columns]
+    if media_type == COLUMNAR_JSON:
+        return dumps({"columns": columns, "data": data, **meta})
+
+    table = pyarrow.Table.from_arrays([_arrow_column(values) for values in data], names=list(columns))
+    table = table.replace_schema_metadata({key: json.dumps(value, default=_default) for key, value in meta.items()})
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
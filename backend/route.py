@@ -1,20 +1,31 @@
 from fastapi import APIRouter, HTTPException
 from models import User, DatabaseConnectionResponse, DatabaseConnectionCreate,Schema, DatabaseTable, QueryRequest, QueryResult, AIQueryRequest, AIQueryResponse
-from connectDB import supabase
+from connectDB import metadata_store
+from sqlite_executor import sqlite_executor
+from drivers import get_driver, sql_dialect
+from api_router import PublishedAPIRouter
+from health_monitor import HealthMonitor
+from metrics import span
+from statements import ParameterError, bind_values
 import uuid
-import asyncpg
+import asyncio
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
+published_routes = PublishedAPIRouter(metadata_store)
+health_monitor = HealthMonitor(metadata_store)
 
 @router.post("/add-user")
-def add_user(user: User):
+async def add_user(user: User):
     # Check if user exists
-    response = supabase.table("users").select("id").eq("email", user.email).execute()
+    existing_user = await metadata_store.find_user_by_email(user.email)
 
-    if response.data:
+    if existing_user:
         # User already exists – return the existing ID
-        user_id = response.data[0]['id']
+        user_id = existing_user['id']
     else:
         # Create a new user
         new_user = {
@@ -22,36 +33,22 @@ def add_user(user: User):
             "email": user.email,
             "picture": user.picture
         }
-        insert_response = supabase.table("users").insert(new_user).select("id").execute()
-        user_id = insert_response.data[0]['id']
+        inserted_user = await metadata_store.insert_user(new_user)
+        user_id = inserted_user['id']
 
     return {"message": "User added", "id": user_id}
   
 async def check_db_connection(db_data: DatabaseConnectionCreate):
     try:
-        if db_data.type == 'SQLite':
-            import sqlite3
-            conn = sqlite3.connect(db_data.database_name)
-            conn.close()
-            return True
-        else:
-            conn = await asyncpg.connect(
-                user=db_data.username,
-                password=db_data.password,
-                database=db_data.database_name,
-                host=db_data.host,
-                port=db_data.port
-            )
-            await conn.close()
-            return True
+        await get_driver(None, db_data.dict()).check()
+        return True
     except Exception as e:
-        print(f"Connection failed: {str(e)}")
+        logger.warning("Connection check failed: %s", e)
         return False
     
 @router.post("/add-database", response_model=DatabaseConnectionResponse)
 async def add_database(db: DatabaseConnectionCreate):
-    user_response = supabase.table("users").select("id").eq("id", db.user_id).execute()
-    if not user_response.data:
+    if not await metadata_store.get_user(db.user_id):
         raise HTTPException(status_code=404, detail="User not found")
 
     is_connected = await check_db_connection(db)
@@ -71,506 +68,571 @@ async def add_database(db: DatabaseConnectionCreate):
         "table_count": 0, 
         "total_rows": 0
     }
+    # Only send the limit columns that were set, so rows keep the defaults otherwise
+    new_db.update({column: getattr(db, column) for column in LIMIT_COLUMNS if getattr(db, column) is not None})
 
-    response = supabase.table("database_connections").insert(new_db).execute()
+    inserted_db = await metadata_store.insert_database_connection(new_db)
     
-    if response.data:
-        return response.data[0]
+    if inserted_db:
+        health_monitor.track(inserted_db)
+        return inserted_db
     raise HTTPException(status_code=400, detail="Failed to add database")
 
 @router.get("/databases/{user_id}", response_model=list[DatabaseConnectionResponse])
 async def get_databases(user_id: str):
-    response = supabase.table("database_connections").select("*").eq("user_id", user_id).execute()
-    return response.data
-
-import sqlite3
-from typing import List, Optional
-
-async def get_postgres_schema(conn, db_name: str) -> List[DatabaseTable]:
-    tables = []
-    # Get all tables in the schema
-    table_query = """
-        SELECT table_name 
-        FROM information_schema.tables 
-        WHERE table_schema = $1
-    """
-    table_rows = await conn.fetch(table_query, 'public')
-    
-    for table_row in table_rows:
-        table_name = table_row['table_name']
-        
-        # Get column information
-        column_query = """
-            SELECT 
-                c.column_name,
-                c.data_type,
-                c.is_nullable = 'YES' AS nullable,
-                c.column_default,
-                (SELECT EXISTS (
-                    SELECT 1 
-                    FROM information_schema.table_constraints tc
-                    JOIN information_schema.constraint_column_usage ccu
-                    ON tc.constraint_name = ccu.constraint_name
-                    WHERE tc.constraint_type = 'PRIMARY KEY'
-                    AND tc.table_name = c.table_name
-                    AND ccu.column_name = c.column_name
-                )) AS is_primary_key,
-                (SELECT EXISTS (
-                    SELECT 1 
-                    FROM information_schema.table_constraints tc
-                    JOIN information_schema.constraint_column_usage ccu
-                    ON tc.constraint_name = ccu.constraint_name
-                    WHERE tc.constraint_type = 'FOREIGN KEY'
-                    AND tc.table_name = c.table_name
-                    AND ccu.column_name = c.column_name
-                )) AS is_foreign_key,
-                (SELECT ccu.table_name
-                 FROM information_schema.table_constraints tc
-                 JOIN information_schema.constraint_column_usage ccu
-                 ON tc.constraint_name = ccu.constraint_name
-                 WHERE tc.constraint_type = 'FOREIGN KEY'
-                 AND tc.table_name = c.table_name
-                 AND ccu.column_name = c.column_name) AS fk_table,
-                (SELECT ccu.column_name
-                 FROM information_schema.table_constraints tc
-                 JOIN information_schema.constraint_column_usage ccu
-                 ON tc.constraint_name = ccu.constraint_name
-                 WHERE tc.constraint_type = 'FOREIGN KEY'
-                 AND tc.table_name = c.table_name
-                 AND ccu.column_name = c.column_name) AS fk_column
-            FROM information_schema.columns c
-            WHERE c.table_schema = $1 AND c.table_name = $2
-        """
-        columns = await conn.fetch(column_query, 'public', table_name)
-        
-        # Get row count
-        row_count_query = f"SELECT COUNT(*) FROM {table_name}"
-        row_count = (await conn.fetchrow(row_count_query))['count']
-        
-        # Get table comment (description)
-        comment_query = """
-            SELECT obj_description(
-                (SELECT oid FROM pg_class WHERE relname = $1 AND relnamespace = (
-                    SELECT oid FROM pg_namespace WHERE nspname = $2
-                )),
-                'pg_class'
-            ) AS description
-        """
-        description = await conn.fetchval(comment_query, table_name, 'public')
-        
-        tables.append({
-            "name": table_name,
-            "rowCount": row_count,
-            "description": description,
-            "columns": [
-                {
-                    "name": col['column_name'],
-                    "type": col['data_type'],
-                    "nullable": col['nullable'],
-                    "default": col['column_default'],
-                    "isPrimaryKey": col['is_primary_key'],
-                    "isForeignKey": col['is_foreign_key'],
-                    "foreignKeyTable": col['fk_table'],
-                    "foreignKeyColumn": col['fk_column']
-                } for col in columns
-            ]
-        })
-    
-    return tables
+    return health_monitor.apply(await metadata_store.list_database_connections(user_id))
+
+from typing import List, Dict, Any, Optional, Literal
+from datetime import datetime, timezone
+from cache import TTLCache
+from models import TableRowCount
+from schema_cache import SchemaCache, SchemaSnapshot
+from admission import AdmissionRejected, LIMIT_COLUMNS, admission
+from contextlib import asynccontextmanager
+from fastapi import Request, Response
+from result_encoding import NotAcceptable, encode_result, negotiate
+import math
+
+# Exact COUNT(*) results computed on demand, keyed by (db_id, table_name)
+ROW_COUNT_TIMEOUT_MS = int(os.getenv("ROW_COUNT_TIMEOUT_MS", "5000"))
+# GET /database/{db_id}?row_counts=exact counts at most this many tables, all
+# within one ROW_COUNT_TIMEOUT_MS budget; the others keep their estimates
+ROW_COUNT_EXACT_MAX_TABLES = int(os.getenv("ROW_COUNT_EXACT_MAX_TABLES", "50"))
+row_count_cache = TTLCache(max_size=int(os.getenv("ROW_COUNT_CACHE_SIZE", "4096")),
+                           ttl=float(os.getenv("ROW_COUNT_CACHE_TTL", "600")))
+
+def apply_cached_row_counts(db_id: str, tables: List[Dict[str, Any]]):
+    for table in tables:
+        cached = row_count_cache.get((db_id, table['name']))
+        if cached is not None:
+            table['rowCount'] = cached['rowCount']
+            table['rowCountIsEstimate'] = False
+            table['rowCountComputedAt'] = cached['computedAt']
+
+def cache_row_count(db_id: str, table_name: str, row_count: int) -> Dict[str, Any]:
+    entry = {"rowCount": row_count, "computedAt": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")}
+    row_count_cache.set((db_id, table_name), entry)
+    return entry
+
+async def count_exact_rows(db_id: str, db_config: Dict[str, Any], tables: List[Dict[str, Any]]):
+    driver = get_driver(db_id, db_config)
+    deadline = time.monotonic() + ROW_COUNT_TIMEOUT_MS / 1000
+    async with admitted(db_id, db_config):
+        for table in tables[:ROW_COUNT_EXACT_MAX_TABLES]:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                cache_row_count(db_id, table['name'], await driver.count_rows(table['name'], timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+# One schema snapshot per db_id, shared by the viewer, AI query and API generator
+schema_cache = SchemaCache()
+
+def schema_name_for(db_config: Dict[str, Any]) -> str:
+    return get_driver(None, db_config).schema_name
+
+async def introspect_schema(db_id: str, db_config: Dict[str, Any], row_counts: str = 'estimate') -> List[Dict[str, Any]]:
+    return await get_driver(db_id, db_config).introspect(row_counts)
+
+async def probe_schema_version(db_id: str, db_config: Dict[str, Any]) -> Optional[str]:
+    return await get_driver(db_id, db_config).schema_version()
+
+async def get_schema_snapshot(db_id: str, db_config: Dict[str, Any], force: bool = False) -> SchemaSnapshot:
+    async def load():
+        # Probe first so a change racing with introspection is seen next time
+        version = await probe_schema_version(db_id, db_config)
+        tables = await introspect_schema(db_id, db_config)
+        return SchemaSnapshot(db_id, schema_name_for(db_config), tables, version)
+
+    return await schema_cache.get(db_id, load, lambda: probe_schema_version(db_id, db_config), force=force)
+
+def admission_error(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=e.detail,
+                         headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
+
+def negotiated(accept: Optional[str], format: Optional[str] = None) -> str:
+    try:
+        return negotiate(accept, format)
+    except NotAcceptable as e:
+        raise HTTPException(status_code=406, detail=str(e))
 
-async def get_mysql_schema(conn, db_name: str) -> List[DatabaseTable]:
-    tables = []
-    # Get all tables
-    table_query = f"SHOW TABLES FROM {db_name}"
-    table_rows = await conn.fetch(table_query)
-    
-    for table_row in table_rows:
-        table_name = table_row[f'Tables_in_{db_name}']
-        
-        # Get column information
-        column_query = f"""
-            SELECT 
-                COLUMN_NAME,
-                DATA_TYPE,
-                IS_NULLABLE = 'YES' AS nullable,
-                COLUMN_DEFAULT,
-                COLUMN_KEY = 'PRI' AS is_primary_key,
-                COLUMN_KEY = 'MUL' AS is_foreign_key,
-                (SELECT REFERENCED_TABLE_NAME
-                 FROM information_schema.KEY_COLUMN_USAGE
-                 WHERE TABLE_NAME = c.TABLE_NAME
-                 AND COLUMN_NAME = c.COLUMN_NAME
-                 AND CONSTRAINT_NAME != 'PRIMARY') AS fk_table,
-                (SELECT REFERENCED_COLUMN_NAME
-                 FROM information_schema.KEY_COLUMN_USAGE
-                 WHERE TABLE_NAME = c.TABLE_NAME
-                 AND COLUMN_NAME = c.COLUMN_NAME
-                 AND CONSTRAINT_NAME != 'PRIMARY') AS fk_column
-            FROM information_schema.COLUMNS c
-            WHERE TABLE_NAME = %s
-        """
-        columns = await conn.fetch(column_query, (table_name,))
-        
-        # Get row count
-        row_count_query = f"SELECT COUNT(*) FROM {table_name}"
-        row_count = (await conn.fetchrow(row_count_query))['count']
-        
-        # Get table comment
-        comment_query = f"""
-            SELECT TABLE_COMMENT 
-            FROM information_schema.TABLES 
-            WHERE TABLE_NAME = %s
-        """
-        description = await conn.fetchval(comment_query, (table_name,))
-        
-        tables.append({
-            "name": table_name,
-            "rowCount": row_count,
-            "description": description,
-            "columns": [
-                {
-                    "name": col['COLUMN_NAME'],
-                    "type": col['DATA_TYPE'],
-                    "nullable": col['nullable'],
-                    "default": col['COLUMN_DEFAULT'],
-                    "isPrimaryKey": col['is_primary_key'],
-                    "isForeignKey": col['is_foreign_key'],
-                    "foreignKeyTable": col['fk_table'],
-                    "foreignKeyColumn": col['fk_column']
-                } for col in columns
-            ]
-        })
-    
-    return tables
+def client_id(request: Request) -> Optional[str]:
+    # There is no login, so the peer address is the only identity a caller cannot
+    # pick for themselves (behind a proxy, run uvicorn with --proxy-headers)
+    return request.client.host if request.client else None
 
-def get_sqlite_schema(conn, db_name: str) -> List[DatabaseTable]:
-    tables = []
-    cursor = conn.cursor()
-    
-    # Get all tables
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    table_rows = cursor.fetchall()
-    
-    for table_row in table_rows:
-        table_name = table_row[0]
-        
-        # Get column information
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = cursor.fetchall()
-        
-        # Get foreign key information
-        cursor.execute(f"PRAGMA foreign_key_list({table_name})")
-        fk_info = {row[3]: (row[2], row[4]) for row in cursor.fetchall()}  # column: (table, column)
-        
-        # Get row count
-        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-        row_count = cursor.fetchone()[0]
-        
-        # Get table comment (SQLite doesn't support table comments natively)
-        description = None
-        
-        tables.append({
-            "name": table_name,
-            "rowCount": row_count,
-            "description": description,
-            "columns": [
-                {
-                    "name": col[1],
-                    "type": col[2],
-                    "nullable": col[3] == 0,
-                    "default": col[4],
-                    "isPrimaryKey": col[5] == 1,
-                    "isForeignKey": col[1] in fk_info,
-                    "foreignKeyTable": fk_info.get(col[1], (None, None))[0],
-                    "foreignKeyColumn": fk_info.get(col[1], (None, None))[1]
-                } for col in columns
-            ]
-        })
-    
-    return tables
+def check_rate(db_id: str, db_config: Dict[str, Any], endpoint: str, request: Request):
+    try:
+        admission.check_rate(db_id, db_config, endpoint, client_id(request))
+    except AdmissionRejected as e:
+        raise admission_error(e)
+
+async def acquire_slot(db_id: str, db_config: Dict[str, Any]):
+    try:
+        with span("admission"):
+            await admission.acquire(db_id, db_config)
+    except AdmissionRejected as e:
+        raise admission_error(e)
+
+@asynccontextmanager
+async def admitted(db_id: str, db_config: Dict[str, Any]):
+    # One of the database's concurrency slots, held for the block
+    await acquire_slot(db_id, db_config)
+    try:
+        yield
+    finally:
+        admission.release(db_id)
 
 @router.get("/database/{db_id}", response_model=List[Schema])
-async def get_database_details(db_id: str):
+async def get_database_details(db_id: str, row_counts: Literal['estimate', 'exact'] = 'estimate'):
     # Fetch connection details
-    response = supabase.table("database_connections").select("*").eq("id", db_id).execute()
-    if not response.data:
+    db_config = await metadata_store.get_database_connection(db_id)
+    if not db_config:
         raise HTTPException(status_code=404, detail="Database connection not found")
     
-    db_config = response.data[0]
-    db_type = db_config['type']
-    schema_name = 'public' if db_type == 'PostgreSQL' else db_config['database_name']
-    
     try:
-        if db_type == 'PostgreSQL':
-            conn = await asyncpg.connect(
-                user=db_config['username'],
-                password=db_config['password'],
-                database=db_config['database_name'],
-                host=db_config['host'],
-                port=db_config['port']
-            )
-            tables = await get_postgres_schema(conn, db_config['database_name'])
-            await conn.close()
-        elif db_type == 'MySQL':
-            conn = await asyncpg.connect(  # Note: Replace with mysql-connector or pymysql in a real implementation
-                user=db_config['username'],
-                password=db_config['password'],
-                database=db_config['database_name'],
-                host=db_config['host'],
-                port=db_config['port']
-            )
-            tables = await get_mysql_schema(conn, db_config['database_name'])
-            await conn.close()
-        else:  # SQLite
-            conn = sqlite3.connect(db_config['database_name'])
-            tables = get_sqlite_schema(conn, db_config['database_name'])
-            conn.close()
-        
-        return [{"name": schema_name, "tables": tables}]
+        schema = (await get_schema_snapshot(db_id, db_config)).schema_json()
+        apply_cached_row_counts(db_id, schema['tables'])
+        if row_counts == 'exact':
+            await count_exact_rows(db_id, db_config, [t for t in schema['tables'] if t['rowCountIsEstimate']])
+            apply_cached_row_counts(db_id, schema['tables'])
+        return [schema]
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch database details: {str(e)}")
 
-import sqlite3
-from typing import List, Dict, Any
-
+@router.post("/database/{db_id}/schema/refresh", response_model=dict)
+async def refresh_schema(db_id: str):
+    db_config = await metadata_store.get_database_connection(db_id)
+    if not db_config:
+        raise HTTPException(status_code=404, detail="Database connection not found")
+    
+    try:
+        snapshot = await get_schema_snapshot(db_id, db_config, force=True)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to refresh schema: {str(e)}")
+    return snapshot.info()
 
-@router.get("/database/{db_id}/table/{table_name}/data", response_model=List[Dict[str, Any]])
-async def get_table_data(db_id: str, table_name: str):
-    # Fetch connection details
-    response = supabase.table("database_connections").select("*").eq("id", db_id).execute()
-    if not response.data:
+@router.get("/database/{db_id}/table/{table_name}/count", response_model=TableRowCount)
+async def get_table_row_count(db_id: str, table_name: str, timeout_ms: Optional[int] = None, refresh: bool = False):
+    db_config = await metadata_store.get_database_connection(db_id)
+    if not db_config:
         raise HTTPException(status_code=404, detail="Database connection not found")
     
-    db_config = response.data[0]
-    db_type = db_config['type']
+    if not table_name.isalnum() and not table_name.replace('_', '').isalnum():
+        raise HTTPException(status_code=400, detail="Invalid table name")
+    
+    cache_key = (db_id, table_name)
+    cached = None if refresh else row_count_cache.get(cache_key)
+    if cached is not None:
+        return {"table": table_name, "exact": True, **cached}
+    
+    timeout = (timeout_ms or ROW_COUNT_TIMEOUT_MS) / 1000
+    try:
+        async with admitted(db_id, db_config):
+            row_count = await get_driver(db_id, db_config).count_rows(table_name, timeout=timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Row count exceeded the {int(timeout * 1000)} ms budget")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to count rows: {str(e)}")
+    
+    entry = cache_row_count(db_id, table_name, row_count)
+    return {"table": table_name, "exact": True, **entry}
+
+from typing import List, Dict, Any
+from models import TablePage
+from pagination import PageQuery, PaginationError, TABLE_PAGE_SIZE, TABLE_PAGE_MAX_SIZE
+
+
+async def fetch_table_page(db_id: str, db_config: Dict[str, Any], table_name: str, page_size: int,
+                           columns: Optional[List[str]] = None, sort: Optional[str] = None,
+                           descending: bool = False, cursor: Optional[str] = None) -> Dict[str, Any]:
+    driver = get_driver(db_id, db_config)
     
     # Sanitize table_name to prevent SQL injection
     if not table_name.isalnum() and not table_name.replace('_', '').isalnum():
         raise HTTPException(status_code=400, detail="Invalid table name")
+    if not 1 <= page_size <= TABLE_PAGE_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"page_size must be between 1 and {TABLE_PAGE_MAX_SIZE}")
     
     try:
-        if db_type == 'PostgreSQL':
-            conn = await asyncpg.connect(
-                user=db_config['username'],
-                password=db_config['password'],
-                database=db_config['database_name'],
-                host=db_config['host'],
-                port=db_config['port']
-            )
-            query = f"SELECT * FROM {table_name} LIMIT 25"
-            rows = await conn.fetch(query)
-            await conn.close()
-            return [dict(row) for row in rows]
-        elif db_type == 'MySQL':
-            # Placeholder; use mysql-connector-python or pymysql in production
-            raise HTTPException(status_code=501, detail="MySQL not implemented")
-        else:  # SQLite
-            conn = sqlite3.connect(db_config['database_name'])
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT * FROM {table_name} LIMIT 25")
-            rows = cursor.fetchall()
-            columns = [description[0] for description in cursor.description]
-            conn.close()
-            return [dict(zip(columns, row)) for row in rows]
+        snapshot = await get_schema_snapshot(db_id, db_config)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch table data: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch schema: {str(e)}")
+    table = next((t for t in snapshot.tables if t['name'] == table_name), None)
+    if table is None:
+        raise HTTPException(status_code=404, detail="Table not found")
+    
+    try:
+        page_query = PageQuery(driver.dialect, table, snapshot.schema_name, columns, sort, descending)
+        after = page_query.decode(cursor)
+        sql, args = page_query.sql(after, page_size)
+    except PaginationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async with admitted(db_id, db_config):
+        try:
+            _, rows = await driver.fetch(sql, args)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to fetch table data: {str(e)}")
+    
+    page_rows, next_cursor = page_query.page(rows, page_size, after)
+    return {"columns": page_query.columns, "rows": page_rows, "pageSize": page_size, "nextCursor": next_cursor}
+
+@router.get("/database/{db_id}/table/{table_name}/rows", response_model=TablePage)
+async def get_table_rows(db_id: str, table_name: str, page_size: int = TABLE_PAGE_SIZE, columns: Optional[str] = None,
+                         sort: Optional[str] = None, order: Literal['asc', 'desc'] = 'asc', cursor: Optional[str] = None):
+    db_config = await metadata_store.get_database_connection(db_id)
+    if not db_config:
+        raise HTTPException(status_code=404, detail="Database connection not found")
+    
+    projection = [c.strip() for c in columns.split(',') if c.strip()] if columns else None
+    return await fetch_table_page(db_id, db_config, table_name, page_size, projection, sort, order == 'desc', cursor)
+
+@router.get("/database/{db_id}/table/{table_name}/data", response_model=List[Dict[str, Any]])
+async def get_table_data(db_id: str, table_name: str):
+    # Fetch connection details
+    db_config = await metadata_store.get_database_connection(db_id)
+    if not db_config:
+        raise HTTPException(status_code=404, detail="Database connection not found")
+    
+    # First page of the keyset-paginated view; use /rows to page further
+    page = await fetch_table_page(db_id, db_config, table_name, TABLE_PAGE_SIZE)
+    return page['rows']
 
 from typing import List, Dict, Any
-import google.generativeai as genai
+import json
 import time
-
-async def get_schema_info(db_config: Dict[str, Any], db_type: str) -> str:
-    schema_info = []
+from llm import get_model
+from ai_cache import AIResponseCache
+from fastapi.responses import StreamingResponse
+from streaming import STREAM_FORMATS
+from queries import PUBLISHED_QUERY_TIMEOUT_MS, QueryCancelled, query_registry, query_timeout
+from jobs import Job, JobError, TERMINAL_STATES, job_manager
+from models import QueryJob, QueryJobPage
+from sql_analysis import SQL_GUARD_MODE, StatementAnalysis, analyze_sql, find_issues, limit_sql
+
+ai_query_cache = AIResponseCache()
+
+async def get_schema_info(db_config: Dict[str, Any], db_type: str, prompt: Optional[str] = None) -> str:
     try:
-        if db_type == 'PostgreSQL':
-            conn = await asyncpg.connect(
-                user=db_config['username'],
-                password=db_config['password'],
-                database=db_config['database_name'],
-                host=db_config['host'],
-                port=db_config['port']
-            )
-            table_query = "SELECT table_name FROM information_schema.tables WHERE table_schema = 'public'"
-            tables = await conn.fetch(table_query)
-            for table in tables:
-                table_name = table['table_name']
-                column_query = """
-                    SELECT 
-                        column_name, 
-                        data_type, 
-                        is_nullable = 'YES' AS nullable,
-                        column_default,
-                        (SELECT EXISTS (
-                            SELECT 1 
-                            FROM information_schema.table_constraints tc
-                            JOIN information_schema.constraint_column_usage ccu
-                            ON tc.constraint_name = ccu.constraint_name
-                            WHERE tc.constraint_type = 'PRIMARY KEY'
-                            AND tc.table_name = c.table_name
-                            AND ccu.column_name = c.column_name
-                        )) AS is_primary_key,
-                        (SELECT EXISTS (
-                            SELECT 1 
-                            FROM information_schema.table_constraints tc
-                            JOIN information_schema.constraint_column_usage ccu
-                            ON tc.constraint_name = ccu.constraint_name
-                            WHERE tc.constraint_type = 'FOREIGN KEY'
-                            AND tc.table_name = c.table_name
-                            AND ccu.column_name = c.column_name
-                        )) AS is_foreign_key,
-                        (SELECT ccu.table_name
-                         FROM information_schema.table_constraints tc
-                         JOIN information_schema.constraint_column_usage ccu
-                         ON tc.constraint_name = ccu.constraint_name
-                         WHERE tc.constraint_type = 'FOREIGN KEY'
-                         AND tc.table_name = c.table_name
-                         AND ccu.column_name = c.column_name) AS fk_table,
-                        (SELECT ccu.column_name
-                         FROM information_schema.table_constraints tc
-                         JOIN information_schema.constraint_column_usage ccu
-                         ON tc.constraint_name = ccu.constraint_name
-                         WHERE tc.constraint_type = 'FOREIGN KEY'
-                         AND tc.table_name = c.table_name
-                         AND ccu.column_name = c.column_name) AS fk_column
-                    FROM information_schema.columns c
-                    WHERE table_schema = 'public' AND table_name = $1
-                """
-                columns = await conn.fetch(column_query, table_name)
-                comment_query = """
-                    SELECT obj_description(
-                        (SELECT oid FROM pg_class WHERE relname = $1 AND relnamespace = (
-                            SELECT oid FROM pg_namespace WHERE nspname = 'public'
-                        )),
-                        'pg_class'
-                    ) AS description
-                """
-                description = await conn.fetchval(comment_query, table_name)
-                schema_info.append({
-                    "table": table_name,
-                    "description": description,
-                    "columns": [
-                        {
-                            "name": col['column_name'],
-                            "type": col['data_type'],
-                            "nullable": col['nullable'],
-                            "default": col['column_default'],
-                            "isPrimaryKey": col['is_primary_key'],
-                            "isForeignKey": col['is_foreign_key'],
-                            "foreignKeyTable": col['fk_table'],
-                            "foreignKeyColumn": col['fk_column']
-                        } for col in columns
-                    ]
-                })
-            await conn.close()
-        else:  # SQLite
-            conn = sqlite3.connect(db_config['database_name'])
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = cursor.fetchall()
-            for table in tables:
-                table_name = table[0]
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns = cursor.fetchall()
-                cursor.execute(f"PRAGMA foreign_key_list({table_name})")
-                fk_info = {row[3]: (row[2], row[4]) for row in cursor.fetchall()}
-                schema_info.append({
-                    "table": table_name,
-                    "description": None,
-                    "columns": [
-                        {
-                            "name": col[1],
-                            "type": col[2],
-                            "nullable": col[3] == 0,
-                            "default": col[4],
-                            "isPrimaryKey": col[5] == 1,
-                            "isForeignKey": col[1] in fk_info,
-                            "foreignKeyTable": fk_info.get(col[1], (None, None))[0],
-                            "foreignKeyColumn": fk_info.get(col[1], (None, None))[1]
-                        } for col in columns
-                    ]
-                })
-            conn.close()
-        return "\n".join([
-            f"Table: {table['table']}\nDescription: {table['description'] or 'None'}\nColumns:\n" +
-            "\n".join([
-                f"  - {col['name']} ({col['type']}, " +
-                f"{'NOT NULL' if not col['nullable'] else 'NULLABLE'}, " +
-                f"{'PRIMARY KEY' if col['isPrimaryKey'] else ''}, " +
-                (f"FOREIGN KEY -> {col['foreignKeyTable']}.{col['foreignKeyColumn']}" if col['isForeignKey'] else '') +
-                f"{', DEFAULT ' + str(col['default']) if col['default'] else ''})"
-                for col in table['columns']
-            ]) for table in schema_info
-        ])
+        snapshot = await get_schema_snapshot(db_config['id'], db_config)
+        if prompt is None:
+            return snapshot.prompt_text
+        # Building the index for a large schema is CPU-bound, keep it off the loop
+        return await asyncio.to_thread(snapshot.prompt_context, prompt)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch schema: {str(e)}")
 
+async def table_row_counts(db_id: str, db_config: Dict[str, Any]) -> Dict[str, int]:
+    try:
+        snapshot = await get_schema_snapshot(db_id, db_config)
+    except Exception:
+        # Let the statement itself report a broken connection
+        snapshot = schema_cache.peek(db_id)
+    return snapshot.row_counts if snapshot is not None else {}
+
+def guard_statement(analysis: StatementAnalysis, row_counts: Dict[str, int], confirmed: bool = False):
+    if SQL_GUARD_MODE == 'off' or (confirmed and SQL_GUARD_MODE == 'confirm'):
+        return
+    issues = find_issues(analysis, row_counts)
+    if issues:
+        message = "The statement looks expensive"
+        if SQL_GUARD_MODE == 'confirm':
+            message += "; send it again with confirm set to run it anyway"
+        raise HTTPException(status_code=409, detail={"message": message, "issues": issues})
+
+def needs_row_counts(analysis: StatementAnalysis) -> bool:
+    return bool(analysis.tables) and (not analysis.has_where or any(t.joined_without_condition for t in analysis.tables))
+
 @router.post("/database/{db_id}/query", response_model=QueryResult)
-async def execute_query(db_id: str, request: QueryRequest):
-    response = supabase.table("database_connections").select("*").eq("id", db_id).execute()
-    if not response.data:
+async def execute_query(db_id: str, request: QueryRequest, http_request: Request,
+                        format: Optional[Literal['json', 'columnar', 'arrow']] = None):
+    db_config = await metadata_store.get_database_connection(db_id)
+    if not db_config:
         raise HTTPException(status_code=404, detail="Database connection not found")
+    check_rate(db_id, db_config, "query", http_request)
+    media_type = negotiated(http_request.headers.get("accept"), format)
     
-    db_config = response.data[0]
-    db_type = db_config['type']
     query = request.query
+    analysis = analyze_sql(query, sql_dialect(db_config))
+    if SQL_GUARD_MODE != 'off' and not request.confirm and needs_row_counts(analysis):
+        guard_statement(analysis, await table_row_counts(db_id, db_config))
+    query, applied_limit = limit_sql(query, analysis)
+    
+    query_id = request.queryId or query_registry.new_id()
+    timeout = query_timeout(request.timeoutMs)
+    await acquire_slot(db_id, db_config)
+    start_time = time.perf_counter()
+    error = None
+    try:
+        try:
+            # Cancelled on client disconnect or via /query/{query_id}/cancel
+            with span("query"):
+                columns, rows = await query_registry.run(
+                    db_id, query, get_driver(db_id, db_config).execute(query, timeout=timeout),
+                    http_request, query_id, client_id(http_request))
+        finally:
+            statement_finished(db_id, analysis)
+    except Exception as e:
+        columns, rows = [], []
+        error = f"Query timed out after {int(timeout * 1000)} ms" if isinstance(e, asyncio.TimeoutError) else str(e)
+    
+    meta = {"rowCount": len(rows), "executionTime": (time.perf_counter() - start_time) * 1000, "error": error,
+            "queryId": query_id, "appliedLimit": applied_limit}
+    # Encoded directly: re-validating every row through QueryResult costs more than the query on wide results
+    with span("serialize"):
+        body = encode_result(media_type, columns, rows, meta)
+    return Response(content=body, media_type=media_type)
+
+def statement_finished(db_id: str, analysis: StatementAnalysis, background: bool = False):
+    # Frees the admission slot, then drops what the statement may have made stale.
+    # After it ran, so a read racing it cannot re-cache the old schema or rows.
+    admission.release(db_id, background)
+    if analysis.kind == 'ddl':
+        # Re-probe the schema version on the next schema read
+        schema_cache.invalidate(db_id)
+    if not analysis.is_read:
+        published_results.invalidate_db(db_id)
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """Holds db_id's admission slot until the client has read the last row.
+
+    Released when the response finishes, not from inside the body: a client that
+    disconnects before the first chunk means the body is never iterated.
+    """
+
+    def __init__(self, db_id: str, analysis: StatementAnalysis, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.db_id = db_id
+        self.analysis = analysis
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            statement_finished(self.db_id, self.analysis)
+
+@router.post("/database/{db_id}/query/stream")
+async def stream_query(db_id: str, request: QueryRequest, http_request: Request,
+                       format: Literal['ndjson', 'json'] = 'ndjson'):
+    db_config = await metadata_store.get_database_connection(db_id)
+    if not db_config:
+        raise HTTPException(status_code=404, detail="Database connection not found")
+    check_rate(db_id, db_config, "query", http_request)
     
-    start_time = time.time()
+    query = request.query
+    analysis = analyze_sql(query, sql_dialect(db_config))
+    if SQL_GUARD_MODE != 'off' and not request.confirm and needs_row_counts(analysis):
+        guard_statement(analysis, await table_row_counts(db_id, db_config))
+    
+    # Streams are not limited, but run under the same timeout and can be cancelled by id
+    events = query_registry.stream(db_id, query, get_driver(db_id, db_config).stream(query),
+                                   query_timeout(request.timeoutMs), request.queryId, client_id(http_request))
+    encode, media_type = STREAM_FORMATS[format]
+    body = encode(events)
+    await acquire_slot(db_id, db_config)
     try:
-        if db_type == 'PostgreSQL':
-            conn = await asyncpg.connect(
-                user=db_config['username'],
-                password=db_config['password'],
-                database=db_config['database_name'],
-                host=db_config['host'],
-                port=db_config['port']
-            )
-            rows = await conn.fetch(query)
-            columns = list(rows[0].keys()) if rows else []
-            await conn.close()
-            return {
-                "columns": columns,
-                "rows": [list(row) for row in rows],
-                "rowCount": len(rows),
-                "executionTime": (time.time() - start_time) * 1000,
-                "error": None
-            }
-        else:  # SQLite
-            conn = sqlite3.connect(db_config['database_name'])
-            cursor = conn.cursor()
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            columns = [description[0] for description in cursor.description] if cursor.description else []
-            conn.close()
-            return {
-                "columns": columns,
-                "rows": rows,
-                "rowCount": len(rows),
-                "executionTime": (time.time() - start_time) * 1000,
-                "error": None
-            }
+        return AdmittedStreamingResponse(db_id, analysis, body, media_type=media_type)
+    except BaseException:
+        # From here on the response releases the slot
+        admission.release(db_id)
+        raise
+
+@router.get("/database/{db_id}/queries", response_model=List[Dict[str, Any]])
+async def list_running_queries(db_id: str):
+    return query_registry.list(db_id)
+
+@router.post("/database/{db_id}/query/{query_id}/cancel", response_model=dict)
+async def cancel_query(db_id: str, query_id: str):
+    if not query_registry.cancel(db_id, query_id):
+        raise HTTPException(status_code=404, detail="No running query with this id")
+    return {"queryId": query_id, "cancelled": True}
+
+from models import ExplainRequest, QueryPlan
+from query_plans import analyze_plan
+
+async def profile_statement(driver, sql: str, timeout: float):
+    # For engines without EXPLAIN ANALYZE: time a full run, counting rows without keeping them
+    async def consume() -> int:
+        events = driver.stream(sql)
+        row_count, header_seen = 0, False
+        try:
+            async for event in events:
+                if header_seen:
+                    row_count += len(event)
+                header_seen = True
+        finally:
+            await events.aclose()
+        return row_count
+    
+    start_time = time.perf_counter()
+    row_count = await asyncio.wait_for(consume(), timeout)
+    return row_count, (time.perf_counter() - start_time) * 1000
+
+@router.post("/database/{db_id}/query/explain", response_model=QueryPlan)
+async def explain_query(db_id: str, request: ExplainRequest, http_request: Request):
+    db_config = await metadata_store.get_database_connection(db_id)
+    if not db_config:
+        raise HTTPException(status_code=404, detail="Database connection not found")
+    check_rate(db_id, db_config, "query", http_request)
+    
+    query = request.query.strip().rstrip(';').strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="Query is empty")
+    driver = get_driver(db_id, db_config)
+    # Postgres analyzes inside a rolled-back transaction; elsewhere the statement is run as-is
+    profile = request.analyze and driver.dialect != 'postgres'
+    if profile and not analyze_sql(query, driver.dialect).is_read:
+        raise HTTPException(status_code=400, detail=f"Only read-only statements can be profiled on {db_config['type']}")
+    timeout = query_timeout(request.timeoutMs)
+    
+    try:
+        snapshot = await get_schema_snapshot(db_id, db_config)
     except Exception as e:
-        return {
-            "columns": [],
-            "rows": [],
-            "rowCount": 0,
-            "executionTime": (time.time() - start_time) * 1000,
-            "error": str(e)
-        }
+        raise HTTPException(status_code=500, detail=f"Failed to fetch schema: {str(e)}")
+    
+    async def work():
+        raw = await driver.explain(query, analyze=request.analyze, timeout=timeout)
+        indexes = await driver.indexes()
+        profiled = await profile_statement(driver, query, timeout) if profile else None
+        return raw, indexes, profiled
+    
+    async with admitted(db_id, db_config):
+        try:
+            with span("query"):
+                raw, indexes, profiled = await query_registry.run(db_id, query, work(), http_request,
+                                                                  user=client_id(http_request))
+        except QueryCancelled as e:
+            raise HTTPException(status_code=499, detail=str(e))
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail=f"Explain exceeded the {int(timeout * 1000)} ms budget")
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Failed to explain query: {str(e)}")
+    
+    result = analyze_plan(driver.dialect, raw, query, snapshot.tables, indexes)
+    result.update(analyzed=request.analyze, raw=raw)
+    if profiled is not None:
+        result["rowCount"], result["executionTimeMs"] = profiled
+    return result
+
+async def job_events(job: Job):
+    db_config = await metadata_store.get_database_connection(job.db_id)
+    if not db_config:
+        raise ValueError("Database connection not found")
+    # Jobs queue for one of the database's background slots, never an interactive one
+    with span("admission"):
+        await admission.acquire(job.db_id, db_config, background=True)
+    try:
+        async for event in get_driver(job.db_id, db_config).stream(job.query):
+            yield event
+    finally:
+        statement_finished(job.db_id, analyze_sql(job.query, sql_dialect(db_config)), background=True)
+
+def get_job(db_id: str, job_id: str) -> Job:
+    job = job_manager.get(db_id, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/database/{db_id}/jobs", response_model=QueryJob, status_code=202)
+async def submit_query_job(db_id: str, request: QueryRequest, http_request: Request):
+    db_config = await metadata_store.get_database_connection(db_id)
+    if not db_config:
+        raise HTTPException(status_code=404, detail="Database connection not found")
+    check_rate(db_id, db_config, "query", http_request)
+    
+    try:
+        job = await job_manager.submit(db_id, client_id(http_request) or "anonymous", request.query)
+    except JobError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return job.info()
+
+@router.get("/database/{db_id}/jobs", response_model=List[QueryJob])
+async def list_query_jobs(db_id: str, http_request: Request, mine: bool = False):
+    return [job.info() for job in job_manager.list(db_id, client_id(http_request) if mine else None)]
+
+@router.get("/database/{db_id}/jobs/{job_id}", response_model=QueryJob)
+async def get_query_job(db_id: str, job_id: str):
+    return get_job(db_id, job_id).info()
+
+@router.get("/database/{db_id}/jobs/{job_id}/events")
+async def query_job_events(db_id: str, job_id: str):
+    job = get_job(db_id, job_id)
+    
+    async def events():
+        # Server-sent events: the job's state on every change, until it ends
+        while True:
+            yield f"data: {json.dumps(job.info())}\n\n".encode()
+            if job.state in TERMINAL_STATES:
+                return
+            if not await job.wait_changed(15):
+                yield b": keep-alive\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.get("/database/{db_id}/jobs/{job_id}/rows", response_model=QueryJobPage)
+async def get_query_job_rows(db_id: str, job_id: str, offset: int = 0, limit: int = TABLE_PAGE_MAX_SIZE):
+    job = get_job(db_id, job_id)
+    if offset < 0 or not 1 <= limit <= TABLE_PAGE_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"offset must be >= 0 and limit between 1 and {TABLE_PAGE_MAX_SIZE}")
+    try:
+        columns, rows, total = await job_manager.page(job, offset, limit)
+    except JobError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    next_offset = offset + len(rows) if offset + len(rows) < total else None
+    return {"columns": columns, "rows": rows, "offset": offset, "totalRows": total, "nextOffset": next_offset}
+
+@router.post("/database/{db_id}/jobs/{job_id}/cancel", response_model=QueryJob)
+async def cancel_query_job(db_id: str, job_id: str):
+    job = get_job(db_id, job_id)
+    await job_manager.cancel(job)
+    return job.info()
+
+@router.delete("/database/{db_id}/jobs/{job_id}", response_model=dict)
+async def delete_query_job(db_id: str, job_id: str):
+    await job_manager.delete(get_job(db_id, job_id))
+    return {"id": job_id, "deleted": True}
 
 @router.post("/database/{db_id}/ai-query", response_model=AIQueryResponse)
 async def generate_ai_query(db_id: str, request: AIQueryRequest):
-    response = supabase.table("database_connections").select("*").eq("id", db_id).execute()
-    if not response.data:
+    db_config = await metadata_store.get_database_connection(db_id)
+    if not db_config:
         raise HTTPException(status_code=404, detail="Database connection not found")
     
-    db_config = response.data[0]
     db_type = db_config['type']
     
-    schema_info = await get_schema_info(db_config, db_type)
+    try:
+        snapshot = await get_schema_snapshot(db_id, db_config)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch schema: {str(e)}")
     
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY")) 
-    model = genai.GenerativeModel('gemini-1.5-flash')
+    async def compute():
+        # Building the index for a large schema is CPU-bound, keep it off the loop
+        schema_info = await asyncio.to_thread(snapshot.prompt_context, request.prompt)
+        with span("llm"):
+            result = (await get_model().generate(build_ai_query_prompt(db_type, schema_info, request.prompt))).strip()
+        if result.startswith('```json') and result.endswith('```'):
+            result = result[7:-3].strip()
+        return json.loads(result)
     
+    try:
+        # Identical prompts against an unchanged schema reuse the earlier answer
+        key = AIResponseCache.key(db_id, snapshot.fingerprint, request.prompt)
+        return await ai_query_cache.get_or_compute(key, compute)
+    except Exception as e:
+        return {
+            "query": "SELECT * FROM users LIMIT 10",
+            "explanation": f"Failed to generate query due to error: {str(e)}. Defaulting to a safe query.",
+            "confidence": 60
+        }
+
+def build_ai_query_prompt(db_type: str, schema_info: str, prompt: str) -> str:
     system_prompt = f"""
 You are an expert SQL query generator with knowledge of database schemas. Your task is to generate accurate and efficient SQL queries based on user prompts, considering the provided database schema. Ensure queries are safe, optimized, and compatible with {db_type}. Avoid generating queries that modify data (INSERT, UPDATE, DELETE) unless explicitly requested. If the prompt is unclear, return a safe default query with an explanation.
 
@@ -600,37 +662,19 @@ Example Response:
   "confidence": 90
 }}
 """
-    try:
-        response = await model.generate_content_async(
-            f"{system_prompt}\n\nUser Prompt: {request.prompt}"
-        )
-        result = response.text.strip()
-        print(result)
-        if result.startswith('```json') and result.endswith('```'):
-            result = result[7:-3].strip()
-        import json
-        return json.loads(result)
-    except Exception as e:
-        return {
-            "query": "SELECT * FROM users LIMIT 10",
-            "explanation": f"Failed to generate query due to error: {str(e)}. Defaulting to a safe query.",
-            "confidence": 60
-        }
+    return f"{system_prompt}\n\nUser Prompt: {prompt}"
 
 from models import APIGenerateRequest, GeneratedAPIDetails
 import json
 @router.post("/database/{db_id}/generate-api", response_model=GeneratedAPIDetails)
 async def generate_api(db_id: str, request: APIGenerateRequest):
-    response = supabase.table("database_connections").select("*").eq("id", db_id).execute()
-    if not response.data:
+    db_config = await metadata_store.get_database_connection(db_id)
+    if not db_config:
         raise HTTPException(status_code=404, detail="Database connection not found")
     
-    db_config = response.data[0]
     db_type = db_config['type']
     
-    schema_info = await get_schema_info(db_config, db_type)
-    
-    model = genai.GenerativeModel('gemini-1.5-flash')
+    schema_info = await get_schema_info(db_config, db_type, request.prompt)
     
     system_prompt = f"""
 You are an expert API generator with knowledge of database schemas and OpenAPI specifications. Your task is to generate a complete API specification based on the user's prompt, considering the provided database schema and options. Ensure the API is secure, optimized, and compatible with {db_type}. Avoid generating queries that modify data unless explicitly allowed by the operationType option.
@@ -741,117 +785,203 @@ Example Response:
 
 
     try:
-        response = await model.generate_content_async(
-            f"{system_prompt}\n\nUser Prompt: {request.prompt}"
-        )
-        print(1)
-        result = response.text.strip()
+        with span("llm"):
+            response = await get_model().generate(
+                f"{system_prompt}\n\nUser Prompt: {request.prompt}"
+            )
+        result = response.strip()
         if result.startswith('```json') and result.endswith('```'):
             result = result[7:-3].strip()
         api_spec = json.loads(result)
-        print(2)
         
         api_spec['isPublished'] = False
         api_spec['id'] = str(uuid.uuid4())
         api_spec['createdAt'] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
-        print(3)
-        supabase.table("api_specs").insert({
+        await metadata_store.insert_api_spec({
             "id": api_spec['id'],
             "db_id": db_id,
             "spec": api_spec,
             "created_at": api_spec['createdAt']
-        }).execute()
-        print(4)
+        })
+        published_routes.register(db_id, api_spec['id'], api_spec)
         
         return GeneratedAPIDetails(**api_spec)
     except json.JSONDecodeError as e:
-        print("Invalid JSON:", result)
+        logger.warning("Model returned invalid JSON for %s: %.500s", db_id, result)
         raise HTTPException(status_code=500, detail=f"JSON decode error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate API: {str(e)}")
 
-from fastapi import Request
+from fastapi import Request, Response
 from models import GeneratedAPIDetails
+from result_cache import CachePolicy, PublishedResultCache, etag_matches, make_etag
+from singleflight import PUBLISHED_COALESCE, SingleFlight
+
+published_results = PublishedResultCache()
+published_flights = SingleFlight()
+
 @router.post("/database/{db_id}/publish-api", response_model=dict)
-async def publish_api(db_id: str, api_spec: GeneratedAPIDetails):
-    response = supabase.table("database_connections").select("*").eq("id", db_id).execute()
-    if not response.data:
+async def publish_api(db_id: str, api_spec: GeneratedAPIDetails, confirm: bool = False):
+    db_config = await metadata_store.get_database_connection(db_id)
+    if not db_config:
         raise HTTPException(status_code=404, detail="Database connection not found")
     
-    db_config = response.data[0]
-    
-    update_response = supabase.table("api_specs").update({
-        "spec": {**api_spec.dict(), "isPublished": True, "publishedUrl": f"http://localhost:8000/{db_id}{api_spec.path}"}
-    }).eq("id", api_spec.id).eq("db_id", db_id).execute()
+    published_spec = {**api_spec.dict(), "isPublished": True, "publishedUrl": f"http://localhost:8000/{db_id}{api_spec.path}"}
+    if api_spec.query:
+        analysis = analyze_sql(api_spec.query, sql_dialect(db_config))
+        if SQL_GUARD_MODE != 'off' and needs_row_counts(analysis):
+            guard_statement(analysis, await table_row_counts(db_id, db_config), confirm)
+        # Calls are checked again against the cached schema, so remember the confirmation
+        published_spec["expensiveQueryConfirmed"] = confirm
+    updated_spec = await metadata_store.update_api_spec(api_spec.id, db_id, published_spec)
     
-    if not update_response.data:
+    if not updated_spec:
         raise HTTPException(status_code=404, detail="API specification not found")
     
+    published_routes.register(db_id, api_spec.id, published_spec)
     return {"publishedUrl": f"http://localhost:8000/{db_id}{api_spec.path}"}
 
+from metrics import CONTENT_TYPE, render, set_route
+from sql_analysis import stats as sql_analysis_stats
+
+@router.get("/metrics")
+async def get_metrics():
+    # Prometheus text exposition format
+    return Response(content=render(), media_type=CONTENT_TYPE)
+
+@router.get("/stats/cache", response_model=dict)
+async def get_cache_stats():
+    return {**metadata_store.cache_stats(), "schemas": schema_cache.stats(), "row_counts": row_count_cache.stats(),
+            "ai_queries": ai_query_cache.stats(), "sqlite": sqlite_executor.stats(),
+            "published_results": published_results.stats(), "published_coalescing": published_flights.stats(),
+            "admission": admission.stats(), "queries": query_registry.stats(),
+            "jobs": job_manager.stats(), "health": health_monitor.stats(), "sql_analysis": sql_analysis_stats()}
+
 @router.get("/{db_id}/{endpoint:path}", response_model=dict)
 @router.post("/{db_id}/{endpoint:path}", response_model=dict)
 @router.put("/{db_id}/{endpoint:path}", response_model=dict)
 @router.delete("/{db_id}/{endpoint:path}", response_model=dict)
 @router.patch("/{db_id}/{endpoint:path}", response_model=dict)
 async def handle_published_api(db_id: str, endpoint: str, request: Request):
-    response = supabase.table("api_specs").select("spec").eq("db_id", db_id).eq("spec->>path", f"/{endpoint}").execute()
-    if not response.data:
+    await published_routes.ensure_loaded(db_id)
+    matched = published_routes.match(db_id, request.method, endpoint)
+    if matched is None:
+        allowed = published_routes.allowed_methods(db_id, endpoint)
+        if allowed:
+            raise HTTPException(status_code=405, detail="Method not allowed", headers={"Allow": ", ".join(sorted(allowed))})
         raise HTTPException(status_code=404, detail="API endpoint not found")
     
-    api_spec = response.data[0]["spec"]
+    route, path_params = matched
+    set_route(f"/{{db_id}}/{'/'.join(route.segments)}")
+    api_spec = route.spec
     if not api_spec.get("isPublished"):
         raise HTTPException(status_code=403, detail="API is not published")
     
-    db_response = supabase.table("database_connections").select("*").eq("id", db_id).execute()
-    if not db_response.data:
+    db_config = await metadata_store.get_database_connection(db_id)
+    if not db_config:
         raise HTTPException(status_code=404, detail="Database connection not found")
     
-    db_config = db_response.data[0]
-    db_type = db_config['type']
-    query = api_spec.get("query")
+    statement = route.statement
     
-    if not query:
+    if statement is None:
         raise HTTPException(status_code=500, detail="No query defined for this API")
     
-    query_params = dict(request.query_params)
-    sanitized_query = query
-    for param, value in query_params.items():
-        if any(p['name'] == param for p in api_spec.get("parameters", [])):
-            sanitized_value = value.replace("'", "''")
-            sanitized_query = sanitized_query.replace(f":{param}", sanitized_value)
+    check_rate(db_id, db_config, route.spec_id, request)
+    analysis = analyze_sql(api_spec["query"], sql_dialect(db_config))
+    snapshot = schema_cache.peek(db_id)
+    if snapshot is not None and needs_row_counts(analysis):
+        # Only the cached schema: a published call never waits for introspection
+        guard_statement(analysis, snapshot.row_counts, api_spec.get("expensiveQueryConfirmed", False))
+    media_type = negotiated(request.headers.get("accept"))
     
-    start_time = time.time()
+    query_params = {**dict(request.query_params), **path_params}
     try:
-        if db_type == 'PostgreSQL':
-            conn = await asyncpg.connect(
-                user=db_config['username'],
-                password=db_config['password'],
-                database=db_config['database_name'],
-                host=db_config['host'],
-                port=db_config['port']
-            )
-            rows = await conn.fetch(sanitized_query)
-            columns = list(rows[0].keys()) if rows else []
-            await conn.close()
-            return {
-                "columns": columns,
-                "rows": [dict(row) for row in rows],
-                "rowCount": len(rows),
-                "executionTime": (time.time() - start_time) * 1000
-            }
-        else:  # SQLite
-            conn = sqlite3.connect(db_config['database_name'])
-            cursor = conn.cursor()
-            cursor.execute(sanitized_query)
-            rows = cursor.fetchall()
-            columns = [description[0] for description in cursor.description] if cursor.description else []
-            conn.close()
+        args = bind_values(statement, query_params)
+    except ParameterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    driver = get_driver(db_id, db_config)
+    
+    async def watched(work) -> Any:
+        # Stops the query if the caller goes away; a coalesced execution keeps
+        # running while other callers still wait on it
+        try:
+            return await query_registry.run(db_id, api_spec["query"], work, request, user=client_id(request))
+        except QueryCancelled as e:
+            raise HTTPException(status_code=499, detail=str(e))
+    
+    if request.method != "GET" or not analysis.is_read:
+        try:
+            result = await watched(run_published_statement(driver, statement, args))
+            return Response(content=encode_published_result(result, media_type), media_type=media_type)
+        finally:
+            # Results cached from this database may no longer be current
+            published_results.invalidate_db(db_id)
+    
+    key = published_results.key(db_id, route.spec_id, api_spec["query"], args, media_type)
+    policy = CachePolicy.from_spec(api_spec)
+    coalesce = api_spec.get("coalesce")
+    coalesce = PUBLISHED_COALESCE if coalesce is None else coalesce
+    
+    async def execute() -> bytes:
+        generation = published_results.generation(db_id)
+        body = encode_published_result(await run_published_statement(driver, statement, args), media_type)
+        if policy is not None:
+            published_results.set(key, body, make_etag(body), policy, generation)
+        return body
+    
+    async def load() -> bytes:
+        if not coalesce:
+            return await execute()
+        # The generation keeps requests made after a write from joining a read started before it
+        return await published_flights.do((key, published_results.generation(db_id)), execute,
+                                          label=f"{db_id}:{route.spec_id}")
+    
+    if policy is None:
+        body = await watched(load())
+        return published_response(request, body, make_etag(body), media_type, {"Cache-Control": "no-cache"})
+    
+    cached = published_results.get(key)
+    if cached is not None:
+        if not cached.is_fresh():
+            published_results.revalidate(key, load)
+        body, etag, status = cached.body, cached.etag, "HIT" if cached.is_fresh() else "STALE"
+        max_age = cached.max_age()
+    else:
+        body = await watched(load())
+        etag, status, max_age = make_etag(body), "MISS", int(policy.ttl)
+    cache_control = f"max-age={max_age}"
+    if policy.stale_while_revalidate:
+        cache_control += f", stale-while-revalidate={int(policy.stale_while_revalidate)}"
+    return published_response(request, body, etag, media_type, {"Cache-Control": cache_control, "X-Cache": status})
+
+async def run_published_statement(driver, statement, args: List[Any]) -> Dict[str, Any]:
+    async with admitted(driver.db_id, driver.db_config):
+        start_time = time.perf_counter()
+        try:
+            with span("query"):
+                columns, rows = await driver.run_statement(statement, args, timeout=PUBLISHED_QUERY_TIMEOUT_MS / 1000)
             return {
                 "columns": columns,
-                "rows": [dict(zip(columns, row)) for row in rows],
+                "rows": rows,
                 "rowCount": len(rows),
-                "executionTime": (time.time() - start_time) * 1000
+                "executionTime": (time.perf_counter() - start_time) * 1000
             }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Query execution failed: {str(e)}")
+        except ParameterError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail=f"Query exceeded the {PUBLISHED_QUERY_TIMEOUT_MS} ms timeout")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Query execution failed: {str(e)}")
+
+def encode_published_result(result: Dict[str, Any], media_type: str) -> bytes:
+    meta = {"rowCount": result["rowCount"], "executionTime": result["executionTime"]}
+    # Rows as objects keyed by column name in plain JSON, as published APIs always returned
+    with span("serialize"):
+        return encode_result(media_type, result["columns"], result["rows"], meta, row_objects=True)
+
+def published_response(request: Request, body: bytes, etag: str, media_type: str, headers: Dict[str, str]) -> Response:
+    headers = {**headers, "ETag": etag, "Vary": "Accept"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -0,0 +1,152 @@
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from schema_retriever import SchemaIndex, SCHEMA_CONTEXT_TOKEN_BUDGET, estimate_tokens
+
+# Snapshots younger than the TTL are served as-is. Older ones are revalidated
+# with a cheap version probe and only re-introspected when the probe changed.
+SCHEMA_CACHE_TTL = float(os.getenv("SCHEMA_CACHE_TTL", "60"))
+SCHEMA_CACHE_SIZE = int(os.getenv("SCHEMA_CACHE_SIZE", "256"))
+
+
+def format_schema_prompt(tables: List[Dict[str, Any]]) -> str:
+    return "\n".join([
+        f"Table: {table['name']}\nDescription: {table['description'] or 'None'}\nColumns:\n" +
+        "\n".join([
+            f"  - {col['name']} ({col['type']}, " +
+            f"{'NOT NULL' if not col['nullable'] else 'NULLABLE'}, " +
+            f"{'PRIMARY KEY' if col['isPrimaryKey'] else ''}, " +
+            (f"FOREIGN KEY -> {col['foreignKeyTable']}.{col['foreignKeyColumn']}" if col['isForeignKey'] else '') +
+            f"{', DEFAULT ' + str(col['default']) if col['default'] else ''})"
+            for col in table['columns']
+        ]) for table in tables
+    ])
+
+
+class SchemaSnapshot:
+    def __init__(self, db_id: str, schema_name: str, tables: List[Dict[str, Any]], version: Optional[str]):
+        self.db_id = db_id
+        self.schema_name = schema_name
+        self.tables = tables
+        self.version = version
+        self.loaded_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        self.checked_at = time.monotonic()
+        # Fingerprint of the table/column layout only, so row-count drift does
+        # not change it
+        layout = [
+            [table['name'], table['description'],
+             [[c['name'], c['type'], c['nullable'], c['isPrimaryKey'], c['foreignKeyTable'], c['foreignKeyColumn']]
+              for c in table['columns']]]
+            for table in tables
+        ]
+        self.fingerprint = hashlib.sha256(json.dumps(layout, default=str).encode()).hexdigest()[:16]
+        self._prompt_text: Optional[str] = None
+        self._index: Optional[SchemaIndex] = None
+        self._row_counts: Optional[Dict[str, int]] = None
+
+    @property
+    def prompt_text(self) -> str:
+        if self._prompt_text is None:
+            self._prompt_text = format_schema_prompt(self.tables)
+        return self._prompt_text
+
+    @property
+    def index(self) -> SchemaIndex:
+        if self._index is None:
+            self._index = SchemaIndex(self.tables, lambda table: format_schema_prompt([table]))
+        return self._index
+
+    @property
+    def row_counts(self) -> Dict[str, int]:
+        # (Estimated) rows by table name, for the statement guard in sql_analysis
+        if self._row_counts is None:
+            self._row_counts = {t['name']: t['rowCount'] for t in self.tables if t.get('rowCount') is not None}
+        return self._row_counts
+
+    def prompt_context(self, prompt: str, token_budget: int = SCHEMA_CONTEXT_TOKEN_BUDGET) -> str:
+        # Small schemas go to the model whole; large ones are pruned to the
+        # tables relevant to this prompt
+        if estimate_tokens(self.prompt_text) <= token_budget:
+            return self.prompt_text
+        return self.index.context(prompt, token_budget=token_budget)
+
+    def schema_json(self) -> Dict[str, Any]:
+        # Callers may decorate the tables (e.g. exact row counts), so hand out a copy
+        return {"name": self.schema_name, "tables": copy.deepcopy(self.tables)}
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "fingerprint": self.fingerprint,
+            "tableCount": len(self.tables),
+            "loadedAt": self.loaded_at,
+        }
+
+
+Loader = Callable[[], Awaitable[SchemaSnapshot]]
+Probe = Callable[[], Awaitable[Optional[str]]]
+
+
+class SchemaCache:
+    def __init__(self, ttl: float = SCHEMA_CACHE_TTL, max_size: int = SCHEMA_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._snapshots: Dict[str, SchemaSnapshot] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.loads = 0
+        self.probes = 0
+        self.hits = 0
+
+    async def get(self, db_id: str, load: Loader, probe: Probe, force: bool = False) -> SchemaSnapshot:
+        snapshot = self._snapshots.get(db_id)
+        if not force and snapshot is not None and time.monotonic() - snapshot.checked_at < self.ttl:
+            self.hits += 1
+            return snapshot
+
+        lock = self._locks.setdefault(db_id, asyncio.Lock())
+        async with lock:
+            current = self._snapshots.get(db_id)
+            if current is not None and current is not snapshot:
+                # Another request reloaded it while we waited
+                self.hits += 1
+                return current
+            if current is not None and not force and time.monotonic() - current.checked_at < self.ttl:
+                self.hits += 1
+                return current
+            if current is not None and not force:
+                self.probes += 1
+                version = await probe()
+                if version is not None and version == current.version:
+                    current.checked_at = time.monotonic()
+                    self.hits += 1
+                    return current
+            self.loads += 1
+            snapshot = await load()
+            self._store(db_id, snapshot)
+            return snapshot
+
+    def _store(self, db_id: str, snapshot: SchemaSnapshot):
+        self._snapshots.pop(db_id, None)
+        self._snapshots[db_id] = snapshot
+        while len(self._snapshots) > self.max_size:
+            oldest = next(iter(self._snapshots))
+            del self._snapshots[oldest]
+
+    def peek(self, db_id: str) -> Optional[SchemaSnapshot]:
+        return self._snapshots.get(db_id)
+
+    def invalidate(self, db_id: str):
+        snapshot = self._snapshots.get(db_id)
+        if snapshot is not None:
+            # Keep the snapshot for its version, but force a probe on next use
+            snapshot.checked_at = float('-inf')
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._snapshots), "ttl": self.ttl, "hits": self.hits,
+                "probes": self.probes, "loads": self.loads}
@@ -0,0 +1,142 @@
+import math
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Large schemas are pruned to the tables relevant to the prompt (plus their
+# foreign-key neighbours) before being sent to the model.
+SCHEMA_CONTEXT_TOKEN_BUDGET = int(os.getenv("SCHEMA_CONTEXT_TOKEN_BUDGET", "6000"))
+SCHEMA_CONTEXT_TOP_K = int(os.getenv("SCHEMA_CONTEXT_TOP_K", "8"))
+SCHEMA_CONTEXT_FK_DEPTH = int(os.getenv("SCHEMA_CONTEXT_FK_DEPTH", "2"))
+
+_CAMEL = re.compile(r'([a-z0-9])([A-Z])')
+_WORD = re.compile(r'[A-Za-z0-9]+')
+
+# Words that show up in nearly every question and carry no table signal
+_STOPWORDS = {
+    'a', 'an', 'the', 'of', 'for', 'to', 'in', 'on', 'by', 'with', 'and', 'or', 'all', 'me', 'show', 'get',
+    'list', 'find', 'give', 'return', 'what', 'which', 'who', 'how', 'many', 'much', 'is', 'are', 'was',
+    'were', 'that', 'this', 'from', 'each', 'per', 'their', 'there', 'have', 'has', 'do', 'does', 'i', 'we',
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def estimate_tokens(text: str) -> int:
+    # Rough heuristic that holds well enough for English and SQL identifiers
+    return len(text) // 4 + 1
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('es') and word[-3] in 'sxz':
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+@lru_cache(maxsize=65536)
+def _tokenize(text: str) -> Tuple[str, ...]:
+    text = _CAMEL.sub(r'\1 \2', text)
+    return tuple(_stem(w) for w in (m.group(0).lower() for m in _WORD.finditer(text)) if w not in _STOPWORDS)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    # Column names repeat across tables, so tokenised identifiers are memoised
+    return list(_tokenize(text)) if text else []
+
+
+class SchemaIndex:
+    def __init__(self, tables: List[Dict[str, Any]], format_table):
+        self.tables = tables
+        self._format_table = format_table
+        self._by_name = {table['name']: i for i, table in enumerate(tables)}
+        self._neighbours: List[Set[int]] = [set() for _ in tables]
+        self._postings: Dict[str, List[tuple]] = {}
+        self._lengths: List[int] = []
+        self._texts: List[Optional[str]] = [None] * len(tables)
+
+        for i, table in enumerate(tables):
+            # Table names count three times so a direct mention outranks a
+            # column that merely shares a word
+            terms = tokenize(table['name']) * 3
+            terms += tokenize(table.get('description'))
+            for col in table['columns']:
+                terms += tokenize(col['name'])
+                if col.get('foreignKeyTable'):
+                    terms += tokenize(col['foreignKeyTable'])
+                    j = self._by_name.get(col['foreignKeyTable'])
+                    if j is not None and j != i:
+                        self._neighbours[i].add(j)
+                        self._neighbours[j].add(i)
+            counts = Counter(terms)
+            self._lengths.append(len(terms))
+            for term, tf in counts.items():
+                self._postings.setdefault(term, []).append((i, tf))
+
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        n = len(tables)
+        self._idf = {
+            term: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+    def table_text(self, i: int) -> str:
+        if self._texts[i] is None:
+            self._texts[i] = self._format_table(self.tables[i])
+        return self._texts[i]
+
+    def score(self, prompt: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(prompt)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf[term]
+            for i, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[i] / (self._avg_length or 1))
+                scores[i] = scores.get(i, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def select(self, prompt: str, top_k: int = SCHEMA_CONTEXT_TOP_K,
+               token_budget: int = SCHEMA_CONTEXT_TOKEN_BUDGET, fk_depth: int = SCHEMA_CONTEXT_FK_DEPTH) -> List[int]:
+        scores = self.score(prompt)
+        ranked = sorted(scores, key=lambda i: (-scores[i], i))[:top_k]
+        if not ranked:
+            ranked = list(range(min(top_k, len(self.tables))))
+
+        # Tables reachable over foreign keys are needed to write the joins, so
+        # they are added breadth-first after the hits
+        candidates: List[int] = list(ranked)
+        seen: Set[int] = set(ranked)
+        frontier = ranked
+        for _ in range(fk_depth):
+            next_frontier = []
+            for i in frontier:
+                for j in sorted(self._neighbours[i], key=lambda j: (-scores.get(j, 0.0), j)):
+                    if j not in seen:
+                        seen.add(j)
+                        candidates.append(j)
+                        next_frontier.append(j)
+            frontier = next_frontier
+
+        selected: List[int] = []
+        used = 0
+        for i in candidates:
+            if used >= token_budget:
+                break
+            cost = estimate_tokens(self.table_text(i)) + 1
+            if used + cost > token_budget and selected:
+                continue
+            selected.append(i)
+            used += cost
+        return selected
+
+    def context(self, prompt: str, top_k: int = SCHEMA_CONTEXT_TOP_K,
+                token_budget: int = SCHEMA_CONTEXT_TOKEN_BUDGET) -> str:
+        return "\n".join(self.table_text(i) for i in self.select(prompt, top_k, token_budget))
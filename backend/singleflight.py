@@ -0,0 +1,63 @@
+import asyncio
+import os
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+# Default for published endpoints whose spec does not set `coalesce`
+PUBLISHED_COALESCE = os.getenv("PUBLISHED_COALESCE", "true").lower() in ("1", "true", "yes")
+
+
+class _Call:
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Shares one in-flight execution between concurrent callers of the same key.
+
+    The work runs as its own task, so a caller that disconnects does not take
+    the result away from the others; it is only cancelled once every caller
+    waiting on it has gone.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.coalesced_by_endpoint: Counter = Counter()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], label: str = '') -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            self.executions += 1
+            call = _Call(asyncio.create_task(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._calls.pop(key, None) if self._calls.get(key) is call else None)
+        else:
+            self.coalesced += 1
+            if label:
+                self.coalesced_by_endpoint[label] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": self.in_flight(),
+            "coalesced_by_endpoint": dict(self.coalesced_by_endpoint.most_common(20)),
+        }
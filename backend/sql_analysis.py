@@ -0,0 +1,386 @@
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# Reads without a LIMIT get this one, and larger explicit limits are clamped
+# to SQL_MAX_LIMIT (0 turns either off). Streams and jobs are not limited.
+SQL_AUTO_LIMIT = int(os.getenv("SQL_AUTO_LIMIT", "1000"))
+SQL_MAX_LIMIT = int(os.getenv("SQL_MAX_LIMIT", "10000"))
+# Tables with at least this many (estimated) rows count as large
+SQL_LARGE_TABLE_ROWS = int(os.getenv("SQL_LARGE_TABLE_ROWS", "100000"))
+# What happens to expensive statements: confirm (run once resent with
+# confirm: true), reject, or off
+SQL_GUARD_MODE = os.getenv("SQL_GUARD_MODE", "confirm").lower()
+SQL_ANALYSIS_CACHE_SIZE = int(os.getenv("SQL_ANALYSIS_CACHE_SIZE", "4096"))
+
+READ_KEYWORDS = {'SELECT', 'SHOW', 'EXPLAIN', 'DESCRIBE', 'DESC', 'VALUES', 'TABLE'}
+WRITE_KEYWORDS = {'INSERT', 'UPDATE', 'DELETE', 'MERGE', 'REPLACE', 'UPSERT', 'COPY', 'CALL'}
+DDL_KEYWORDS = {'CREATE', 'ALTER', 'DROP', 'TRUNCATE', 'RENAME', 'COMMENT', 'GRANT', 'REVOKE'}
+_AGGREGATES = {'COUNT', 'SUM', 'AVG', 'MIN', 'MAX', 'GROUP_CONCAT', 'STRING_AGG', 'ARRAY_AGG', 'JSON_AGG'}
+# Keywords that end a FROM list
+_FROM_END = {
+    'WHERE', 'GROUP', 'ORDER', 'HAVING', 'LIMIT', 'OFFSET', 'FETCH', 'UNION', 'EXCEPT', 'INTERSECT',
+    'WINDOW', 'FOR', 'RETURNING', 'SET', 'LOCK', 'QUALIFY',
+}
+_JOIN_WORDS = {'JOIN', 'INNER', 'LEFT', 'RIGHT', 'FULL', 'OUTER', 'CROSS', 'NATURAL', 'STRAIGHT_JOIN', 'LATERAL'}
+
+
+class Token(NamedTuple):
+    kind: str  # word, ident, string, number, param, punct
+    text: str
+    start: int
+    end: int
+    depth: int
+
+    @property
+    def upper(self) -> str:
+        return self.text.upper() if self.kind == 'word' else ''
+
+
+def tokenize(sql: str, dialect: str = '') -> List[Token]:
+    """Splits sql into tokens, skipping whitespace and comments.
+
+    depth is the parenthesis nesting level, so clause keywords of the
+    outermost statement are the depth-0 words. '#' starts a comment only in
+    MySQL; in Postgres #, #> and #>> are operators.
+    """
+    tokens: List[Token] = []
+    depth = 0
+    i, n = 0, len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch.isspace():
+            i += 1
+            continue
+        start = i
+        if sql.startswith('--', i) or (ch == '#' and dialect == 'mysql'):
+            end = sql.find('\n', i)
+            i = n if end == -1 else end
+            continue
+        if sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            continue
+        if ch == "'":
+            i += 1
+            while i < n:
+                if sql[i] == "'" and sql.startswith("''", i):
+                    i += 2
+                elif sql[i] == "'":
+                    i += 1
+                    break
+                else:
+                    i += 1
+            tokens.append(Token('string', sql[start:i], start, i, depth))
+        elif ch in '"`':
+            end = sql.find(ch, i + 1)
+            i = n if end == -1 else end + 1
+            tokens.append(Token('ident', sql[start:i], start, i, depth))
+        elif ch == '$':
+            j = i + 1
+            while j < n and (sql[j].isalnum() or sql[j] == '_'):
+                j += 1
+            if j < n and sql[j] == '$' and not sql[i + 1:j].isdigit():
+                # Postgres dollar quoting: $$...$$ or $tag$...$tag$
+                tag = sql[i:j + 1]
+                end = sql.find(tag, j + 1)
+                i = n if end == -1 else end + len(tag)
+                tokens.append(Token('string', sql[start:i], start, i, depth))
+            else:
+                i = j
+                tokens.append(Token('param', sql[start:i], start, i, depth))
+        elif ch == '?' or (ch == '%' and i + 1 < n and sql[i + 1] in 's('):
+            if ch == '%' and sql[i + 1] == '(':
+                end = sql.find(')s', i)
+                i = n if end == -1 else end + 2
+            else:
+                i += 2 if ch == '%' else 1
+            tokens.append(Token('param', sql[start:i], start, i, depth))
+        elif ch == ':' and i + 1 < n and (sql[i + 1].isalpha() or sql[i + 1] == '_') and not sql.startswith('::', i - 1):
+            i += 1
+            while i < n and (sql[i].isalnum() or sql[i] == '_'):
+                i += 1
+            tokens.append(Token('param', sql[start:i], start, i, depth))
+        elif ch.isdigit() or (ch == '.' and i + 1 < n and sql[i + 1].isdigit()):
+            while i < n and (sql[i].isalnum() or sql[i] == '.'):
+                i += 1
+            tokens.append(Token('number', sql[start:i], start, i, depth))
+        elif ch.isalpha() or ch == '_':
+            while i < n and (sql[i].isalnum() or sql[i] in '_$'):
+                i += 1
+            tokens.append(Token('word', sql[start:i], start, i, depth))
+        else:
+            if ch == ')':
+                depth = max(depth - 1, 0)
+            i += 2 if sql.startswith('::', i) else 1
+            tokens.append(Token('punct', sql[start:i], start, i, depth))
+            if ch == '(':
+                depth += 1
+    return tokens
+
+
+def _split_statements(tokens: List[Token]) -> List[List[Token]]:
+    statements, current = [], []
+    for token in tokens:
+        if token.kind == 'punct' and token.text == ';' and token.depth == 0:
+            if current:
+                statements.append(current)
+            current = []
+        else:
+            current.append(token)
+    if current:
+        statements.append(current)
+    return statements
+
+
+def _name(token: Token) -> str:
+    return token.text[1:-1] if token.kind == 'ident' else token.text
+
+
+class TableRef(NamedTuple):
+    name: str
+    joined_without_condition: bool
+
+
+class StatementAnalysis:
+    """What the guard needs to know about one SQL text; shared via the cache, never mutated."""
+
+    def __init__(self, sql: str, dialect: str = ''):
+        tokens = tokenize(sql, dialect)
+        statements = _split_statements(tokens)
+        self.statement_count = len(statements)
+        kinds = [_kind(statement) for statement in statements]
+        self.keyword = _main_keyword(statements[0]).upper if statements else ''
+        if not kinds:
+            self.kind = 'other'
+        elif all(kind == 'read' for kind in kinds):
+            self.kind = 'read'
+        elif 'ddl' in kinds:
+            # Any DDL in the batch, so callers know cached schemas are stale
+            self.kind = 'ddl'
+        else:
+            self.kind = 'write' if 'write' in kinds else 'other'
+
+        main = statements[0] if len(statements) == 1 else []
+        top = [t for t in main if t.depth == 0]
+        words = [t.upper for t in top]
+        self.has_where = 'WHERE' in words
+        self.tables: List[TableRef] = _tables(main) if main else []
+        # Grouping and aggregates read every row whatever the LIMIT
+        self.full_read = any(w in ('GROUP', 'DISTINCT') for w in words) or any(
+            t.upper in _AGGREGATES and j + 1 < len(top) and top[j + 1].text == '(' for j, t in enumerate(top))
+
+        # LIMIT handling applies to one plain SELECT (WITH ... SELECT included)
+        self.limit: Optional[int] = None
+        # Where the limit's value is: a number, or the ALL of LIMIT ALL
+        self.limit_span: Optional[Tuple[int, int]] = None
+        self.has_limit = False
+        self.limit_all = False
+        self.insert_at: Optional[int] = None
+        if self.kind == 'read' and self.keyword == 'SELECT' and main and 'INTO' not in words:
+            self._find_limit(top)
+            if not self.has_limit and self.tables:
+                stop = next((t.start for t in top if t.upper in ('OFFSET', 'FOR', 'LOCK')), None)
+                self.insert_at = stop if stop is not None else main[-1].end
+
+    def _find_limit(self, top: List[Token]):
+        for j, token in enumerate(top):
+            if token.upper == 'LIMIT':
+                self.has_limit = True
+                value = top[j + 1] if j + 1 < len(top) else None
+                # MySQL's LIMIT offset, count
+                if value is not None and j + 3 < len(top) and top[j + 2].text == ',':
+                    value = top[j + 3]
+                if value is not None and value.kind == 'number' and value.text.isdigit():
+                    self.limit, self.limit_span = int(value.text), (value.start, value.end)
+                elif value is not None and value.upper == 'ALL':
+                    self.limit_all, self.limit_span = True, (value.start, value.end)
+                return
+            if token.upper == 'FETCH':
+                self.has_limit = True
+                value = top[j + 2] if j + 2 < len(top) else None
+                if value is not None and value.kind == 'number' and value.text.isdigit():
+                    self.limit, self.limit_span = int(value.text), (value.start, value.end)
+                return
+
+    @property
+    def is_read(self) -> bool:
+        return self.kind == 'read'
+
+
+def _main_keyword(statement: List[Token]) -> Token:
+    # The statement a WITH clause leads into is the first keyword back at depth 0
+    first = statement[0]
+    if first.upper != 'WITH':
+        return first
+    for token in statement[1:]:
+        if token.depth == 0 and token.upper in READ_KEYWORDS | WRITE_KEYWORDS:
+            return token
+    return first
+
+
+def _explained(statement: List[Token]) -> Optional[List[Token]]:
+    """The statement EXPLAIN ANALYZE runs, or None when EXPLAIN only plans it."""
+    analyze = False
+    for j, token in enumerate(statement[1:], 1):
+        if token.upper in ('ANALYZE', 'ANALYSE'):
+            # EXPLAIN ANALYZE ... and EXPLAIN (ANALYZE, ...) ... alike
+            analyze = True
+        elif token.depth == 0 and token.upper in READ_KEYWORDS | WRITE_KEYWORDS | DDL_KEYWORDS | {'WITH'}:
+            return statement[j:] if analyze else None
+    return None
+
+
+def _kind(statement: List[Token]) -> str:
+    keyword = _main_keyword(statement).upper.lstrip('(')
+    if keyword == 'EXPLAIN':
+        # EXPLAIN ANALYZE executes the statement, so a wrapped write really writes
+        explained = _explained(statement)
+        if explained is not None and _kind(explained) in ('write', 'ddl'):
+            return 'write'
+        return 'read'
+    if keyword == '' and statement[0].text == '(':
+        keyword = next((t.upper for t in statement if t.kind == 'word'), '')
+    if keyword in READ_KEYWORDS:
+        # Data-modifying CTEs (WITH d AS (DELETE ... RETURNING *) SELECT ...) and SELECT INTO write
+        if statement[0].upper == 'WITH' and any(t.upper in WRITE_KEYWORDS for t in statement):
+            return 'write'
+        if keyword == 'SELECT' and any(t.depth == 0 and t.upper == 'INTO' for t in statement):
+            return 'write'
+        return 'read'
+    if keyword in WRITE_KEYWORDS:
+        return 'write'
+    if keyword in DDL_KEYWORDS:
+        return 'ddl'
+    return 'other'
+
+
+def _tables(statement: List[Token]) -> List[TableRef]:
+    """Depth-0 table references of FROM/JOIN lists (and UPDATE/DELETE targets)."""
+    top = [t for t in statement if t.depth == 0 or (t.depth == 1 and t.text in '()')]
+    # Comma joins are usually joined in the WHERE clause
+    comma_is_cartesian = not any(t.upper == 'WHERE' for t in top)
+    refs: List[TableRef] = []
+    i = 0
+    keyword = _main_keyword(statement).upper
+    if keyword == 'UPDATE' and len(top) > 1:
+        i = top.index(_main_keyword(statement)) + 1
+        refs.append(TableRef(_qualified(top, i)[0], False))
+    while i < len(top):
+        if top[i].upper != 'FROM':
+            i += 1
+            continue
+        i += 1
+        pending_join = False
+        while i < len(top) and top[i].upper not in _FROM_END:
+            token = top[i]
+            if token.text == ',':
+                pending_join = True
+                i += 1
+                continue
+            if token.upper in _JOIN_WORDS:
+                natural = False
+                while i < len(top) and top[i].upper in _JOIN_WORDS:
+                    natural = natural or top[i].upper == 'NATURAL'
+                    i += 1
+                name, i = _qualified(top, i)
+                rest = _until_next_item(top, i)
+                conditioned = natural or any(t.upper in ('ON', 'USING') for t in rest)
+                refs.append(TableRef(name, not conditioned))
+                i += len(rest)
+                continue
+            if token.kind in ('word', 'ident') or token.text == '(':
+                name, i = _qualified(top, i)
+                refs.append(TableRef(name, pending_join and comma_is_cartesian))
+                pending_join = False
+                i += len(_until_next_item(top, i))
+                continue
+            i += 1
+    return refs
+
+
+def _qualified(top: List[Token], i: int) -> Tuple[str, int]:
+    if i < len(top) and top[i].text == '(':
+        # Derived table; skip to the closing parenthesis
+        while i < len(top) and top[i].text != ')':
+            i += 1
+        return '', i + 1
+    name = ''
+    while i < len(top) and top[i].kind in ('word', 'ident'):
+        name = _name(top[i])
+        if i + 1 < len(top) and top[i + 1].text == '.':
+            i += 2
+            continue
+        i += 1
+        break
+    return name, i
+
+
+def _until_next_item(top: List[Token], i: int) -> List[Token]:
+    out = []
+    while i < len(top) and top[i].text != ',' and top[i].upper not in _FROM_END and top[i].upper not in _JOIN_WORDS:
+        out.append(top[i])
+        i += 1
+    return out
+
+
+@lru_cache(maxsize=SQL_ANALYSIS_CACHE_SIZE)
+def analyze_sql(sql: str, dialect: str = '') -> StatementAnalysis:
+    """dialect is a Driver.dialect ('postgres', 'mysql', 'sqlite'), or '' when unknown."""
+    return StatementAnalysis(sql, dialect)
+
+
+def limit_sql(sql: str, analysis: Optional[StatementAnalysis] = None,
+              auto_limit: int = SQL_AUTO_LIMIT, max_limit: int = SQL_MAX_LIMIT) -> Tuple[str, Optional[int]]:
+    """sql with a LIMIT added or clamped, and the limit that was applied (None if unchanged)."""
+    analysis = analysis or analyze_sql(sql)
+    if analysis.insert_at is not None and auto_limit:
+        at = analysis.insert_at
+        rest = sql[at:].lstrip()
+        separator = ' ' if rest and not rest.startswith(';') else ''
+        return f"{sql[:at].rstrip()} LIMIT {auto_limit}{separator}{rest}", auto_limit
+    if analysis.limit_span is not None and max_limit and (analysis.limit_all or analysis.limit > max_limit):
+        start, end = analysis.limit_span
+        return f"{sql[:start]}{max_limit}{sql[end:]}", max_limit
+    return sql, None
+
+
+def find_issues(analysis: StatementAnalysis, row_counts: Dict[str, int],
+                large_rows: int = SQL_LARGE_TABLE_ROWS) -> List[Dict[str, Any]]:
+    """Expensive patterns, judged with the schema's (estimated) row counts by table name."""
+    counts = {name.lower(): rows for name, rows in row_counts.items()}
+    issues = []
+    known = [(ref, counts.get(ref.name.lower())) for ref in analysis.tables if ref.name]
+
+    product = 1
+    for ref, rows in known:
+        product *= max(rows or 1, 1)
+    for ref, rows in known:
+        if ref.joined_without_condition and product >= large_rows:
+            issues.append({
+                "kind": "cartesian_join", "table": ref.name,
+                "message": f"{ref.name} is joined without a join condition (~{product} row combinations)",
+            })
+
+    if not analysis.has_where:
+        limited = (analysis.has_limit and not (analysis.limit_all and not SQL_MAX_LIMIT)) or \
+            (analysis.insert_at is not None and SQL_AUTO_LIMIT > 0)
+        for ref, rows in known:
+            if rows is None or rows < large_rows:
+                continue
+            if analysis.kind == 'write':
+                reason = f"would change every row of {ref.name} (~{rows} rows)"
+            elif analysis.full_read or not limited:
+                reason = f"reads all of {ref.name} (~{rows} rows) with no WHERE clause"
+            else:
+                continue
+            issues.append({"kind": "unfiltered_large_table", "table": ref.name, "message": f"The statement {reason}"})
+    return issues
+
+
+def stats() -> Dict[str, Any]:
+    info = analyze_sql.cache_info()
+    lookups = info.hits + info.misses
+    return {"size": info.currsize, "max_size": info.maxsize, "hits": info.hits, "misses": info.misses,
+            "hit_ratio": round(info.hits / lookups, 4) if lookups else 0.0, "guard_mode": SQL_GUARD_MODE,
+            "auto_limit": SQL_AUTO_LIMIT, "max_limit": SQL_MAX_LIMIT}
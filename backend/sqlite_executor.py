@@ -0,0 +1,188 @@
+import asyncio
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from urllib.request import pathname2url
+
+SQLITE_WORKERS = int(os.getenv("SQLITE_WORKERS", "8"))
+# Open connections kept per worker thread, least recently used closed first
+SQLITE_CONNECTIONS_PER_THREAD = int(os.getenv("SQLITE_CONNECTIONS_PER_THREAD", "32"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Negative values are KiB, positive values are pages (SQLite's convention)
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# e.g. WAL; empty leaves the journal mode of user databases untouched
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "")
+
+Rows = Tuple[List[str], List[Tuple[Any, ...]]]
+
+
+def open_connection(path: str, readonly: bool = False) -> sqlite3.Connection:
+    if readonly:
+        # mode=ro also stops a typo'd path from silently creating an empty file
+        uri = f"file:{pathname2url(os.path.abspath(path))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = {SQLITE_CACHE_SIZE}")
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    if SQLITE_JOURNAL_MODE and not readonly:
+        conn.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+    return conn
+
+
+def _fetch(conn: sqlite3.Connection, sql: str, args: Sequence[Any]) -> Rows:
+    cursor = conn.execute(sql, args)
+    rows = cursor.fetchall()
+    columns = [d[0] for d in cursor.description] if cursor.description else []
+    return columns, rows
+
+
+def _execute(conn: sqlite3.Connection, sql: str, args: Sequence[Any]) -> Rows:
+    try:
+        result = _fetch(conn, sql, args)
+        conn.commit()
+        return result
+    except BaseException:
+        # Never hand a half-finished transaction to the next request
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+
+
+class _Interrupt:
+    """Lets the event loop interrupt the statement a worker thread is running."""
+
+    def __init__(self):
+        self.requested = False
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def attach(self, conn: sqlite3.Connection):
+        with self._lock:
+            if self.requested:
+                # sqlite3_interrupt is a no-op when nothing is running yet
+                raise sqlite3.OperationalError("interrupted")
+            self._conn = conn
+
+    def detach(self):
+        with self._lock:
+            self._conn = None
+
+    def __call__(self):
+        with self._lock:
+            self.requested = True
+            if self._conn is not None:
+                self._conn.interrupt()
+
+
+class SQLiteExecutor:
+    """Runs blocking sqlite3 work on a dedicated thread pool.
+
+    Each worker thread keeps its own connection per (file, mode), so a file
+    is opened once per thread rather than once per request, and the event
+    loop never waits on SQLite.
+    """
+
+    def __init__(self, max_workers: int = SQLITE_WORKERS,
+                 connections_per_thread: int = SQLITE_CONNECTIONS_PER_THREAD):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sqlite")
+        self._local = threading.local()
+        self._connections_per_thread = connections_per_thread
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    def _connection(self, path: str, readonly: bool) -> sqlite3.Connection:
+        conns = getattr(self._local, 'conns', None)
+        if conns is None:
+            conns = self._local.conns = OrderedDict()
+        key = (path, readonly)
+        conn = conns.get(key)
+        if conn is not None:
+            conns.move_to_end(key)
+            self.reused += 1
+            return conn
+        conn = open_connection(path, readonly)
+        conns[key] = conn
+        with self._lock:
+            self._all.append(conn)
+            self.opened += 1
+        while len(conns) > self._connections_per_thread:
+            _, oldest = conns.popitem(last=False)
+            self._discard(oldest)
+        return conn
+
+    def _discard(self, conn: sqlite3.Connection):
+        with self._lock:
+            if conn in self._all:
+                self._all.remove(conn)
+        conn.close()
+
+    def _call(self, path: str, readonly: bool, fn: Callable[..., Any], args, kwargs, interrupt: _Interrupt):
+        conn = self._connection(path, readonly)
+        try:
+            interrupt.attach(conn)
+            try:
+                return fn(conn, *args, **kwargs)
+            finally:
+                interrupt.detach()
+        except sqlite3.DatabaseError as e:
+            # A replaced or corrupted file can leave the cached handle unusable;
+            # ordinary query errors are OperationalError and keep it
+            if not isinstance(e, sqlite3.OperationalError):
+                self._local.conns.pop((path, readonly), None)
+                self._discard(conn)
+            raise
+
+    async def call(self, fn: Callable[..., Any], *args) -> Any:
+        """Runs fn(*args) on the SQLite pool without a managed connection."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(fn, *args))
+
+    async def run(self, path: str, fn: Callable[..., Any], *args, readonly: bool = False,
+                  timeout: Optional[float] = None, **kwargs) -> Any:
+        """Runs fn(conn, *args, **kwargs) with this thread's connection to path.
+
+        The statement is interrupted when timeout expires (raising
+        asyncio.TimeoutError) or when the awaiting task is cancelled.
+        """
+        interrupt = _Interrupt()
+        timer = asyncio.get_running_loop().call_later(timeout, interrupt) if timeout is not None else None
+        try:
+            return await self.call(self._call, path, readonly, fn, args, kwargs, interrupt)
+        except sqlite3.OperationalError as e:
+            if timer is not None and interrupt.requested and 'interrupted' in str(e):
+                raise asyncio.TimeoutError() from e
+            raise
+        except asyncio.CancelledError:
+            interrupt()
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+    async def fetch(self, path: str, sql: str, args: Sequence[Any] = (), readonly: bool = True,
+                    timeout: Optional[float] = None) -> Rows:
+        return await self.run(path, _fetch, sql, args, readonly=readonly, timeout=timeout)
+
+    async def execute(self, path: str, sql: str, args: Sequence[Any] = (), timeout: Optional[float] = None) -> Rows:
+        return await self.run(path, _execute, sql, args, timeout=timeout)
+
+    def stats(self):
+        return {"open_connections": len(self._all), "opened": self.opened, "reused": self.reused}
+
+    def close(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+        with self._lock:
+            conns, self._all = self._all, []
+        for conn in conns:
+            conn.close()
+
+
+sqlite_executor = SQLiteExecutor()
@@ -0,0 +1,201 @@
+import datetime
+import decimal
+import json
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class ParameterError(ValueError):
+    pass
+
+
+class CompiledStatement:
+    def __init__(self, postgres_sql: str, sqlite_sql: str, param_names: List[str],
+                 param_types: Dict[str, str], required: List[str], mysql_sql: Optional[str] = None):
+        self.postgres_sql = postgres_sql
+        self.sqlite_sql = sqlite_sql
+        self.mysql_sql = mysql_sql
+        self.param_names = param_names
+        self.param_types = param_types
+        self.required = required
+
+
+def _is_name_char(ch: str) -> bool:
+    return ch.isalnum() or ch == '_'
+
+
+def _read_placeholder(query: str, i: int, names) -> Optional[str]:
+    # ":name" where name is a declared parameter; "::type" casts never match
+    if query[i] != ':' or (i > 0 and query[i - 1] == ':'):
+        return None
+    j = i + 1
+    while j < len(query) and _is_name_char(query[j]):
+        j += 1
+    name = query[i + 1:j]
+    return name if name in names else None
+
+
+def _concat(parts: List[str]) -> str:
+    return "(" + " || ".join(parts) + ")"
+
+
+def _mysql_concat(parts: List[str]) -> str:
+    # || is logical OR in MySQL unless PIPES_AS_CONCAT is set
+    return "CONCAT(" + ", ".join(parts) + ")"
+
+
+def _compile(query: str, names, placeholder, concat=_concat) -> Tuple[str, List[str]]:
+    order: List[str] = []
+
+    def slot(name: str) -> str:
+        if name not in order:
+            order.append(name)
+        return placeholder(order.index(name) + 1)
+
+    out = []
+    i = 0
+    n = len(query)
+    while i < n:
+        ch = query[i]
+        if ch == '-' and query.startswith('--', i):
+            end = query.find('\n', i)
+            end = n if end == -1 else end
+            out.append(query[i:end])
+            i = end
+        elif ch == '/' and query.startswith('/*', i):
+            end = query.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            out.append(query[i:end])
+            i = end
+        elif ch == '"':
+            end = query.find('"', i + 1)
+            end = n if end == -1 else end + 1
+            out.append(query[i:end])
+            i = end
+        elif ch == "'":
+            # Placeholders inside a string literal ('%:name%') become a
+            # concatenation of the literal pieces and the bound parameter.
+            j = i + 1
+            pieces: List[Tuple[bool, str]] = []
+            text = []
+            while j < n:
+                if query[j] == "'" and query.startswith("''", j):
+                    text.append("''")
+                    j += 2
+                elif query[j] == "'":
+                    break
+                else:
+                    name = _read_placeholder(query, j, names)
+                    if name is not None:
+                        pieces.append((False, ''.join(text)))
+                        pieces.append((True, name))
+                        text = []
+                        j += len(name) + 1
+                    else:
+                        text.append(query[j])
+                        j += 1
+            pieces.append((False, ''.join(text)))
+            if not any(is_param for is_param, _ in pieces):
+                out.append(query[i:j + 1])
+            else:
+                parts = [slot(value) if is_param else f"'{value}'" for is_param, value in pieces if is_param or value]
+                out.append(parts[0] if len(parts) == 1 else concat(parts))
+            i = j + 1
+        elif ch == ':':
+            name = _read_placeholder(query, i, names)
+            if name is not None:
+                out.append(slot(name))
+                i += len(name) + 1
+            else:
+                out.append(ch)
+                i += 1
+        else:
+            out.append(ch)
+            i += 1
+    return ''.join(out), order
+
+
+def compile_query(query: str, parameters: List[Dict[str, Any]]) -> CompiledStatement:
+    names = {p['name'] for p in parameters}
+    postgres_sql, order = _compile(query, names, lambda idx: f"${idx}")
+    sqlite_sql, _ = _compile(query, names, lambda idx: f"?{idx}")
+    # aiomysql formats with %: literal percent signs are doubled and values
+    # are bound by name (see mysql_args), so a parameter can be reused
+    mysql_sql, _ = _compile(query.replace('%', '%%'), names, lambda idx: f"%(p{idx})s", _mysql_concat)
+    param_types = {p['name']: (p.get('type') or 'string').lower() for p in parameters}
+    required = [p['name'] for p in parameters if p.get('required') and p['name'] in order]
+    return CompiledStatement(postgres_sql, sqlite_sql, order, param_types, required, mysql_sql)
+
+
+def mysql_args(args: List[Any]) -> Dict[str, Any]:
+    return {f"p{i}": value for i, value in enumerate(args, 1)}
+
+
+_TRUE = {'true', '1', 'yes', 'y', 't', 'on'}
+_FALSE = {'false', '0', 'no', 'n', 'f', 'off'}
+
+
+def _to_bool(value: str) -> bool:
+    lowered = value.strip().lower()
+    if lowered in _TRUE:
+        return True
+    if lowered in _FALSE:
+        return False
+    raise ValueError(f"invalid boolean {value!r}")
+
+
+def coerce_value(value: Optional[str], param_type: str) -> Any:
+    if value is None:
+        return None
+    if param_type in ('integer', 'int', 'bigint', 'smallint'):
+        return int(value)
+    if param_type in ('number', 'float', 'double', 'decimal', 'numeric', 'real'):
+        return float(value)
+    if param_type in ('boolean', 'bool'):
+        return _to_bool(value)
+    return value
+
+
+def bind_values(statement: CompiledStatement, values: Dict[str, str]) -> List[Any]:
+    missing = [name for name in statement.required if values.get(name) is None]
+    if missing:
+        raise ParameterError(f"Missing required parameter(s): {', '.join(missing)}")
+    args = []
+    for name in statement.param_names:
+        param_type = statement.param_types.get(name, 'string')
+        try:
+            args.append(coerce_value(values.get(name), param_type))
+        except ValueError:
+            raise ParameterError(f"Parameter '{name}' must be of type {param_type}")
+    return args
+
+
+# Postgres infers a type for every $n; asyncpg needs matching Python values
+_PG_ADAPTERS = {
+    'int2': int, 'int4': int, 'int8': int, 'oid': int,
+    'float4': float, 'float8': float,
+    'numeric': lambda v: decimal.Decimal(str(v)),
+    'bool': lambda v: v if isinstance(v, bool) else _to_bool(str(v)),
+    'date': lambda v: datetime.date.fromisoformat(str(v)),
+    'timestamp': lambda v: datetime.datetime.fromisoformat(str(v)),
+    'timestamptz': lambda v: datetime.datetime.fromisoformat(str(v)),
+    'time': lambda v: datetime.time.fromisoformat(str(v)),
+    'uuid': lambda v: uuid.UUID(str(v)),
+    'json': lambda v: v if isinstance(v, str) else json.dumps(v),
+    'jsonb': lambda v: v if isinstance(v, str) else json.dumps(v),
+    'text': str, 'varchar': str, 'bpchar': str, 'name': str,
+}
+
+
+def adapt_postgres_args(statement: CompiledStatement, args: List[Any], pg_types: List[str]) -> List[Any]:
+    adapted = []
+    for name, value, pg_type in zip(statement.param_names, args, pg_types):
+        adapter = _PG_ADAPTERS.get(pg_type)
+        if value is None or adapter is None:
+            adapted.append(value)
+            continue
+        try:
+            adapted.append(adapter(value))
+        except (ValueError, TypeError, decimal.InvalidOperation):
+            raise ParameterError(f"Parameter '{name}' is not a valid {pg_type}")
+    return adapted
@@ -0,0 +1,129 @@
+import os
+import time
+from typing import Any, AsyncIterator, Dict
+
+from result_encoding import dumps
+from sql_analysis import analyze_sql
+from sqlite_executor import open_connection, sqlite_executor
+
+# Rows fetched from the database per round trip while streaming
+STREAM_FETCH_SIZE = int(os.getenv("STREAM_FETCH_SIZE", "1000"))
+
+# Only reads led by these can back a server-side cursor; anything else is
+# executed normally and its (small) result streamed from memory
+_CURSOR_KEYWORDS = {'SELECT', 'VALUES', 'TABLE'}
+
+
+async def postgres_events(conn, query: str, fetch_size: int = STREAM_FETCH_SIZE) -> AsyncIterator[Any]:
+    """Yields the column list, then row batches, from a server-side cursor."""
+    stmt = await conn.prepare(query)
+    yield [attr.name for attr in stmt.get_attributes()]
+    analysis = analyze_sql(query, 'postgres')
+    if not analysis.is_read or analysis.keyword not in _CURSOR_KEYWORDS:
+        rows = await stmt.fetch()
+        if rows:
+            yield [list(row) for row in rows]
+        return
+    async with conn.transaction():
+        cursor = await stmt.cursor()
+        while True:
+            rows = await cursor.fetch(fetch_size)
+            if not rows:
+                break
+            yield [list(row) for row in rows]
+
+
+async def sqlite_events(path: str, query: str, fetch_size: int = STREAM_FETCH_SIZE) -> AsyncIterator[Any]:
+    """Yields the column list, then row batches, via chunked fetchmany."""
+    # The cursor outlives a single executor call, so it gets its own
+    # connection instead of a worker thread's shared one
+    conn = await sqlite_executor.call(open_connection, path)
+    try:
+        cursor = await sqlite_executor.call(conn.execute, query)
+        yield [d[0] for d in cursor.description] if cursor.description else []
+        while True:
+            rows = await sqlite_executor.call(cursor.fetchmany, fetch_size)
+            if not rows:
+                break
+            yield rows
+        await sqlite_executor.call(conn.commit)
+    except BaseException:
+        # Cancelled or closed early: stop a statement still running on the worker
+        conn.interrupt()
+        raise
+    finally:
+        await sqlite_executor.call(conn.close)
+
+
+async def mysql_events(conn, query: str, fetch_size: int = STREAM_FETCH_SIZE, cursor_class=None) -> AsyncIterator[Any]:
+    """Yields the column list, then row batches, from an unbuffered cursor."""
+    async with conn.cursor(*([cursor_class] if cursor_class else [])) as cursor:
+        await cursor.execute(query)
+        yield [d[0] for d in cursor.description] if cursor.description else []
+        while True:
+            rows = await cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield rows
+
+
+async def encode_ndjson(events: AsyncIterator[Any]) -> AsyncIterator[bytes]:
+    """One JSON document per line: {"columns": [...]}, one array per row, then
+    a trailer with rowCount, executionTime and error."""
+    start_time = time.perf_counter()
+    row_count = 0
+    error = None
+    header_sent = False
+    try:
+        async for event in events:
+            if not header_sent:
+                header_sent = True
+                yield dumps({"columns": event}) + b"\n"
+                continue
+            row_count += len(event)
+            yield b"".join(dumps(list(row)) + b"\n" for row in event)
+    except Exception as e:
+        error = str(e)
+    finally:
+        # Releases the cursor/connection promptly if the client went away
+        await events.aclose()
+    if not header_sent:
+        yield dumps({"columns": []}) + b"\n"
+    yield dumps(_trailer(row_count, start_time, error)) + b"\n"
+
+
+async def encode_json(events: AsyncIterator[Any]) -> AsyncIterator[bytes]:
+    """The QueryResult shape, written incrementally with the columns first."""
+    start_time = time.perf_counter()
+    row_count = 0
+    error = None
+    header_sent = False
+    try:
+        async for event in events:
+            if not header_sent:
+                header_sent = True
+                yield b'{"columns":' + dumps(event) + b',"rows":['
+                continue
+            chunk = b",".join(dumps(list(row)) for row in event)
+            yield (b',' if row_count else b'') + chunk
+            row_count += len(event)
+    except Exception as e:
+        error = str(e)
+    finally:
+        # Releases the cursor/connection promptly if the client went away
+        await events.aclose()
+    if not header_sent:
+        yield b'{"columns":[],"rows":['
+    trailer = _trailer(row_count, start_time, error)
+    yield b'],' + dumps(trailer)[1:]
+
+
+def _trailer(row_count: int, start_time: float, error) -> Dict[str, Any]:
+    return {"rowCount": row_count, "executionTime": (time.perf_counter() - start_time) * 1000, "error": error}
+
+
+STREAM_FORMATS: Dict[str, tuple] = {
+    "ndjson": (encode_ndjson, "application/x-ndjson"),
+    "json": (encode_json, "application/json"),
+}
+
@@ -0,0 +1,60 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# connectDB builds the supabase client at import time; tests swap the store out
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "eyJhbGciOiJIUzI1NiJ9.e30.test")
+
+
+class FakeStore:
+    """The slice of MetadataStore the query and published routes read."""
+
+    def __init__(self, db_config, specs=()):
+        self.db_config = db_config
+        self.specs = list(specs)
+
+    async def get_database_connection(self, db_id):
+        return self.db_config if db_id == self.db_config["id"] else None
+
+    async def list_api_specs(self, db_id):
+        return self.specs if db_id == self.db_config["id"] else []
+
+
+@pytest.fixture
+def shop_db(tmp_path):
+    """A SQLite file with a two-row users table."""
+    path = str(tmp_path / "shop.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+    conn.executemany("INSERT INTO users VALUES (?, ?)", [(1, "ada"), (2, "grace")])
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def api(shop_db, monkeypatch):
+    """api(specs, **db_config) -> TestClient for route.router over shop_db as db1."""
+    import route
+    from admission import AdmissionController
+    from api_router import PublishedAPIRouter
+    from result_cache import PublishedResultCache
+
+    def make(specs=(), **db_config):
+        store = FakeStore({"id": "db1", "type": "SQLite", "database_name": shop_db, **db_config}, specs)
+        monkeypatch.setattr(route, "metadata_store", store)
+        monkeypatch.setattr(route, "published_routes", PublishedAPIRouter(store))
+        monkeypatch.setattr(route, "published_results", PublishedResultCache())
+        monkeypatch.setattr(route, "admission", AdmissionController())
+        app = FastAPI()
+        app.include_router(route.router)
+        return TestClient(app)
+
+    return make
@@ -0,0 +1,301 @@
+"""aiomysql-compatible stand-in backed by SQLite (mysql_pool_manager.module).
+
+It implements the slice of the aiomysql pool/connection/cursor API the
+backend uses, translates the MySQL dialect bits the backend emits (pyformat
+placeholders, backticks, information_schema, EXPLAIN FORMAT=JSON) and runs
+the result against the SQLite file named by `db`. It exists so the MySQL
+driver, introspection and pagination paths can be exercised locally; it is
+not a MySQL emulator.
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import re
+import sqlite3
+import weakref
+import zlib
+from contextlib import asynccontextmanager
+from typing import Any, List, Optional
+
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+_BACKTICK = re.compile(r"`((?:[^`]|``)*)`")
+_INFO_SCHEMA = re.compile(r"\binformation_schema\.(\w+)", re.I)
+_EXPLAIN_JSON = re.compile(r"^\s*EXPLAIN\s+FORMAT\s*=\s*JSON\s+", re.I)
+_KILL_QUERY = re.compile(r"^\s*KILL\s+QUERY\s+(\d+)\s*$", re.I)
+_PLAN_DETAIL = re.compile(
+    r"^(SCAN|SEARCH) (?:TABLE )?(\S+)(?: AS \S+)?(?: USING (?:COVERING )?INDEX (\S+)| USING (?:INTEGER )?PRIMARY KEY)?"
+)
+
+_VIEWS = {
+    "TABLES": """
+        SELECT {schema} AS TABLE_SCHEMA, m.name AS TABLE_NAME,
+               CASE m.type WHEN 'view' THEN 'VIEW' ELSE 'BASE TABLE' END AS TABLE_TYPE,
+               '' AS TABLE_COMMENT, NULL AS TABLE_ROWS, NULL AS CREATE_TIME
+        FROM main.sqlite_master m
+        WHERE m.type IN ('table', 'view') AND m.name NOT LIKE 'sqlite_%'
+    """,
+    "COLUMNS": """
+        SELECT {schema} AS TABLE_SCHEMA, m.name AS TABLE_NAME, p.name AS COLUMN_NAME,
+               p.cid + 1 AS ORDINAL_POSITION, BASE_TYPE(p.type) AS DATA_TYPE, lower(p.type) AS COLUMN_TYPE,
+               CASE WHEN p."notnull" = 1 OR p.pk > 0 THEN 'NO' ELSE 'YES' END AS IS_NULLABLE,
+               p.dflt_value AS COLUMN_DEFAULT, CASE WHEN p.pk > 0 THEN 'PRI' ELSE '' END AS COLUMN_KEY
+        FROM main.sqlite_master m JOIN pragma_table_info(m.name) p
+        WHERE m.type IN ('table', 'view') AND m.name NOT LIKE 'sqlite_%'
+    """,
+    "KEY_COLUMN_USAGE": """
+        SELECT {schema} AS TABLE_SCHEMA, m.name AS TABLE_NAME, p.name AS COLUMN_NAME,
+               'PRIMARY' AS CONSTRAINT_NAME, p.pk AS ORDINAL_POSITION,
+               NULL AS REFERENCED_TABLE_NAME, NULL AS REFERENCED_COLUMN_NAME
+        FROM main.sqlite_master m JOIN pragma_table_info(m.name) p
+        WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%' AND p.pk > 0
+        UNION ALL
+        SELECT {schema}, m.name, f."from", 'fk_' || m.name || '_' || f.id, f.seq + 1, f."table", f."to"
+        FROM main.sqlite_master m JOIN pragma_foreign_key_list(m.name) f
+        WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+    """,
+    "STATISTICS": """
+        SELECT {schema} AS TABLE_SCHEMA, m.name AS TABLE_NAME, il.name AS INDEX_NAME,
+               NOT il."unique" AS NON_UNIQUE, ii.seqno + 1 AS SEQ_IN_INDEX, ii.name AS COLUMN_NAME
+        FROM main.sqlite_master m JOIN pragma_index_list(m.name) il JOIN pragma_index_info(il.name) ii
+        WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+    """,
+}
+
+
+def _concat(*args):
+    return None if any(a is None for a in args) else ''.join(str(a) for a in args)
+
+
+def _concat_ws(sep, *args):
+    return None if sep is None else str(sep).join(str(a) for a in args if a is not None)
+
+
+def _base_type(declared: Optional[str]) -> str:
+    return (declared or '').split('(')[0].strip().lower()
+
+
+def _translate(query: str, args, schema: str) -> tuple:
+    params: Any = None
+    if args is not None:
+        # pymysql only %-formats when arguments are given
+        positional: List[Any] = []
+        named = isinstance(args, dict)
+
+        def replace(match):
+            if match.group(0) == '%%':
+                return '%'
+            if match.group(1):
+                return ':' + match.group(1)
+            positional.append(args[len(positional)])
+            return '?'
+
+        query = _PLACEHOLDER.sub(replace, query)
+        params = args if named else positional
+    query = _BACKTICK.sub(lambda m: '"' + m.group(1).replace('``', '`').replace('"', '""') + '"', query)
+    query = _INFO_SCHEMA.sub(lambda m: f"temp.is_{m.group(1).upper()}", query)
+    # The connection's own database is SQLite's main schema
+    query = query.replace('"' + schema.replace('"', '""') + '".', 'main.')
+    return query, params if params is not None else ()
+
+
+class Cursor:
+    def __init__(self, connection: "Connection"):
+        self._connection = connection
+        self._cursor: Optional[sqlite3.Cursor] = None
+        self._pending: List[tuple] = []
+        self.description = None
+        self.rowcount = -1
+        self.lastrowid = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def execute(self, query: str, args=None) -> int:
+        return await self._connection._run(self._execute, query, args)
+
+    def _execute(self, query: str, args) -> int:
+        db = self._connection._db
+        self._pending = []
+        kill = _KILL_QUERY.match(query)
+        if kill:
+            target = _connections.get(int(kill.group(1)))
+            if target is None:
+                raise sqlite3.OperationalError(f"Unknown thread id: {kill.group(1)}")
+            target._db.interrupt()
+            self._cursor, self.description, self.rowcount = None, None, 0
+            return 0
+        explain = _EXPLAIN_JSON.match(query)
+        if explain:
+            sql, params = _translate(query[explain.end():], args, self._connection.schema)
+            self._cursor = None
+            self._pending = [(json.dumps(_explain_json(db, sql, params)),)]
+            self.description = (("EXPLAIN", None, None, None, None, None, None),)
+            self.rowcount = 1
+            return 1
+        sql, params = _translate(query, args, self._connection.schema)
+        self._cursor = db.execute(sql, params)
+        self.description = self._cursor.description
+        self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+        return self.rowcount
+
+    def _fetch(self, size: Optional[int]) -> List[tuple]:
+        rows, self._pending = (self._pending, []) if size is None else (self._pending[:size], self._pending[size:])
+        if self._cursor is not None and (size is None or len(rows) < size):
+            rows += self._cursor.fetchall() if size is None else self._cursor.fetchmany(size - len(rows))
+        return rows
+
+    async def fetchone(self):
+        rows = await self._connection._run(self._fetch, 1)
+        return rows[0] if rows else None
+
+    async def fetchmany(self, size: int = 1) -> List[tuple]:
+        return await self._connection._run(self._fetch, size)
+
+    async def fetchall(self) -> List[tuple]:
+        return await self._connection._run(self._fetch, None)
+
+    async def close(self):
+        self._cursor = None
+        self._pending = []
+
+
+SSCursor = Cursor
+
+_thread_ids = itertools.count(1)
+_connections: "weakref.WeakValueDictionary[int, Connection]" = weakref.WeakValueDictionary()
+
+
+class Connection:
+    def __init__(self, path: str, schema: str):
+        self.schema = schema
+        self.closed = False
+        self._thread_id = next(_thread_ids)
+        _connections[self._thread_id] = self
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._lock = asyncio.Lock()
+        self._db.create_function("CONCAT", -1, _concat)
+        self._db.create_function("CONCAT_WS", -1, _concat_ws)
+        self._db.create_function("CRC32", 1, lambda v: None if v is None else zlib.crc32(str(v).encode()))
+        self._db.create_function("MD5", 1, lambda v: None if v is None else hashlib.md5(str(v).encode()).hexdigest())
+        self._db.create_function("BASE_TYPE", 1, _base_type)
+        literal = "'" + schema.replace("'", "''") + "'"
+        for name, body in _VIEWS.items():
+            self._db.execute(f"CREATE TEMP VIEW is_{name} AS {body.format(schema=literal)}")
+
+    async def _run(self, fn, *args):
+        async with self._lock:
+            return await asyncio.to_thread(fn, *args)
+
+    def cursor(self, cursor_class=None) -> Cursor:
+        return Cursor(self)
+
+    def thread_id(self) -> int:
+        return self._thread_id
+
+    async def ping(self, reconnect: bool = True):
+        await self._run(self._db.execute, "SELECT 1")
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+        _connections.pop(self._thread_id, None)
+        self._db.close()
+
+    async def ensure_closed(self):
+        self.close()
+
+
+async def connect(host=None, port=3306, user=None, password="", db=None, **kwargs) -> Connection:
+    return await asyncio.to_thread(Connection, db, db)
+
+
+class Pool:
+    def __init__(self, db: str, minsize: int, maxsize: int):
+        self._db = db
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self._free: List[Connection] = []
+        self._used = 0
+        self._cond = asyncio.Condition()
+        self._closed = False
+
+    @property
+    def size(self) -> int:
+        return len(self._free) + self._used
+
+    @property
+    def freesize(self) -> int:
+        return len(self._free)
+
+    @asynccontextmanager
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._free or self.size < self.maxsize)
+            conn = self._free.pop() if self._free else None
+            self._used += 1
+        try:
+            if conn is None:
+                conn = await connect(db=self._db)
+            yield conn
+        finally:
+            async with self._cond:
+                self._used -= 1
+                if conn is not None:
+                    if self._closed or conn.closed:
+                        conn.close()
+                    else:
+                        self._free.append(conn)
+                self._cond.notify()
+
+    def close(self):
+        self._closed = True
+        for conn in self._free:
+            conn.close()
+        self._free = []
+
+    async def wait_closed(self):
+        pass
+
+    def terminate(self):
+        self.close()
+
+
+async def create_pool(minsize: int = 1, maxsize: int = 10, db: Optional[str] = None, **kwargs) -> Pool:
+    return Pool(db, minsize, maxsize)
+
+
+def _explain_json(db: sqlite3.Connection, sql: str, params) -> dict:
+    # Shape of MySQL's EXPLAIN FORMAT=JSON, built from SQLite's query plan
+    nested = []
+    for _, _, _, detail in db.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall():
+        match = _PLAN_DETAIL.match(detail)
+        if not match:
+            continue
+        kind, table, index = match.groups()
+        if kind == 'SCAN':
+            access_type = 'index' if index else 'ALL'
+        else:
+            access_type = 'range' if any(op in detail for op in ('<', '>')) else 'ref'
+        if kind == 'SEARCH' and index is None:
+            index = 'PRIMARY'
+        try:
+            rows = db.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0] or 0
+        except sqlite3.OperationalError:
+            rows = 0
+        nested.append({"table": {
+            "table_name": table,
+            "access_type": access_type,
+            "key": index,
+            "rows_examined_per_scan": rows if access_type in ('ALL', 'index') else 1,
+        }})
+    return {"query_block": {"select_id": 1, "nested_loop": nested}}
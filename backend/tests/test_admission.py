@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+import admission as admission_module
+from admission import AdmissionController, AdmissionRejected, TokenBucket
+
+LIMITS = {"max_concurrent_queries": 2, "max_queued_queries": 1}
+
+
+def test_gate_queues_then_rejects():
+    controller = AdmissionController(queue_timeout=5)
+
+    async def run():
+        await controller.acquire("db1", LIMITS)
+        await controller.acquire("db1", LIMITS)
+        queued = asyncio.ensure_future(controller.acquire("db1", LIMITS))
+        await asyncio.sleep(0)
+        assert not queued.done()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("db1", LIMITS)
+        assert rejected.value.status_code == 503 and rejected.value.retry_after > 0
+
+        # A released slot goes to the first waiter
+        controller.release("db1")
+        await asyncio.wait_for(queued, 1)
+        return controller.stats()["databases"]["db1"]
+
+    stats = asyncio.run(run())
+    assert (stats["active"], stats["queue_depth"], stats["admitted"]) == (2, 0, 3)
+    assert (stats["queued"], stats["rejected"]) == (1, 1)
+
+
+def test_gate_wait_times_out():
+    controller = AdmissionController(queue_timeout=0.05)
+    limits = {"max_concurrent_queries": 1}
+
+    async def run():
+        await controller.acquire("db1", limits)
+        with pytest.raises(AdmissionRejected) as timed_out:
+            await controller.acquire("db1", limits)
+        assert timed_out.value.status_code == 503
+        controller.release("db1")
+        # The timed-out waiter left the queue, so the slot is free again
+        await asyncio.wait_for(controller.acquire("db1", limits), 1)
+        return controller.stats()["databases"]["db1"]
+
+    stats = asyncio.run(run())
+    assert (stats["timed_out"], stats["queue_depth"], stats["active"]) == (1, 0, 1)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_token_bucket_refills(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(admission_module, "time", clock)
+    monkeypatch.setattr(admission_module, "RATE_LIMIT_BURST_SECONDS", 2)
+    bucket = TokenBucket(rate=5)
+
+    assert [bucket.take() for _ in range(10)] == [0.0] * 10
+    assert bucket.take() == pytest.approx(0.2)
+    clock.now += 0.2
+    assert bucket.take() == 0.0
+    # Never more than the burst, however long it sat idle
+    clock.now += 60
+    assert [bucket.take() for _ in range(10)] == [0.0] * 10
+    assert bucket.take() > 0
+
+
+def test_rate_limits_are_per_endpoint_and_user(monkeypatch):
+    monkeypatch.setattr(admission_module, "time", FakeClock())
+    controller = AdmissionController()
+    config = {"user_rate_limit_per_second": 1}
+
+    for _ in range(2):
+        controller.check_rate("db1", config, "query", "10.0.0.1")
+    with pytest.raises(AdmissionRejected) as limited:
+        controller.check_rate("db1", config, "query", "10.0.0.1")
+    assert limited.value.status_code == 429 and limited.value.retry_after == pytest.approx(1)
+    # Someone else still has their own bucket
+    controller.check_rate("db1", config, "query", "10.0.0.2")
+
+
+def test_rate_limited_request_gets_429_with_retry_after(api):
+    with api(rate_limit_per_second=1) as client:
+        statuses = [client.post("/database/db1/query", json={"query": "SELECT 1"}) for _ in range(3)]
+    assert [r.status_code for r in statuses] == [200, 200, 429]
+    assert int(statuses[2].headers["Retry-After"]) >= 1
+
+
+def test_background_work_has_its_own_slots(monkeypatch):
+    monkeypatch.setattr(admission_module, "ADMISSION_MAX_BACKGROUND", 1)
+    controller = AdmissionController(queue_timeout=0.05)
+    limits = {"max_concurrent_queries": 1}
+
+    async def run():
+        await controller.acquire("db1", limits, background=True)
+        # A running job leaves the interactive slot free
+        await controller.acquire("db1", limits)
+        # A second job queues, without a timeout, until the first is done
+        second = asyncio.ensure_future(controller.acquire("db1", limits, background=True))
+        await asyncio.sleep(0.1)
+        assert not second.done()
+        controller.release("db1", background=True)
+        await asyncio.wait_for(second, 1)
+        return controller.stats()
+
+    stats = asyncio.run(run())
+    assert stats["databases"]["db1"]["active"] == 1
+    assert stats["background"]["db1"]["active"] == 1 and stats["background"]["db1"]["queued"] == 1
@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+import pytest
+
+from ai_cache import AIResponseCache
+from llm import FakeModel
+
+
+def asker(cache, model):
+    async def ask(db_id, fingerprint, prompt):
+        async def compute():
+            return json.loads(await model.generate(f"Schema\nUser Prompt: {prompt}"))
+        return await cache.get_or_compute(AIResponseCache.key(db_id, fingerprint, prompt), compute)
+    return ask
+
+
+def test_repeated_prompt_is_a_hit():
+    model = FakeModel()
+    cache = AIResponseCache(path=None)
+    ask = asker(cache, model)
+
+    async def run():
+        first = await ask("db1", "v1", "List all users")
+        # Normalized: case, spacing and trailing punctuation do not matter
+        second = await ask("db1", "v1", "  list all   users?")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second
+    assert model.calls == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_concurrent_identical_prompts_share_one_model_call():
+    model = FakeModel(latency=0.05)
+    cache = AIResponseCache(path=None)
+    ask = asker(cache, model)
+
+    async def run():
+        return await asyncio.gather(*(ask("db1", "v1", "count orders") for _ in range(10)))
+
+    answers = asyncio.run(run())
+    assert all(answer == answers[0] for answer in answers)
+    assert model.calls == 1
+    assert cache.stats()["deduplicated"] == 9
+
+
+def test_schema_change_misses(tmp_path):
+    model = FakeModel()
+    cache = AIResponseCache(path=str(tmp_path / "ai.sqlite"))
+    ask = asker(cache, model)
+
+    async def run():
+        await ask("db1", "v1", "List all users")
+        await ask("db1", "v2", "List all users")
+        await ask("db1", "v2", "List all users")
+
+    asyncio.run(run())
+    assert model.calls == 2
+    cache.close()
+
+    # After a restart the current answer comes from disk; the old one was dropped
+    reopened = AIResponseCache(path=str(tmp_path / "ai.sqlite"))
+    ask = asker(reopened, model)
+    asyncio.run(ask("db1", "v2", "List all users"))
+    assert model.calls == 2 and reopened.stats()["persistent_hits"] == 1
+    asyncio.run(ask("db1", "v1", "List all users"))
+    assert model.calls == 3
+    reopened.close()
+
+
+def test_errors_are_not_cached():
+    cache = AIResponseCache(path=None)
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        raise RuntimeError("model unavailable")
+
+    async def succeeding():
+        return {"query": "SELECT 1"}
+
+    key = AIResponseCache.key("db1", "v1", "List all users")
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await cache.get_or_compute(key, failing)
+        with pytest.raises(RuntimeError):
+            await cache.get_or_compute(key, failing)
+        return await cache.get_or_compute(key, succeeding)
+
+    assert asyncio.run(run()) == {"query": "SELECT 1"}
+    assert calls == 2
@@ -0,0 +1,48 @@
+import asyncio
+
+from api_router import PublishedAPIRouter
+
+SPEC = {"method": "GET", "path": "/users/{id}", "query": "SELECT * FROM users WHERE id = :id",
+        "parameters": [{"name": "id", "type": "integer", "required": True}]}
+
+
+class FakeStore:
+    def __init__(self):
+        self.connections = {"db1": {"id": "db1"}}
+        self.spec_loads = []
+
+    async def get_database_connection(self, db_id):
+        return self.connections.get(db_id)
+
+    async def list_api_specs(self, db_id):
+        self.spec_loads.append(db_id)
+        return [{"id": "s1", "spec": SPEC}] if db_id == "db1" else []
+
+
+def test_loads_known_database_once():
+    store = FakeStore()
+    router = PublishedAPIRouter(store)
+
+    async def lookup():
+        await router.ensure_loaded("db1")
+        return router.match("db1", "GET", "users/7")
+
+    route, params = asyncio.run(lookup())
+    assert (route.spec_id, params) == ("s1", {"id": "7"})
+    assert router.match("db1", "GET", "users/7") is not None
+    asyncio.run(router.ensure_loaded("db1"))
+    assert store.spec_loads == ["db1"]
+
+
+def test_unknown_database_keeps_no_state():
+    store = FakeStore()
+    router = PublishedAPIRouter(store, max_databases=4)
+
+    async def probe():
+        for i in range(100):
+            await router.ensure_loaded(f"missing-{i}")
+
+    asyncio.run(probe())
+    assert store.spec_loads == []
+    assert router._loaded.stats()["size"] == 0 and router._locks.stats()["size"] == 0
+    assert router.match("missing-1", "GET", "users/7") is None
@@ -0,0 +1,62 @@
+import asyncio
+import os
+
+from health_monitor import HealthMonitor
+
+
+class HealthStore:
+    def __init__(self, rows, fail=None):
+        self.rows = rows
+        self.fail = fail
+        self.upserts = []
+
+    async def list_all_database_connections(self):
+        return self.rows
+
+    async def upsert_database_connection_health(self, rows):
+        if self.fail:
+            raise self.fail
+        self.upserts.append(rows)
+        return rows
+
+
+def sqlite_row(db_id, path):
+    return {"id": db_id, "type": "SQLite", "database_name": path, "status": "unknown", "last_connected": None}
+
+
+def probe_all(monitor):
+    async def run():
+        monitor._semaphore = asyncio.Semaphore(monitor.concurrency)
+        await monitor.refresh()
+        for target in list(monitor._targets.values()):
+            await monitor.probe(target)
+        await monitor.flush(force=True)
+
+    asyncio.run(run())
+
+
+def test_flush_writes_every_result_in_one_upsert(shop_db, tmp_path):
+    missing = str(tmp_path / "typo.db")
+    store = HealthStore([sqlite_row("ok", shop_db), sqlite_row("typo", missing)])
+    monitor = HealthMonitor(store)
+    probe_all(monitor)
+
+    assert len(store.upserts) == 1
+    by_id = {row["id"]: row for row in store.upserts[0]}
+    assert by_id["ok"]["status"] == "connected" and by_id["ok"]["latency_ms"] is not None
+    assert by_id["typo"]["status"] == "disconnected"
+    assert set(by_id["ok"]) == {"id", "status", "last_connected", "latency_ms", "last_checked"}
+    assert monitor.stats()["rows_written"] == 2
+    # Probing a mistyped path must not leave an empty database behind
+    assert not os.path.exists(missing)
+
+
+def test_missing_columns_fall_back_to_the_base_ones(shop_db):
+    store = HealthStore([sqlite_row("ok", shop_db)], fail=Exception('column "latency_ms" does not exist'))
+    monitor = HealthMonitor(store)
+    probe_all(monitor)
+    assert monitor.stats()["flush_errors"] == 1 and monitor.stats()["pending_writes"] == 1
+
+    store.fail = None
+    asyncio.run(monitor.flush(force=True))
+    assert store.upserts == [[{"id": "ok", "status": "connected", "last_connected": store.upserts[0][0]["last_connected"]}]]
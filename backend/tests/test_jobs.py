@@ -0,0 +1,47 @@
+import asyncio
+import os
+
+import jobs
+from jobs import Job, JobManager, TERMINAL_STATES
+
+INTERRUPTED = {
+    "read": "SELECT id FROM users",
+    "write": "DELETE FROM users",
+    "explain-analyze-write": "EXPLAIN ANALYZE DELETE FROM users",
+    "write-behind-mysql-comment": "SELECT 1 # '\n; DELETE FROM users; -- '",
+}
+
+
+def test_interrupted_writes_are_failed_not_rerun(tmp_path):
+    directory = str(tmp_path / "jobs")
+    os.makedirs(directory)
+    store = jobs._JobStore(os.path.join(directory, "jobs.sqlite"))
+    for job_id, query in INTERRUPTED.items():
+        store.save(Job(job_id, "db1", "10.0.0.1", query, state="running", started_at=1.0).row())
+    store.close()
+
+    executed = []
+
+    async def events(job):
+        executed.append(job.query)
+        yield ["id"]
+        yield [(1,), (2,)]
+
+    async def run():
+        manager = JobManager(directory, workers=1)
+        await manager.start(events)
+        try:
+            for _ in range(200):
+                if all(j.state in TERMINAL_STATES for j in manager.list("db1")):
+                    break
+                await asyncio.sleep(0.01)
+            return {j.id: (j.state, j.error) for j in manager.list("db1")}
+        finally:
+            await manager.close()
+
+    states = asyncio.run(run())
+    assert states["read"] == ("succeeded", None)
+    for job_id in ("write", "explain-analyze-write", "write-behind-mysql-comment"):
+        state, error = states[job_id]
+        assert state == "failed" and "not run again" in error
+    assert executed == [INTERRUPTED["read"]]
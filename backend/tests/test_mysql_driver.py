@@ -0,0 +1,48 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+import mysql_stub
+from drivers import get_driver
+from pagination import PageQuery
+from pool import MySQLPoolManager
+
+
+@pytest.fixture
+def driver(tmp_path, monkeypatch):
+    path = str(tmp_path / "shop.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+    conn.executemany("INSERT INTO users VALUES (?, ?)", [(i, f"user{i}") for i in range(1, 8)])
+    conn.commit()
+    conn.close()
+
+    manager = MySQLPoolManager()
+    manager.module = mysql_stub
+    monkeypatch.setattr("drivers.mysql_pool_manager", manager)
+    yield get_driver("shop", {"type": "MySQL", "host": "localhost", "port": 3306, "username": "app",
+                              "password": "", "database_name": path})
+    asyncio.run(manager.close())
+
+
+def test_introspect(driver):
+    tables = asyncio.run(driver.introspect())
+    assert [t["name"] for t in tables] == ["users"]
+    assert [c["name"] for c in tables[0]["columns"] if c["isPrimaryKey"]] == ["id"]
+
+
+def test_pages_through_pool(driver):
+    async def read_all():
+        query = PageQuery('mysql', (await driver.introspect())[0], sort="name", descending=True)
+        rows, after = [], None
+        while True:
+            sql, args = query.sql(after, 3)
+            _, fetched = await driver.fetch(sql, args)
+            page, cursor = query.page(fetched, 3)
+            rows += page
+            if cursor is None:
+                return rows
+            after = query.decode(cursor)
+
+    assert [row["name"] for row in asyncio.run(read_all())] == sorted((f"user{i}" for i in range(1, 8)), reverse=True)
@@ -0,0 +1,123 @@
+import sqlite3
+
+import pytest
+
+from pagination import PageQuery, PaginationError
+
+ORDER_LINES = {
+    "name": "order_lines",
+    "columns": [
+        {"name": "order_id", "isPrimaryKey": True, "nullable": False},
+        {"name": "line_no", "isPrimaryKey": True, "nullable": False},
+        {"name": "sku", "isPrimaryKey": False, "nullable": False},
+        {"name": "note", "isPrimaryKey": False, "nullable": True},
+    ],
+}
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE order_lines (order_id INTEGER, line_no INTEGER, sku TEXT NOT NULL, note TEXT,"
+                 " PRIMARY KEY (order_id, line_no))")
+    conn.executemany("INSERT INTO order_lines VALUES (?, ?, ?, NULL)",
+                     [(order_id, line_no, f"sku{(order_id * 7 + line_no) % 5}")
+                      for order_id in range(1, 6) for line_no in range(1, 5)])
+    yield conn
+    conn.close()
+
+
+def read_all(conn, query, limit):
+    rows, after = [], None
+    while True:
+        sql, args = query.sql(after, limit)
+        page, cursor = query.page(conn.execute(sql, args).fetchall(), limit)
+        rows += page
+        if cursor is None:
+            return rows
+        after = query.decode(cursor)
+
+
+@pytest.mark.parametrize("sort, expected_keys", [
+    (None, ['"order_id"', '"line_no"']),
+    ("order_id", ['"order_id"', '"line_no"']),
+    ("line_no", ['"line_no"', '"order_id"']),
+    ("sku", ['"sku"', '"order_id"', '"line_no"']),
+])
+def test_sort_column_leads_composite_key(sort, expected_keys):
+    query = PageQuery('sqlite', ORDER_LINES, sort=sort)
+    assert [cmp for _, cmp, _ in query._keys] == expected_keys
+
+
+@pytest.mark.parametrize("sort, order", [
+    ("line_no", ["line_no", "order_id"]),
+    ("sku", ["sku", "order_id", "line_no"]),
+])
+@pytest.mark.parametrize("descending", [False, True])
+def test_pages_follow_sort_column(conn, sort, order, descending):
+    rows = read_all(conn, PageQuery('sqlite', ORDER_LINES, sort=sort, descending=descending), limit=3)
+    assert len(rows) == 20
+    assert rows == sorted(rows, key=lambda row: [row[name] for name in order], reverse=descending)
+
+
+def test_nullable_sort_column_is_rejected():
+    with pytest.raises(PaginationError):
+        PageQuery('sqlite', ORDER_LINES, sort="note")
+
+
+def test_cursor_from_another_sort_is_rejected(conn):
+    by_line = PageQuery('sqlite', ORDER_LINES, sort="line_no")
+    sql, args = by_line.sql(None, 2)
+    _, cursor = by_line.page(conn.execute(sql, args).fetchall(), 2)
+    with pytest.raises(PaginationError):
+        PageQuery('sqlite', ORDER_LINES).decode(cursor)
+
+
+ORDER_LINE_VIEW = {**ORDER_LINES, "name": "sku_lines", "isView": True,
+                   "columns": [{**col, "isPrimaryKey": False} for col in ORDER_LINES["columns"]]}
+
+
+def read_all_offset(conn, query, limit):
+    rows, after = [], None
+    while True:
+        sql, args = query.sql(after, limit)
+        page, cursor = query.page(conn.execute(sql, args).fetchall(), limit, after)
+        rows += page
+        if cursor is None:
+            return rows
+        after = query.decode(cursor)
+
+
+def test_postgres_view_pages_by_offset_instead_of_ctid():
+    query = PageQuery('postgres', ORDER_LINE_VIEW, schema="public", sort="sku")
+    assert query.offset_paging
+    sql, args = query.sql([50], 25)
+    assert "ctid" not in sql and args == []
+    assert sql.endswith('ORDER BY "sku" ASC LIMIT 26 OFFSET 50')
+
+
+def test_mysql_table_without_key_pages_by_offset():
+    keyless = {**ORDER_LINE_VIEW, "isView": False}
+    assert PageQuery('mysql', keyless).offset_paging
+    assert not PageQuery('postgres', keyless).offset_paging
+
+
+@pytest.mark.parametrize("sort", [None, "sku"])
+def test_view_offset_pages_cover_every_row(conn, sort):
+    conn.execute("CREATE VIEW sku_lines AS SELECT * FROM order_lines")
+    query = PageQuery('sqlite', ORDER_LINE_VIEW, sort=sort)
+    rows = read_all_offset(conn, query, limit=6)
+    assert sorted((row["order_id"], row["line_no"]) for row in rows) == \
+        [(order_id, line_no) for order_id in range(1, 6) for line_no in range(1, 5)]
+    if sort:
+        assert [row[sort] for row in rows] == sorted(row[sort] for row in rows)
+
+
+def test_offset_cursor_is_validated():
+    query = PageQuery('postgres', ORDER_LINE_VIEW)
+    cursor = query.page([(1,)] * 3, 2)[1]
+    assert query.decode(cursor) == [2]
+    # A keyset cursor is not an offset, and the reverse
+    keyset = PageQuery('postgres', ORDER_LINES)
+    with pytest.raises(PaginationError):
+        keyset.decode(cursor)
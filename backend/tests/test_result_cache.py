@@ -0,0 +1,73 @@
+import sqlite3
+import time
+
+import pytest
+
+
+@pytest.fixture
+def publish(api, shop_db):
+    def publish(cache):
+        spec = {"method": "GET", "path": "/users", "query": "SELECT id, name FROM users ORDER BY id",
+                "parameters": [], "isPublished": True, "cache": cache}
+        return api([{"id": "s1", "spec": spec}])
+
+    def add_user(name):
+        conn = sqlite3.connect(shop_db)
+        conn.execute("INSERT INTO users (name) VALUES (?)", (name,))
+        conn.commit()
+        conn.close()
+
+    publish.add_user = add_user
+    return publish
+
+
+def names(response):
+    return [row["name"] for row in response.json()["rows"]]
+
+
+def test_hit_within_ttl(publish):
+    with publish({"enabled": True, "ttl": 60}) as client:
+        first = client.get("/db1/users")
+        publish.add_user("linus")
+        second = client.get("/db1/users")
+    assert first.headers["X-Cache"] == "MISS" and second.headers["X-Cache"] == "HIT"
+    assert names(second) == ["ada", "grace"]
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert second.headers["Cache-Control"].startswith("max-age=")
+
+
+def test_expired_entry_is_a_miss(publish):
+    with publish({"enabled": True, "ttl": 0.2}) as client:
+        client.get("/db1/users")
+        publish.add_user("linus")
+        time.sleep(0.3)
+        response = client.get("/db1/users")
+    assert response.headers["X-Cache"] == "MISS"
+    assert names(response) == ["ada", "grace", "linus"]
+
+
+def test_stale_while_revalidate(publish):
+    with publish({"enabled": True, "ttl": 0.2, "staleWhileRevalidate": 30}) as client:
+        client.get("/db1/users")
+        publish.add_user("linus")
+        time.sleep(0.3)
+        stale = client.get("/db1/users")
+        # Served from cache at once while the refresh runs in the background
+        assert stale.headers["X-Cache"] == "STALE" and names(stale) == ["ada", "grace"]
+        assert "stale-while-revalidate=30" in stale.headers["Cache-Control"]
+        for _ in range(50):
+            refreshed = client.get("/db1/users")
+            if refreshed.headers["X-Cache"] == "HIT":
+                break
+            time.sleep(0.02)
+    assert refreshed.headers["X-Cache"] == "HIT" and names(refreshed) == ["ada", "grace", "linus"]
+
+
+def test_if_none_match_gets_304(publish):
+    with publish({"enabled": True, "ttl": 60}) as client:
+        etag = client.get("/db1/users").headers["ETag"]
+        not_modified = client.get("/db1/users", headers={"If-None-Match": etag})
+        modified = client.get("/db1/users", headers={"If-None-Match": '"something-else"'})
+    assert not_modified.status_code == 304 and not_modified.content == b""
+    assert not_modified.headers["ETag"] == etag
+    assert modified.status_code == 200
@@ -0,0 +1,39 @@
+import pytest
+
+import result_encoding
+from result_encoding import ARROW_STREAM, COLUMNAR_JSON, JSON, NotAcceptable, negotiate
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, JSON),
+    ("*/*", JSON),
+    ("text/plain", JSON),
+    ("text/html,application/xhtml+xml;q=0.9", JSON),
+    (f"{COLUMNAR_JSON}, {JSON};q=0.5", COLUMNAR_JSON),
+    (f"{JSON};q=0, {COLUMNAR_JSON}", COLUMNAR_JSON),
+])
+def test_accept_header_defaults_to_json(accept, expected):
+    assert negotiate(accept) == expected
+
+
+def test_arrow_without_pyarrow(monkeypatch):
+    monkeypatch.setattr(result_encoding, "pyarrow", None)
+    # Arrow among other choices falls through to one the server can produce
+    assert negotiate(f"{ARROW_STREAM}, {COLUMNAR_JSON};q=0.5") == COLUMNAR_JSON
+    assert negotiate(f"{ARROW_STREAM}, text/plain;q=0.5") == JSON
+    # Asking for Arrow and nothing else is the only 406
+    with pytest.raises(NotAcceptable):
+        negotiate(ARROW_STREAM)
+    with pytest.raises(NotAcceptable):
+        negotiate(None, "arrow")
+
+
+def test_arrow_with_pyarrow(monkeypatch):
+    monkeypatch.setattr(result_encoding, "pyarrow", object())
+    assert negotiate(f"{ARROW_STREAM}, {JSON};q=0.5") == ARROW_STREAM
+    assert negotiate(None, "arrow") == ARROW_STREAM
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(NotAcceptable):
+        negotiate(None, "csv")
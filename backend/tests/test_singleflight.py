@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_execution():
+    flights = SingleFlight()
+    runs = 0
+
+    async def work():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.02)
+        return runs
+
+    async def run():
+        return await asyncio.gather(*(flights.do("key", work, "GET /users") for _ in range(50)))
+
+    assert asyncio.run(run()) == [1] * 50
+    assert runs == 1
+    assert flights.stats()["executions"] == 1 and flights.coalesced == 49
+    assert flights.coalesced_by_endpoint["GET /users"] == 49
+    assert flights.in_flight() == 0
+
+
+def test_error_reaches_every_waiter_and_clears_the_key():
+    flights = SingleFlight()
+    runs = 0
+
+    async def failing():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.02)
+        raise ValueError("boom")
+
+    async def run():
+        results = await asyncio.gather(*(flights.do("key", failing) for _ in range(5)), return_exceptions=True)
+        assert flights.in_flight() == 0
+        # The next call runs the work again rather than reusing the failure
+        again = await asyncio.gather(flights.do("key", failing), return_exceptions=True)
+        return results + again
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, ValueError) and str(r) == "boom" for r in results)
+    assert runs == 2
+
+
+def test_work_outlives_a_caller_until_the_last_one_leaves():
+    flights = SingleFlight()
+    started = 0
+    finished = 0
+
+    async def work():
+        nonlocal started, finished
+        started += 1
+        await asyncio.sleep(0.05)
+        finished += 1
+        return "done"
+
+    async def run():
+        first = asyncio.ensure_future(flights.do("a", work))
+        second = asyncio.ensure_future(flights.do("a", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+        # Every caller gone: the work is cancelled
+        lonely = asyncio.ensure_future(flights.do("b", work))
+        await asyncio.sleep(0.01)
+        lonely.cancel()
+        await asyncio.gather(lonely, return_exceptions=True)
+        await asyncio.sleep(0.06)
+
+    asyncio.run(run())
+    assert (started, finished) == (2, 1)
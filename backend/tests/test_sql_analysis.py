@@ -0,0 +1,58 @@
+import pytest
+
+from sql_analysis import analyze_sql, find_issues, limit_sql
+
+
+@pytest.mark.parametrize("sql, expected, applied", [
+    ("SELECT * FROM users", "SELECT * FROM users LIMIT 1000", 1000),
+    ("select * from users;", "select * from users LIMIT 1000;", 1000),
+    ("SELECT * FROM users ORDER BY id OFFSET 10", "SELECT * FROM users ORDER BY id LIMIT 1000 OFFSET 10", 1000),
+    ("SELECT * FROM users LIMIT 50", "SELECT * FROM users LIMIT 50", None),
+    ("SELECT * FROM users LIMIT 50000", "SELECT * FROM users LIMIT 10000", 10000),
+    ("SELECT * FROM users LIMIT ALL", "SELECT * FROM users LIMIT 10000", 10000),
+    ("SELECT * FROM users LIMIT ALL OFFSET 5", "SELECT * FROM users LIMIT 10000 OFFSET 5", 10000),
+    ("SELECT * FROM users LIMIT :limit", "SELECT * FROM users LIMIT :limit", None),
+    ("UPDATE users SET name = 'x'", "UPDATE users SET name = 'x'", None),
+])
+def test_limit_sql(sql, expected, applied):
+    assert limit_sql(sql, auto_limit=1000, max_limit=10000) == (expected, applied)
+
+
+@pytest.mark.parametrize("sql, kind", [
+    ("SELECT 1", "read"),
+    ("-- note\n(SELECT 1)", "read"),
+    ("WITH d AS (DELETE FROM orders RETURNING *) SELECT * FROM d", "write"),
+    ("SELECT * INTO copy FROM users", "write"),
+    ("SELECT 1; DELETE FROM users", "write"),
+    ("/* x */ create table t (id int)", "ddl"),
+    ("INSERT INTO t VALUES (1); ALTER TABLE t ADD c int", "ddl"),
+    ("EXPLAIN SELECT * FROM users", "read"),
+    ("EXPLAIN DELETE FROM users", "read"),
+    ("EXPLAIN ANALYZE SELECT * FROM users", "read"),
+    ("EXPLAIN ANALYZE DELETE FROM t", "write"),
+    ("explain analyze update t set name = 'x'", "write"),
+    ("EXPLAIN (ANALYZE, BUFFERS) INSERT INTO t VALUES (1)", "write"),
+    ("EXPLAIN ANALYZE CREATE TABLE t2 AS SELECT * FROM t", "write"),
+])
+def test_kind(sql, kind):
+    assert analyze_sql(sql).kind == kind
+
+
+def test_find_issues():
+    counts = {"users": 200000, "orders": 400000}
+    joined = analyze_sql("SELECT * FROM users u JOIN orders o ON o.user_id = u.id WHERE u.id = 1")
+    assert find_issues(joined, counts, large_rows=1000) == []
+    cartesian = analyze_sql("SELECT * FROM users u, orders o")
+    assert [i["kind"] for i in find_issues(cartesian, counts, large_rows=1000)] == ["cartesian_join"]
+    update = analyze_sql("UPDATE users SET name = 'x'")
+    assert [i["kind"] for i in find_issues(update, counts, large_rows=1000)] == ["unfiltered_large_table"]
+
+
+@pytest.mark.parametrize("dialect, kind", [("postgres", "ddl"), ("sqlite", "ddl"), ("", "ddl"), ("mysql", "read")])
+def test_hash_is_a_comment_only_in_mysql(dialect, kind):
+    # Postgres' #> operator must not hide the statement after it
+    assert analyze_sql("SELECT data #> '{a}' FROM t; DROP TABLE t", dialect).kind == kind
+
+
+def test_hash_comment_hides_quote_in_mysql():
+    assert analyze_sql("SELECT 1 # it's\nFROM users", "mysql").tables == [("users", False)]
@@ -0,0 +1,59 @@
+import asyncio
+import sqlite3
+import tracemalloc
+
+from streaming import encode_json, encode_ndjson, sqlite_events
+
+ROWS = 300_000
+FETCH_SIZE = 1000
+
+
+def build_events_table(path, rows=ROWS):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE events (id INTEGER PRIMARY KEY, kind TEXT, payload TEXT, amount REAL)")
+    conn.executemany("INSERT INTO events VALUES (?, ?, ?, ?)",
+                     ((i, f"kind{i % 17}", f"payload for event {i}", i * 0.25) for i in range(1, rows + 1)))
+    conn.commit()
+    conn.close()
+
+
+def drain(encode, path):
+    async def run():
+        size, lines = 0, 0
+        async for chunk in encode(sqlite_events(path, "SELECT * FROM events", FETCH_SIZE)):
+            size += len(chunk)
+            lines += chunk.count(b"\n")
+        return size, lines
+
+    tracemalloc.start()
+    try:
+        size, lines = asyncio.run(run())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return size, lines, peak
+
+
+def test_ndjson_stream_memory_is_bounded(tmp_path):
+    path = str(tmp_path / "events.db")
+    build_events_table(path)
+    size, lines, peak = drain(encode_ndjson, path)
+    # Header, one line per row, trailer
+    assert lines == ROWS + 2
+    # A few fetch batches at most, however large the table: the output alone is ~15 MB
+    assert size > 10 * 2 ** 20
+    assert peak < 4 * 2 ** 20
+
+
+def test_json_stream_is_one_document(tmp_path):
+    import json
+
+    path = str(tmp_path / "events.db")
+    build_events_table(path, rows=10)
+
+    async def collect():
+        return b"".join([chunk async for chunk in encode_json(sqlite_events(path, "SELECT * FROM events LIMIT 3"))])
+
+    result = json.loads(asyncio.run(collect()))
+    assert result["columns"] == ["id", "kind", "payload", "amount"]
+    assert result["rowCount"] == 3 and result["error"] is None